@@ -4,13 +4,16 @@ from flask_wtf.csrf import CSRFProtect
 from datetime import datetime, timezone, timedelta
 import os
 from config import Config
+from commands import register_commands
 from views.requirement_views import requirement_bp
 from views.project_views import project_bp  # 导入项目管理蓝图
+from views.job_views import job_bp
 from flask_login import login_user, logout_user, login_required, current_user
 
 # 导入模型和表单
 from models import db, init_db, Requirement, User
 from forms import RequirementForm
+from services.requirement_service import RequirementService
 from flask_login import LoginManager
 
 def create_app(config=None):
@@ -63,6 +66,10 @@ def create_app(config=None):
     app.register_blueprint(requirement_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(project_bp)  # 注册项目管理蓝图
+    app.register_blueprint(job_bp)  # 注册后台任务蓝图
+    
+    # 注册维护命令
+    register_commands(app)
     
     return app
 
@@ -78,9 +85,8 @@ def index():
 @app.route('/delete/<int:id>')
 def delete(id):
     """删除需求"""
-    requirement = Requirement.query.get_or_404(id)
-    db.session.delete(requirement)
-    db.session.commit()
+    user_id = current_user.id if current_user.is_authenticated else None
+    RequirementService.delete_requirement(id, user_id)
     flash('需求删除成功！', 'success')
     return redirect(url_for('index'))
 
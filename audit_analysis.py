@@ -1,124 +0,0 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-需求审计功能简化检查
-"""
-
-def analyze_audit_functionality():
-    """分析审计功能"""
-    print("🔍 需求审计功能分析报告")
-    print("=" * 50)
-    
-    # 检查核心文件和功能
-    audit_components = {
-        "数据模型": {
-            "RequirementHistory模型": "models.py:L348-L360",
-            "审计字段": ["requirement_id", "user_id", "action", "field_name", "old_value", "new_value", "comment", "created_at"],
-            "关系映射": "requirement.history / history.user"
-        },
-        "业务服务": {
-            "历史记录添加": "requirement_service.py:L327-L338",
-            "需求创建审计": "requirement_service.py:L25-L32",
-            "需求更新审计": "requirement_service.py:L42-L54",
-            "状态变更审计": "requirement_service.py:L67-L81"
-        },
-        "前端展示": {
-            "历史记录页面": "templates/requirements/view.html:L225-L269",
-            "时间线显示": "timeline样式展示变更历史",
-            "编辑页面历史": "requirement_views.py:L271显示最近历史"
-        },
-        "路由控制": {
-            "查看历史": "requirement_views.py:L172获取历史记录",
-            "状态变更": "requirement_views.py:L278-L291记录状态变更",
-            "需求编辑": "包含历史记录预处理"
-        }
-    }
-    
-    print("\n📋 核心审计功能组件:")
-    for category, components in audit_components.items():
-        print(f"\n🔸 {category}:")
-        for name, description in components.items():
-            if isinstance(description, list):
-                print(f"  • {name}: {', '.join(description)}")
-            else:
-                print(f"  • {name}: {description}")
-    
-    print("\n🎯 审计功能特性:")
-    features = [
-        "✅ 需求创建时自动记录历史",
-        "✅ 字段更新时记录变更前后值",
-        "✅ 状态变更专门记录和验证",
-        "✅ 用户操作追踪",
-        "✅ 时间戳记录",
-        "✅ 变更备注支持",
-        "✅ 历史记录关系查询",
-        "✅ 时间线可视化展示",
-        "✅ 基线版本创建",
-        "✅ 影响分析功能"
-    ]
-    
-    for feature in features:
-        print(f"  {feature}")
-    
-    print("\n🔧 审计操作类型:")
-    actions = [
-        "create - 需求创建",
-        "update - 字段更新", 
-        "status_change - 状态变更",
-        "delete - 删除操作(如果支持)",
-    ]
-    
-    for action in actions:
-        print(f"  • {action}")
-    
-    print("\n📊 状态转换验证:")
-    print("  • 实现了完整的状态转换验证逻辑")
-    print("  • 支持状态回退(草稿←→已提交)")
-    print("  • 记录所有状态变更历史")
-    print("  • 包含变更原因备注")
-    
-    print("\n🛡️ 权限控制:")
-    print("  • 查看者(viewer)角色只能查看历史，不能修改")
-    print("  • 其他角色可以进行状态变更")
-    print("  • 所有变更都记录操作用户")
-    
-    print("\n💡 审计数据查询:")
-    query_examples = [
-        "需求变更历史: requirement.history.order_by(desc)",
-        "用户操作记录: RequirementHistory.filter_by(user_id)",
-        "字段变更追踪: RequirementHistory.filter_by(field_name)",
-        "状态变更记录: RequirementHistory.filter_by(action='status_change')"
-    ]
-    
-    for example in query_examples:
-        print(f"  • {example}")
-    
-    print("\n🔍 潜在问题检查点:")
-    issues = [
-        "⚠️ 需确认RequirementHistory导入是否正确",
-        "⚠️ 检查edit路由中历史记录查询语法",
-        "⚠️ 验证中文状态值在历史记录中的一致性",
-        "⚠️ 确认权限控制在所有审计相关功能中的实现"
-    ]
-    
-    for issue in issues:
-        print(f"  {issue}")
-    
-    print("\n📈 审计功能评估:")
-    print("  🟢 基础功能: 完整 - 已实现需求变更的全链路追踪")
-    print("  🟢 数据模型: 完善 - RequirementHistory模型字段齐全")
-    print("  🟢 服务层: 规范 - RequirementService提供统一的审计接口") 
-    print("  🟢 前端展示: 友好 - 时间线形式展示变更历史")
-    print("  🟡 权限控制: 基本完成 - 需验证所有场景")
-    print("  🟡 数据一致性: 需要验证 - 特别是中英文状态转换")
-    
-    print("\n✨ 总结:")
-    print("  需求审计功能实现较为完整，包含了完整的变更追踪、")
-    print("  历史记录、状态验证和可视化展示功能。建议重点关注")
-    print("  权限控制和数据一致性的验证。")
-    
-    return True
-
-if __name__ == '__main__':
-    analyze_audit_functionality()
\ No newline at end of file
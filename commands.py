@@ -0,0 +1,159 @@
+"""
+命令行维护命令
+通过 flask --app app <命令> 执行
+"""
+
+import click
+
+
+def register_commands(app):
+    """注册维护命令"""
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """重建需求全文检索索引"""
+        from services.search_service import RequirementSearchIndex
+
+        try:
+            count = RequirementSearchIndex.rebuild()
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'全文索引重建完成，共索引 {count} 条需求')
+
+    @app.cli.command('create-indexes')
+    def create_indexes():
+        """为已有数据库补建缺失的索引"""
+        from models import ensure_indexes
+
+        created = ensure_indexes()
+        for name in created:
+            click.echo(f'已创建索引: {name}')
+        click.echo(f'索引检查完成，新建 {len(created)} 个索引')
+
+    @app.cli.command('rebuild-stats-rollup')
+    def rebuild_stats_rollup():
+        """根据需求表全量重建统计汇总表"""
+        from services.stats_rollup import StatsRollupService
+
+        groups = StatsRollupService.rebuild()
+        click.echo(f'统计汇总表重建完成，共 {groups} 个分组')
+
+    @app.cli.command('rebuild-project-members')
+    def rebuild_project_members():
+        """根据需求表全量重建项目成员表"""
+        from services.membership_service import ProjectMemberService
+
+        count = ProjectMemberService.rebuild()
+        click.echo(f'项目成员表重建完成，共 {count} 条成员记录')
+
+    @app.cli.command('rebuild-code-sequences')
+    def rebuild_code_sequences():
+        """按需求表中已使用的编号校正需求编号序列"""
+        from services.code_sequence import CodeSequenceService
+
+        adjusted = CodeSequenceService.rebuild()
+        click.echo(f'需求编号序列校正完成，调整 {adjusted} 个前缀')
+
+    @app.cli.command('archive-history')
+    @click.option('--days', type=int, default=None, help='热表中保留的天数，默认为 HISTORY_HOT_DAYS')
+    @click.option('--batch-size', default=1000, show_default=True, help='每批移动的行数')
+    def archive_history(days, batch_size):
+        """把早于保留天数的需求历史移入归档库"""
+        from services.history_archive import HistoryArchiveService
+
+        count = HistoryArchiveService.archive(days, batch_size=batch_size)
+        click.echo(f'需求历史归档完成，共归档 {count} 条记录')
+
+    @app.cli.command('compact-baselines')
+    def compact_baselines():
+        """把旧格式基线中的完整需求快照转换为快照清单"""
+        from services.snapshot_store import SnapshotStore
+
+        count = SnapshotStore.compact_baselines()
+        click.echo(f'基线转换完成，共转换 {count} 个基线')
+
+    @app.cli.command('rebuild-checkpoints')
+    @click.option('--requirement-id', 'requirement_ids', type=int, multiple=True, help='只重建指定需求，可重复')
+    @click.option('--interval', type=int, default=None, help='检查点间隔，默认为 CHECKPOINT_INTERVAL')
+    def rebuild_checkpoints(requirement_ids, interval):
+        """按现有历史重建需求状态检查点"""
+        from services.checkpoint_service import CheckpointService
+
+        count = CheckpointService.rebuild(requirement_ids or None, interval=interval)
+        click.echo(f'检查点重建完成，共写入 {count} 个检查点')
+
+    @app.cli.command('audit-history')
+    @click.option('--user-id', type=int, help='操作人ID')
+    @click.option('--action', help='动作：create、update、status_change、delete')
+    @click.option('--field', 'field_name', help='变更的字段名')
+    @click.option('--project-id', type=int, help='项目ID')
+    @click.option('--requirement-id', type=int, help='需求ID')
+    @click.option('--start', help='开始时间（YYYY-MM-DD 或 ISO 8601）')
+    @click.option('--end', help='结束时间（YYYY-MM-DD 或 ISO 8601）')
+    @click.option('--limit', default=100, show_default=True, help='最多输出的历史行数')
+    def audit_history(limit, **options):
+        """查询需求变更审计记录"""
+        from services.audit_service import AuditService
+
+        try:
+            filters = AuditService.parse_filters(options)
+            items, next_cursor = AuditService.query(filters, limit=limit)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for item in items:
+            change = f" {item['field_name']}: {item['old_value']} -> {item['new_value']}" if item['field_name'] else ''
+            click.echo(f"{item['created_at']} {item['requirement_code'] or item['requirement_id']} "
+                       f"{item['user_name'] or '-'} {item['action']}{change}")
+        click.echo(f"共 {len(items)} 条{'，还有更多记录' if next_cursor else ''}")
+
+    @app.cli.command('flow-metrics')
+    @click.option('--project-id', type=int, help='项目ID')
+    @click.option('--assignee-id', type=int, help='负责人ID')
+    @click.option('--start', help='统计窗口开始时间（YYYY-MM-DD 或 ISO 8601）')
+    @click.option('--end', help='统计窗口结束时间（YYYY-MM-DD 或 ISO 8601）')
+    @click.option('--json', 'as_json', is_flag=True, help='以JSON输出完整结果')
+    def flow_metrics(as_json, **options):
+        """统计需求交付周期、开发周期、状态停留时间和完成数"""
+        import json
+        from services.flow_metrics import FlowMetricsService
+
+        try:
+            result = FlowMetricsService.compute(**FlowMetricsService.parse_filters(options))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if as_json:
+            click.echo(json.dumps(result, ensure_ascii=False, indent=2))
+            return
+
+        def describe(stats):
+            return (f"{stats['count']} 条，平均 {stats['mean']} 天，"
+                    f"P50 {stats['p50']} / P85 {stats['p85']} / P95 {stats['p95']}")
+
+        summary = result['summary']
+        click.echo(f"完成数: {summary['throughput']}")
+        click.echo(f"交付周期: {describe(summary['lead_time'])}")
+        click.echo(f"开发周期: {describe(summary['cycle_time'])}")
+        click.echo('状态停留时间:')
+        for stats in result['time_in_status']:
+            click.echo(f"  {stats['status']}: {describe(stats)}")
+        for title, key in (('按项目:', 'projects'), ('按负责人:', 'assignees')):
+            click.echo(title)
+            for group in result[key]:
+                click.echo(f"  {group['name']}: 完成 {group['throughput']} 条，"
+                           f"交付周期P50 {group['lead_time']['p50']} 天，开发周期P50 {group['cycle_time']['p50']} 天")
+
+    @app.cli.command('job-worker')
+    @click.option('--concurrency', default=1, show_default=True, help='同时执行的任务数')
+    @click.option('--processes', is_flag=True, help='使用进程池执行任务（默认线程池）')
+    @click.option('--once', is_flag=True, help='执行完当前排队的任务后退出')
+    @click.option('--poll-interval', default=2.0, show_default=True, help='没有任务时的轮询间隔（秒）')
+    def job_worker(concurrency, processes, once, poll_interval):
+        """轮询执行排队的后台任务（配合 JOB_EXECUTOR=worker 使用）"""
+        from services.job_service import JobService
+
+        if concurrency < 1:
+            raise click.BadParameter('必须大于0', param_hint='--concurrency')
+        click.echo(f"任务执行器已启动，{'进程' if processes else '线程'}数 {concurrency}")
+        finished = JobService.work(concurrency=concurrency, use_processes=processes,
+                                   once=once, poll_interval=poll_interval, echo=click.echo)
+        click.echo(f'任务执行器退出，共执行 {finished} 个任务')
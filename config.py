@@ -13,6 +13,30 @@ class Config:
     
     # 分页配置
     ITEMS_PER_PAGE = 20
+    MAX_ITEMS_PER_PAGE = 100  # 每页数量上限，防止用户传入过大的per_page
+    
+    # 批量导入每批插入并提交的行数
+    IMPORT_BATCH_SIZE = 500
+    
+    # 需求更新历史每次保存写一行变更集（JSON），False 时每个变更字段写一行
+    HISTORY_CHANGESETS = True
+    
+    # 需求历史归档：超过保留天数的历史由 flask archive-history 移入独立的归档库
+    HISTORY_HOT_DAYS = 180
+    SQLALCHEMY_BINDS = {
+        'history_archive': os.environ.get('HISTORY_ARCHIVE_URL') or 'sqlite:///history_archive.db'
+    }
+    
+    # 需求每累计多少条历史保存一个状态检查点，按时间点还原时最多重放这么多条历史
+    CHECKPOINT_INTERVAL = 20
+    
+    # 后台任务配置
+    # thread：提交后在Web进程的线程池中执行；worker：只入队，由 flask job-worker 命令执行
+    # 使用 worker 时必须另外常驻运行 flask job-worker（可多开），否则任务会一直排队，直到等待超时被标记为失败
+    JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR') or 'thread'
+    JOB_WORKERS = 2  # 线程池大小
+    JOB_PENDING_TIMEOUT = int(os.environ.get('JOB_PENDING_TIMEOUT') or 600)  # 排队超过该秒数未被领取的任务标记为失败
+    JOB_ARTIFACT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_artifacts')
     
     # 禁用验证码
     ENABLE_CAPTCHA = False
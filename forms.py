@@ -11,6 +11,66 @@ from wtforms.validators import EqualTo, ValidationError
 from wtforms import PasswordField, HiddenField
 import re
 
+
+def _user_choices(ids):
+    from services.typeahead_service import TypeaheadService
+    return TypeaheadService.user_choices(ids)
+
+
+def _dependency_choices(ids):
+    from services.typeahead_service import TypeaheadService
+    return TypeaheadService.requirement_choices(ids)
+
+
+class LookupSelectField(SelectField):
+    """选项由 typeahead 接口按需加载的单选字段
+
+    页面只渲染占位项和当前选中项，提交的ID通过 lookup 到数据库校验，
+    不再预先加载全部可选项。lookup 接收ID列表，返回其中有效的 (id, 名称)。
+    """
+
+    def __init__(self, label=None, validators=None, lookup=None, placeholder='', **kwargs):
+        super().__init__(label, validators, validate_choice=False, **kwargs)
+        self.lookup = lookup
+        self.placeholder = placeholder
+        self.choices = [('', placeholder)]
+
+    def _selected(self):
+        return [self.data] if self.data not in (None, '') else []
+
+    def pre_validate(self, form):
+        selected = set(str(value) for value in self._selected())
+        if selected and len(self.lookup(selected)) != len(selected):
+            raise ValidationError(self.gettext('Not a valid choice.'))
+
+    def __call__(self, **kwargs):
+        if self.data not in (None, ''):
+            self.data = str(self.data)
+        self.choices = [('', self.placeholder)] + self.lookup(self._selected())
+        return super().__call__(**kwargs)
+
+
+class LookupSelectMultipleField(SelectMultipleField):
+    """选项由 typeahead 接口按需加载的多选字段，校验方式同 LookupSelectField"""
+
+    def __init__(self, label=None, validators=None, lookup=None, **kwargs):
+        super().__init__(label, validators, validate_choice=False, **kwargs)
+        self.lookup = lookup
+        self.choices = []
+
+    def _selected(self):
+        return [value for value in (self.data or []) if value not in (None, '')]
+
+    def pre_validate(self, form):
+        selected = set(str(value) for value in self._selected())
+        if selected and len(self.lookup(selected)) != len(selected):
+            raise ValidationError(self.gettext('Not a valid choice.'))
+
+    def __call__(self, **kwargs):
+        self.choices = self.lookup(self._selected())
+        return super().__call__(**kwargs)
+
+
 class RequirementForm(FlaskForm):
     """增强版需求表单"""
     
@@ -51,8 +111,10 @@ class RequirementForm(FlaskForm):
     )
     
     # 人员信息
-    assignee_id = SelectField('负责人', validators=[Optional()])
-    reviewer_id = SelectField('评审人', validators=[Optional()])
+    assignee_id = LookupSelectField('负责人', validators=[Optional()],
+                                    lookup=_user_choices, placeholder='选择用户')
+    reviewer_id = LookupSelectField('评审人', validators=[Optional()],
+                                    lookup=_user_choices, placeholder='选择用户')
     
     # 详细描述
     background = TextAreaField('背景说明', validators=[Optional()])
@@ -87,7 +149,8 @@ class RequirementForm(FlaskForm):
     version = StringField('目标版本', validators=[Optional(), Length(max=20)])
     source = StringField('需求来源', validators=[Optional(), Length(max=100)])
     tags = SelectMultipleField('标签', validators=[Optional()])
-    dependencies = SelectMultipleField('依赖需求', validators=[Optional()])
+    dependencies = LookupSelectMultipleField('依赖需求', validators=[Optional()],
+                                             lookup=_dependency_choices)
     
     # 附件 - 支持多文件上传
     attachments = FileField('上传新附件', validators=[
@@ -101,64 +164,23 @@ class RequirementForm(FlaskForm):
         self.category_id.choices = [('', '选择分类')]
         self.module_id.choices = [('', '选择模块')]
         self.project_id.choices = [('', '选择项目')]
-        self.assignee_id.choices = [('', '选择负责人')]
-        self.reviewer_id.choices = [('', '选择评审人')]
         self.tags.choices = []
-        self.dependencies.choices = []
     
     def populate_choices(self):
-        """填充选择项数据（在视图中调用）"""
-        from models import Project, User, Category, Module, Tag, Requirement
+        """填充选择项数据（在视图中调用），数据来自进程内选择项缓存
+
+        负责人、评审人和依赖需求的数量可能很大，由页面通过 typeahead 接口按需检索，
+        这里不再填充。
+        """
+        from services.choice_cache import ChoiceCache
         
         # 填充项目选择项 - 显示更多状态的项目
-        project_choices = [('', '选择项目')]
-        for p in Project.query.filter(
-            Project.status.in_(['active', 'planning', 'completed', 'on_hold'])
-        ).order_by(Project.name).all():
-            project_choices.append((str(p.id), f"{p.name} ({p.status})"))
-        self.project_id.choices = project_choices
-        
-        # 填充用户选择项
-        active_users = User.query.filter_by(is_active=True).order_by(User.full_name, User.username).all()
-        user_choices = [('', '选择用户')]
-        for u in active_users:
-            user_choices.append((str(u.id), u.full_name or u.username))
-        
-        self.assignee_id.choices = user_choices
-        self.reviewer_id.choices = user_choices
+        self.project_id.choices = [('', '选择项目')] + ChoiceCache.form_projects()
         
-        # 填充其他选择项（可根据需要扩展）
-        try:
-            self.category_id.choices = [('', '选择分类')] + [
-                (str(c.id), c.name) for c in Category.query.order_by(Category.name).all()
-            ]
-        except:
-            pass  # 如果Category模型不存在，忽略
-            
-        try:
-            self.module_id.choices = [('', '选择模块')] + [
-                (str(m.id), m.name) for m in Module.query.order_by(Module.name).all()
-            ]
-        except:
-            pass  # 如果Module模型不存在，忽略
-            
-        try:
-            self.tags.choices = [
-                (str(t.id), t.name) for t in Tag.query.order_by(Tag.name).all()
-            ]
-        except:
-            pass  # 如果Tag模型不存在，忽略
-            
-        # 填充依赖选择项
-        try:
-            self.dependencies.choices = [('', 'No dependencies')] + [
-                (str(r.id), f"{r.code} - {r.title}") 
-                for r in Requirement.query.filter(
-                    Requirement.status.in_(['已批准', 'In progress', 'Completed'])
-                ).order_by(Requirement.code).all()
-            ]
-        except:
-            self.dependencies.choices = [('', 'No dependencies')]
+        # 填充其他选择项
+        self.category_id.choices = [('', '选择分类')] + ChoiceCache.categories()
+        self.module_id.choices = [('', '选择模块')] + ChoiceCache.modules()
+        self.tags.choices = ChoiceCache.tags()
 
 class RequirementFilterForm(FlaskForm):
     """需求筛选表单"""
@@ -221,9 +243,9 @@ class StatusChangeForm(FlaskForm):
 
 class BulkImportForm(FlaskForm):
     """批量导入表单"""
-    file = FileField('Excel文件', validators=[
+    file = FileField('Excel/CSV文件', validators=[
         DataRequired(),
-        FileAllowed(['xls', 'xlsx'], '只允许上传Excel文件')
+        FileAllowed(['xls', 'xlsx', 'csv'], '只允许上传Excel或CSV文件')
     ])
     project_id = SelectField('导入到项目', validators=[DataRequired()])
     
@@ -3,6 +3,7 @@ from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timezone, timedelta
 from enum import Enum
+from sqlalchemy import inspect
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
 
@@ -15,10 +16,71 @@ def beijing_now():
     """返回当前北京时间"""
     return datetime.now(BEIJING_TZ)
 
+def ensure_indexes():
+    """为已有数据库补建模型中声明但尚未创建的索引
+    
+    db.create_all() 只创建缺失的表，不会给已存在的表添加新索引。
+    
+    Returns:
+        新创建的索引名称列表
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
+
+def _model_tables():
+    """全部模型表及其所在的数据库引擎，SQLALCHEMY_BINDS 中的表（如归档库）不在主库"""
+    mappers = sorted(db.Model.registry.mappers, key=lambda mapper: mapper.local_table.name)
+    return [(mapper.local_table, db.session.get_bind(mapper=mapper)) for mapper in mappers]
+
+def ensure_columns():
+    """为已有数据库补建模型中新增的可空列
+
+    db.create_all() 只创建缺失的表，不会给已存在的表添加新列。
+
+    Returns:
+        新创建的列，格式为 表名.列名
+    """
+    inspectors = {}
+    created = []
+    for table, engine in _model_tables():
+        if engine not in inspectors:
+            inspectors[engine] = inspect(engine)
+        inspector = inspectors[engine]
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as connection:
+                connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+            created.append(f'{table.name}.{column.name}')
+    return created
+
 def init_db(app):
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        created_columns = ensure_columns()
+        if 'requirement_history.project_id' in created_columns:
+            # 新增的冗余列按需求当前所属项目回填
+            from services.history_service import HistoryService
+            HistoryService.backfill_project_ids()
+        if 'requirement_history_archive.new_status' in created_columns:
+            # 已归档的状态变化从压缩内容中回填到状态列
+            from services.history_archive import HistoryArchiveService
+            HistoryArchiveService.backfill_statuses()
         
         # 创建默认管理员用户
         admin_user = User.query.filter_by(username='admin').first()
@@ -37,6 +99,16 @@ def init_db(app):
         else:
             print(f'管理员用户已存在: {admin_user.username}')
         
+        # 创建需求全文索引（在函数内导入，避免循环导入）
+        from services.search_service import RequirementSearchIndex
+        RequirementSearchIndex.ensure_index()
+        
+        # 已有数据库首次启用统计汇总表、项目成员表时进行初始化
+        from services.stats_rollup import StatsRollupService
+        StatsRollupService.ensure_populated()
+        from services.membership_service import ProjectMemberService
+        ProjectMemberService.ensure_populated()
+        
 # 关联表
 requirement_dependencies = db.Table('requirement_dependencies',
     db.Column('parent_id', db.Integer, db.ForeignKey('requirement.id'), primary_key=True),
@@ -82,6 +154,23 @@ class Priority(Enum):
 class Requirement(db.Model):
     """增强版需求模型"""
     __tablename__ = 'requirement'
+    __table_args__ = (
+        # 列表筛选、统计分组和权限检查使用的列
+        db.Index('ix_requirement_status', 'status'),
+        db.Index('ix_requirement_priority', 'priority'),
+        db.Index('ix_requirement_type', 'type'),
+        db.Index('ix_requirement_creator_id', 'creator_id'),
+        db.Index('ix_requirement_reviewer_id', 'reviewer_id'),
+        db.Index('ix_requirement_due_date', 'due_date'),
+        db.Index('ix_requirement_created_at', 'created_at'),
+        db.Index('ix_requirement_updated_at', 'updated_at'),
+        # 组合索引的前缀列同时覆盖 project_id、assignee_id 的单列查询
+        db.Index('ix_requirement_project_status', 'project_id', 'status'),
+        db.Index('ix_requirement_project_created_at', 'project_id', 'created_at'),
+        db.Index('ix_requirement_assignee_status', 'assignee_id', 'status'),
+        # 依赖需求选择器按标题前缀检索（编号已有唯一索引）
+        db.Index('ix_requirement_title', 'title'),
+    )
     
     # 基本信息
     id = db.Column(db.Integer, primary_key=True)
@@ -108,13 +197,14 @@ class Requirement(db.Model):
     version = db.Column(db.String(20))  # 目标版本
     
     # 详细描述
-    background = db.Column(db.Text)  # 背景说明
-    objective = db.Column(db.Text)   # 目标
-    scope = db.Column(db.Text)       # 范围
-    acceptance_criteria = db.Column(db.Text)  # 验收标准
-    assumptions = db.Column(db.Text)  # 假设条件
-    constraints = db.Column(db.Text)  # 约束条件
-    risks = db.Column(db.Text)        # 风险说明
+    # 详情页和编辑页才用到，延迟到首次访问时一起加载
+    background = db.deferred(db.Column(db.Text), group='details')  # 背景说明
+    objective = db.deferred(db.Column(db.Text), group='details')   # 目标
+    scope = db.deferred(db.Column(db.Text), group='details')       # 范围
+    acceptance_criteria = db.deferred(db.Column(db.Text), group='details')  # 验收标准
+    assumptions = db.deferred(db.Column(db.Text), group='details')  # 假设条件
+    constraints = db.deferred(db.Column(db.Text), group='details')  # 约束条件
+    risks = db.deferred(db.Column(db.Text), group='details')        # 风险说明
     
     # 估算信息
     estimated_hours = db.Column(db.Float)  # 预估工时
@@ -278,6 +368,11 @@ class Project(db.Model):
 
 class User(UserMixin, db.Model):
     """用户"""
+    __table_args__ = (
+        # 人员选择器按姓名前缀检索（用户名已有唯一索引）
+        db.Index('ix_user_full_name', 'full_name'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -349,18 +444,126 @@ class Comment(db.Model):
 
 class RequirementHistory(db.Model):
     """需求变更历史"""
+    __table_args__ = (
+        db.Index('ix_requirement_history_requirement_created_at', 'requirement_id', 'created_at'),
+        # 审计查询按 (created_at, id) 倒序分页，各过滤条件的索引都以 created_at 结尾
+        db.Index('ix_requirement_history_created_at', 'created_at'),
+        db.Index('ix_requirement_history_user_created_at', 'user_id', 'created_at'),
+        db.Index('ix_requirement_history_project_created_at', 'project_id', 'created_at'),
+        db.Index('ix_requirement_history_action_created_at', 'action', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     requirement_id = db.Column(db.Integer, db.ForeignKey('requirement.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    project_id = db.Column(db.Integer)  # 变更时需求所属的项目（冗余，供审计按项目查询）
     action = db.Column(db.String(50))  # create, update, delete, status_change
     field_name = db.Column(db.String(100))
     old_value = db.Column(db.Text)
     new_value = db.Column(db.Text)
+    changes = db.Column(db.Text)  # 变更集：一次更新的所有字段 {字段: [旧值, 新值]}，此时 field_name 为空
     comment = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=beijing_now)
     
     user = db.relationship('User')
 
+class RequirementHistoryArchive(db.Model):
+    """归档的需求变更历史，存放在归档库中
+
+    保留原记录的ID和可检索的列；字段名、新旧值、变更集和备注压缩为 payload。
+    归档库与主库不在同一个数据库，因此不声明外键。
+    """
+    __bind_key__ = 'history_archive'
+    __tablename__ = 'requirement_history_archive'
+    __table_args__ = (
+        db.Index('ix_requirement_history_archive_requirement_created_at', 'requirement_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 与原 requirement_history.id 相同
+    requirement_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer)
+    action = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime)
+    payload = db.Column(db.LargeBinary)  # deflate压缩的JSON
+    # 状态变化的旧值和新值，不压缩，供流转统计按列批量读取；不涉及状态的记录为空
+    old_status = db.Column(db.String(20))
+    new_status = db.Column(db.String(20))
+    archived_at = db.Column(db.DateTime, default=beijing_now)
+
+class RequirementCheckpoint(db.Model):
+    """需求状态检查点
+
+    需求每累计一定条数的历史保存一次全部字段的快照，按时间点还原需求时
+    从最近的检查点开始应用历史，而不必从创建时起重放全部历史。
+    """
+    __tablename__ = 'requirement_checkpoint'
+    __table_args__ = (
+        db.Index('ix_requirement_checkpoint_requirement_created_at', 'requirement_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    requirement_id = db.Column(db.Integer, db.ForeignKey('requirement.id'), nullable=False)
+    history_id = db.Column(db.Integer, nullable=False)  # 快照已包含的最后一条历史
+    created_at = db.Column(db.DateTime)  # 与该历史的时间相同
+    state = db.Column(db.LargeBinary)  # deflate压缩的字段快照JSON
+
+class RequirementStatsRollup(db.Model):
+    """需求统计汇总
+    
+    按 (项目, 负责人, 状态, 优先级, 类型) 分组的需求数量和工时合计，
+    由 StatsRollupService 在需求增删改时增量维护。
+    主键列不允许为空，未关联项目/负责人记为0，空的状态/优先级/类型记为空字符串。
+    """
+    __tablename__ = 'requirement_stats_rollup'
+    
+    project_id = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+    assignee_id = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+    status = db.Column(db.String(20), primary_key=True, default='')
+    priority = db.Column(db.String(20), primary_key=True, default='')
+    type = db.Column(db.String(20), primary_key=True, default='')
+    requirement_count = db.Column(db.Integer, nullable=False, default=0)
+    estimated_hours = db.Column(db.Float, nullable=False, default=0)
+    actual_hours = db.Column(db.Float, nullable=False, default=0)
+
+class ProjectMember(db.Model):
+    """项目成员（由需求的创建人、负责人、评审人物化而来）
+    
+    每个角色保存该用户在项目中以此角色关联的需求数量，
+    由 ProjectMemberService 在需求增删改时增量维护，所有计数为0时删除该行。
+    """
+    __tablename__ = 'project_member'
+    __table_args__ = (
+        db.Index('ix_project_member_user_id', 'user_id'),
+    )
+    
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, autoincrement=False)
+    creator_count = db.Column(db.Integer, nullable=False, default=0)
+    assignee_count = db.Column(db.Integer, nullable=False, default=0)
+    reviewer_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    user = db.relationship('User')
+    
+    @property
+    def roles(self):
+        """用户在项目中的角色列表（creator, assignee, reviewer）"""
+        return [role for role in ('creator', 'assignee', 'reviewer')
+                if getattr(self, f'{role}_count') > 0]
+
+class TableVersion(db.Model):
+    """数据表版本号，表中数据变化时递增，用于使进程内缓存失效"""
+    __tablename__ = 'table_version'
+    
+    table_name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class CodeSequence(db.Model):
+    """需求编号序列，每个编号前缀一行，记录已分配的最大序号"""
+    __tablename__ = 'code_sequence'
+    
+    prefix = db.Column(db.String(50), primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
 class TestCase(db.Model):
     """测试用例"""
     id = db.Column(db.Integer, primary_key=True)
@@ -394,9 +597,63 @@ class Baseline(db.Model):
     version = db.Column(db.String(20), nullable=False)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'))
     description = db.Column(db.Text)
-    requirements_snapshot = db.Column(db.Text)  # JSON格式存储需求快照
+    requirements_snapshot = db.Column(db.Text)  # 旧格式：JSON格式存储需求快照
+    manifest = db.Column(db.LargeBinary)  # 需求快照清单：按需求ID顺序拼接的快照摘要，见 SnapshotStore
+    requirement_count = db.Column(db.Integer)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=beijing_now)
     
     project = db.relationship('Project')
     creator = db.relationship('User')
+
+class SnapshotBlob(db.Model):
+    """按内容寻址的需求快照，基线清单通过摘要引用"""
+    __tablename__ = 'snapshot_blob'
+    
+    digest = db.Column(db.String(64), primary_key=True)  # 快照JSON的SHA-256（十六进制）
+    data = db.Column(db.LargeBinary, nullable=False)  # deflate压缩的快照JSON
+    size = db.Column(db.Integer)  # 压缩前的字节数
+    created_at = db.Column(db.DateTime, default=beijing_now)
+
+class Job(db.Model):
+    """后台任务（导入、导出、基线创建等），由进程内线程池或 job-worker 命令执行"""
+    __table_args__ = (
+        # 工作进程按状态和ID领取任务，用户按创建人查看最近的任务
+        db.Index('ix_job_status_id', 'status', 'id'),
+        db.Index('ix_job_created_by_created_at', 'created_by', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(20), nullable=False)  # import, export, baseline
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, succeeded, failed
+    params = db.Column(db.Text)  # JSON格式的任务参数
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 进度百分比
+    message = db.Column(db.String(500))  # 当前进度说明或失败原因
+    result = db.Column(db.Text)  # JSON格式的任务结果
+    artifact_path = db.Column(db.String(500))  # 结果文件路径
+    artifact_name = db.Column(db.String(255))  # 结果文件下载名称
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=beijing_now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    creator = db.relationship('User')
+    
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'has_artifact': bool(self.artifact_path),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
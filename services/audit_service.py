@@ -0,0 +1,127 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import or_, exists, func, select
+from models import db, Requirement, RequirementHistory
+from services.history_service import HistoryService, HistoryEntry
+from services.loading_profiles import loading_options
+from services.pagination import encode_cursor, decode_cursor, older_than
+
+DEFAULT_AUDIT_LIMIT = 50
+MAX_AUDIT_LIMIT = 500
+
+# 审计查询支持的过滤条件
+AUDIT_FILTERS = ('user_id', 'action', 'field_name', 'project_id', 'requirement_id', 'start', 'end')
+
+
+def _changed_field(field_name: str):
+    """历史行改动了指定字段：按字段存储的行比较 field_name，变更集行检查 changes 中的键"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        keys = func.json_each(RequirementHistory.changes).table_valued('key')
+        in_changes = exists(select(keys.c.key).where(keys.c.key == field_name))
+    else:
+        in_changes = RequirementHistory.changes.like(f'%"{field_name}":[%')
+    return or_(
+        RequirementHistory.field_name == field_name,
+        RequirementHistory.changes.isnot(None) & in_changes
+    )
+
+
+class AuditService:
+    """需求变更审计查询
+
+    在热表 requirement_history 上按操作人、动作、字段、项目、需求和时间范围过滤，
+    按 (created_at, id) 倒序游标分页。操作人、动作、项目和时间各有以 created_at 结尾的组合索引，
+    每页只读取 limit + 1 行；字段条件需要检查变更集，建议与其他条件组合使用。
+    已归档的历史不在查询范围内，可通过需求时间线查看。
+    """
+
+    @staticmethod
+    def query(filters: Dict, limit: int = DEFAULT_AUDIT_LIMIT,
+              cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """审计查询
+
+        Args:
+            filters: 过滤条件，见 AUDIT_FILTERS；start/end 为 datetime，包含边界
+            limit: 每页的历史行数
+            cursor: 上一页返回的 next_cursor
+
+        Returns:
+            (审计条目字典列表, 下一页游标)，变更集展开为逐字段条目，指定 field_name 时只保留该字段
+
+        Raises:
+            InvalidCursor: 游标无法解析
+        """
+        limit = max(1, min(limit or DEFAULT_AUDIT_LIMIT, MAX_AUDIT_LIMIT))
+
+        query = RequirementHistory.query.options(*loading_options('history'))
+        for column in ('user_id', 'action', 'project_id', 'requirement_id'):
+            if filters.get(column) is not None:
+                query = query.filter(getattr(RequirementHistory, column) == filters[column])
+        if filters.get('field_name'):
+            query = query.filter(_changed_field(filters['field_name']))
+        if filters.get('start'):
+            query = query.filter(RequirementHistory.created_at >= filters['start'])
+        if filters.get('end'):
+            query = query.filter(RequirementHistory.created_at <= filters['end'])
+        if cursor:
+            created_at, history_id, _ = decode_cursor(cursor)
+            query = query.filter(older_than(RequirementHistory, created_at, history_id))
+
+        rows = query.order_by(RequirementHistory.created_at.desc(),
+                              RequirementHistory.id.desc()).limit(limit + 1).all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], 'next') if rows and has_next else None
+
+        entries: List[HistoryEntry] = HistoryService.expand(rows)
+        if filters.get('field_name'):
+            entries = [entry for entry in entries if entry.field_name == filters['field_name']]
+
+        # 一次查出本页涉及的需求编号
+        project_ids = {row.id: row.project_id for row in rows}
+        requirement_ids = {entry.requirement_id for entry in entries if entry.requirement_id}
+        codes = {}
+        if requirement_ids:
+            codes = dict(db.session.query(Requirement.id, Requirement.code).filter(
+                Requirement.id.in_(requirement_ids)
+            ).all())
+
+        items = []
+        for entry in entries:
+            item = entry.to_dict()
+            item['project_id'] = project_ids.get(entry.id)
+            item['requirement_code'] = codes.get(entry.requirement_id)
+            items.append(item)
+        return items, next_cursor
+
+    @staticmethod
+    def parse_filters(args) -> Dict:
+        """从请求参数解析审计过滤条件，日期格式为 YYYY-MM-DD 或 ISO 8601
+
+        Raises:
+            ValueError: 参数格式不正确
+        """
+        filters = {}
+        for name in ('user_id', 'project_id', 'requirement_id'):
+            value = args.get(name)
+            if value not in (None, ''):
+                try:
+                    filters[name] = int(value)
+                except ValueError:
+                    raise ValueError(f'{name} 必须是整数')
+        for name in ('action', 'field_name'):
+            if args.get(name):
+                filters[name] = args[name]
+        for name in ('start', 'end'):
+            value = args.get(name)
+            if not value:
+                continue
+            try:
+                moment = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f'{name} 日期格式不正确: {value}')
+            # 只给日期时，结束时间取当天最后一刻
+            if name == 'end' and len(value) == 10:
+                moment = moment.replace(hour=23, minute=59, second=59, microsecond=999999)
+            filters[name] = moment
+        return filters
@@ -0,0 +1,243 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+from flask import current_app
+from sqlalchemy import func
+from models import db, Requirement, RequirementHistory, RequirementCheckpoint, BEIJING_TZ
+from services.compression import pack_json, unpack_json
+from services.history_service import HistoryService
+from services.history_archive import HistoryArchiveService
+
+# 快照不包含的列：updated_at 的变化不记入历史，无法按时间点还原
+SNAPSHOT_EXCLUDED = ('updated_at',)
+
+SNAPSHOT_COLUMNS = {column.name: column for column in Requirement.__table__.columns
+                    if column.name not in SNAPSHOT_EXCLUDED}
+
+
+class AsOfResult(NamedTuple):
+    """按时间点还原的需求"""
+    state: Dict[str, Any]
+    checkpoint_id: Optional[int]  # 使用的检查点，None表示从当前数据回推
+    replayed: int  # 应用的历史记录条数
+
+
+def _naive(moment: datetime) -> datetime:
+    # 数据库中保存的是不带时区的北京时间
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(BEIJING_TZ).replace(tzinfo=None)
+    return moment
+
+
+def _coerce(field: str, value):
+    """把按字段存储的历史中的 str(value) 还原为快照中的JSON值"""
+    if value is None or value == 'None':
+        return None
+    try:
+        python_type = SNAPSHOT_COLUMNS[field].type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is bool:
+        return value == 'True'
+    if python_type in (int, float):
+        try:
+            return python_type(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _row_changes(row) -> Dict[str, List]:
+    """历史行改动的快照字段 {字段: [旧值, 新值]}，创建、删除等行没有字段变更"""
+    if row.changes:
+        changes = HistoryService.decode_changes(row.changes)
+    elif row.field_name:
+        changes = {row.field_name: [row.old_value, row.new_value]}
+        changes = {field: [_coerce(field, old), _coerce(field, new)]
+                   for field, (old, new) in changes.items() if field in SNAPSHOT_COLUMNS}
+    else:
+        return {}
+    return {field: values for field, values in changes.items() if field in SNAPSHOT_COLUMNS}
+
+
+def parse_moment(value: Optional[str]) -> datetime:
+    """解析时间点参数，格式为 YYYY-MM-DD 或 ISO 8601，只给日期时取当天最后一刻
+
+    Raises:
+        ValueError: 缺少参数或格式不正确
+    """
+    if not value:
+        raise ValueError('缺少时间点参数 at')
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'时间点格式不正确: {value}')
+    if len(value) == 10:
+        moment = moment.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return moment
+
+
+class CheckpointService:
+    """需求状态检查点和按时间点还原
+
+    需求每累计 CHECKPOINT_INTERVAL 条历史写入一个检查点，保存当时全部字段的压缩快照。
+    还原某一时刻的需求时，从该时刻之前最近的检查点向后应用新值；
+    之前没有检查点时，从之后最近的检查点（或当前数据）向前撤销旧值。
+    两个检查点之间最多相隔 CHECKPOINT_INTERVAL 条历史，还原代价与需求的历史总长度无关。
+    """
+
+    @staticmethod
+    def snapshot(requirement: Requirement) -> Dict[str, Any]:
+        """需求当前的字段快照，值与变更集中的表示一致（日期等为字符串）"""
+        state = {name: getattr(requirement, name) for name in SNAPSHOT_COLUMNS}
+        return unpack_json(pack_json(state))
+
+    @staticmethod
+    def _add(requirement_id: int, history_id: int, created_at, state: Dict):
+        db.session.add(RequirementCheckpoint(
+            requirement_id=requirement_id,
+            history_id=history_id,
+            created_at=created_at,
+            state=pack_json(state)
+        ))
+
+    @staticmethod
+    def record(requirement: Requirement, interval: Optional[int] = None) -> bool:
+        """距上一个检查点的历史达到间隔时，在当前事务中为需求的当前状态写入检查点
+
+        在需求修改和历史记录都加入会话之后、提交之前调用。
+
+        Returns:
+            是否写入了检查点
+        """
+        interval = interval or current_app.config.get('CHECKPOINT_INTERVAL', 20)
+        db.session.flush()
+
+        last_history_id = db.session.query(func.max(RequirementCheckpoint.history_id)).filter(
+            RequirementCheckpoint.requirement_id == requirement.id
+        ).scalar() or 0
+        pending, history_id, created_at = db.session.query(
+            func.count(RequirementHistory.id),
+            func.max(RequirementHistory.id),
+            func.max(RequirementHistory.created_at)
+        ).filter(
+            RequirementHistory.requirement_id == requirement.id,
+            RequirementHistory.id > last_history_id
+        ).one()
+        if pending < interval:
+            return False
+
+        CheckpointService._add(requirement.id, history_id, created_at, CheckpointService.snapshot(requirement))
+        return True
+
+    @staticmethod
+    def as_of(requirement_id: int, at: datetime) -> Optional[AsOfResult]:
+        """还原需求在指定时刻的字段值
+
+        Args:
+            requirement_id: 需求ID
+            at: 时间点，带时区时换算为北京时间
+
+        Returns:
+            AsOfResult，需求在该时刻尚未创建或已被删除时返回None
+        """
+        at = _naive(at)
+        requirement = Requirement.query.get(requirement_id)
+        if requirement is None or (requirement.created_at and requirement.created_at > at):
+            return None
+
+        previous = RequirementCheckpoint.query.filter(
+            RequirementCheckpoint.requirement_id == requirement_id,
+            RequirementCheckpoint.created_at <= at
+        ).order_by(RequirementCheckpoint.created_at.desc(), RequirementCheckpoint.id.desc()).first()
+        if previous is not None:
+            state = unpack_json(previous.state)
+            rows = HistoryArchiveService.history_rows(requirement_id, after_id=previous.history_id, until=at)
+            for row in rows:
+                for field, (old_value, new_value) in _row_changes(row).items():
+                    state[field] = new_value
+            return AsOfResult(state, previous.id, len(rows))
+
+        following = RequirementCheckpoint.query.filter(
+            RequirementCheckpoint.requirement_id == requirement_id,
+            RequirementCheckpoint.created_at > at
+        ).order_by(RequirementCheckpoint.created_at, RequirementCheckpoint.id).first()
+        if following is not None:
+            state = unpack_json(following.state)
+            rows = HistoryArchiveService.history_rows(requirement_id, up_to_id=following.history_id, since=at)
+        else:
+            state = CheckpointService.snapshot(requirement)
+            rows = HistoryArchiveService.history_rows(requirement_id, since=at)
+        for row in reversed(rows):
+            for field, (old_value, new_value) in _row_changes(row).items():
+                state[field] = old_value
+        return AsOfResult(state, following.id if following is not None else None, len(rows))
+
+    @staticmethod
+    def project_as_of(project_id: int, at: datetime) -> List[Dict[str, Any]]:
+        """还原项目在指定时刻的全部需求，按编号排序
+
+        候选需求为当前属于该项目的需求，以及历史记录中曾在该项目下的需求；
+        逐个还原后只保留当时属于该项目的需求。
+        归档的历史不保留项目列，之后移出该项目、且相关历史已归档的需求不在候选范围内。
+        """
+        at = _naive(at)
+        candidates = {row.id for row in db.session.query(Requirement.id).filter(
+            Requirement.project_id == project_id,
+            Requirement.created_at <= at
+        )}
+        candidates.update(row.requirement_id for row in db.session.query(
+            RequirementHistory.requirement_id
+        ).filter(
+            RequirementHistory.project_id == project_id,
+            RequirementHistory.created_at <= at
+        ).distinct())
+
+        states = []
+        for requirement_id in sorted(candidates):
+            result = CheckpointService.as_of(requirement_id, at)
+            if result is not None and result.state.get('project_id') == project_id:
+                states.append(result.state)
+        return sorted(states, key=lambda state: state.get('code') or '')
+
+    @staticmethod
+    def rebuild(requirement_ids: Optional[Iterable[int]] = None, interval: Optional[int] = None) -> int:
+        """为已有需求重建检查点
+
+        从当前数据出发按历史倒序撤销变更，每撤销 interval 条写入一个检查点，
+        已有历史的需求因此也能在有限步数内还原到任意时刻。
+
+        Args:
+            requirement_ids: 需要重建的需求，默认为全部需求
+            interval: 检查点间隔，默认为 CHECKPOINT_INTERVAL
+
+        Returns:
+            写入的检查点数量
+        """
+        interval = interval or current_app.config.get('CHECKPOINT_INTERVAL', 20)
+        if requirement_ids is None:
+            requirement_ids = [row.id for row in db.session.query(Requirement.id).order_by(Requirement.id)]
+
+        written = 0
+        for requirement_id in requirement_ids:
+            requirement = Requirement.query.get(requirement_id)
+            if requirement is None:
+                continue
+            RequirementCheckpoint.query.filter_by(requirement_id=requirement_id).delete(synchronize_session=False)
+
+            state = CheckpointService.snapshot(requirement)
+            rows = HistoryArchiveService.history_rows(requirement_id)
+            for undone, index in enumerate(range(len(rows) - 1, 0, -1), start=1):
+                for field, (old_value, new_value) in _row_changes(rows[index]).items():
+                    state[field] = old_value
+                if undone % interval == 0:
+                    # 撤销到这里的状态即应用完前一条历史之后的状态
+                    previous = rows[index - 1]
+                    CheckpointService._add(requirement_id, previous.id, previous.created_at, dict(state))
+                    written += 1
+            db.session.commit()
+        return written
+
+    @staticmethod
+    def purge(requirement_id: int):
+        """删除需求的检查点（删除需求时调用）"""
+        RequirementCheckpoint.query.filter_by(requirement_id=requirement_id).delete(synchronize_session=False)
@@ -0,0 +1,155 @@
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+from flask import g, has_request_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, TableVersion, Project, Module, User, Category, Tag
+from services.counters import increment_counters
+
+# 选择项缓存依赖的表及影响选择项的列，新增、删除或这些列变化时递增 table_version
+TRACKED_COLUMNS = {
+    Project.__table__.name: ('name', 'status'),
+    Module.__table__.name: ('name',),
+    User.__table__.name: ('username', 'full_name', 'is_active'),
+    Category.__table__.name: ('name',),
+    Tag.__table__.name: ('name',),
+}
+
+
+class ChoiceCache:
+    """进程内的下拉选择项缓存
+
+    每个缓存项记录生成时依赖表的版本号，读取时与 table_version 中的当前版本比较，
+    版本变化即重新加载。版本号在同一事务中随数据修改递增，多个工作进程之间也能正确失效。
+    每个请求只查询一次 table_version。
+    """
+
+    _entries: Dict[str, Tuple[Tuple[int, ...], List]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _versions() -> Dict[str, int]:
+        if has_request_context() and '_table_versions' in g:
+            return g._table_versions
+        versions = dict(db.session.query(TableVersion.table_name, TableVersion.version).all())
+        if has_request_context():
+            g._table_versions = versions
+        return versions
+
+    @staticmethod
+    def get(name: str, tables: Iterable[str], loader: Callable[[], List]) -> List:
+        """读取缓存项，依赖表版本变化时调用 loader 重新加载
+
+        Args:
+            name: 缓存项名称
+            tables: 依赖的表名
+            loader: 返回选择项列表的函数
+
+        Returns:
+            选择项列表的副本
+        """
+        versions = ChoiceCache._versions()
+        key = tuple(versions.get(table, 0) for table in tables)
+        entry = ChoiceCache._entries.get(name)
+        if entry is None or entry[0] != key:
+            value = loader()
+            with ChoiceCache._lock:
+                ChoiceCache._entries[name] = (key, value)
+            return list(value)
+        return list(entry[1])
+
+    @staticmethod
+    def clear():
+        """清空进程内缓存"""
+        with ChoiceCache._lock:
+            ChoiceCache._entries.clear()
+
+    @staticmethod
+    def invalidate(*tables: str, session=None):
+        """递增表版本号，用于绕过ORM的批量写入"""
+        session = session or db.session
+        for table in tables:
+            increment_counters(TableVersion, {'table_name': table}, {'version': 1}, session=session)
+        if has_request_context():
+            g.pop('_table_versions', None)
+
+    # 常用选择项
+
+    @staticmethod
+    def all_projects() -> List[Tuple[str, str]]:
+        """全部项目 (id, 名称)"""
+        return ChoiceCache.get('all_projects', ('project',), lambda: [
+            (str(p.id), p.name) for p in db.session.query(Project.id, Project.name).all()
+        ])
+
+    @staticmethod
+    def all_modules() -> List[Tuple[str, str]]:
+        """全部模块 (id, 名称)"""
+        return ChoiceCache.get('all_modules', ('module',), lambda: [
+            (str(m.id), m.name) for m in db.session.query(Module.id, Module.name).all()
+        ])
+
+    @staticmethod
+    def active_users() -> List[Tuple[str, str]]:
+        """在职用户 (id, 姓名)"""
+        return ChoiceCache.get('active_users', ('user',), lambda: [
+            (str(u.id), u.full_name) for u in db.session.query(User.id, User.full_name)
+            .filter(User.is_active == True).all()
+        ])
+
+    @staticmethod
+    def form_projects() -> List[Tuple[str, str]]:
+        """需求表单中可选的项目 (id, 名称(状态))，按名称排序"""
+        return ChoiceCache.get('form_projects', ('project',), lambda: [
+            (str(p.id), f"{p.name} ({p.status})")
+            for p in db.session.query(Project.id, Project.name, Project.status).filter(
+                Project.status.in_(['active', 'planning', 'completed', 'on_hold'])
+            ).order_by(Project.name).all()
+        ])
+
+    @staticmethod
+    def categories() -> List[Tuple[str, str]]:
+        """需求分类 (id, 名称)，按名称排序"""
+        return ChoiceCache.get('categories', ('category',), lambda: [
+            (str(c.id), c.name) for c in db.session.query(Category.id, Category.name)
+            .order_by(Category.name).all()
+        ])
+
+    @staticmethod
+    def modules() -> List[Tuple[str, str]]:
+        """模块 (id, 名称)，按名称排序"""
+        return ChoiceCache.get('modules', ('module',), lambda: [
+            (str(m.id), m.name) for m in db.session.query(Module.id, Module.name)
+            .order_by(Module.name).all()
+        ])
+
+    @staticmethod
+    def tags() -> List[Tuple[str, str]]:
+        """标签 (id, 名称)，按名称排序"""
+        return ChoiceCache.get('tags', ('tag',), lambda: [
+            (str(t.id), t.name) for t in db.session.query(Tag.id, Tag.name).order_by(Tag.name).all()
+        ])
+
+
+def _table_name(obj):
+    table = getattr(type(obj), '__table__', None)
+    return table.name if table is not None else None
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_table_versions(session, flush_context, instances):
+    """被缓存的表有数据新增、删除或选择项相关列被修改时递增其版本号"""
+    changed = set()
+    for obj in list(session.new) + list(session.deleted):
+        table = _table_name(obj)
+        if table in TRACKED_COLUMNS:
+            changed.add(table)
+    for obj in session.dirty:
+        table = _table_name(obj)
+        if table not in TRACKED_COLUMNS or table in changed:
+            continue
+        attrs = inspect(obj).attrs
+        if any(attrs[column].history.has_changes() for column in TRACKED_COLUMNS[table]):
+            changed.add(table)
+    if changed:
+        ChoiceCache.invalidate(*sorted(changed), session=session)
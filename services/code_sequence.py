@@ -0,0 +1,90 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, CodeSequence, Requirement
+from services.counters import increment_counters
+
+
+class CodeSequenceService:
+    """需求编号序列
+
+    每个编号前缀在 code_sequence 表中一行，记录已分配的最大序号。
+    分配是对这一行的原子累加，行锁（SQLite为数据库写锁）一直持有到事务提交，
+    并发的请求或工作进程只会拿到互不重叠的序号区间，也不需要扫描需求表。
+    """
+
+    @staticmethod
+    def reserve(prefix: str, count: int = 1, session=None) -> range:
+        """在当前事务中预留 count 个连续序号
+
+        序号随调用方的事务一起提交；事务回滚时预留也一并撤销。
+
+        Args:
+            prefix: 编号前缀（项目编号或REQ）
+            count: 预留的数量
+            session: 使用的会话，默认为 db.session
+
+        Returns:
+            预留到的序号范围
+        """
+        if count < 1:
+            raise ValueError('预留数量必须大于0')
+        session = session or db.session
+
+        if session.query(CodeSequence.prefix).filter_by(prefix=prefix).first() is None:
+            CodeSequenceService._create(prefix, session)
+
+        if session.get_bind().dialect.name in ('sqlite', 'postgresql'):
+            increment_counters(CodeSequence, {'prefix': prefix}, {'last_value': count}, session=session)
+        else:
+            # 其他数据库：加行锁读取后累加
+            sequence = session.query(CodeSequence).filter_by(prefix=prefix).with_for_update().one()
+            sequence.last_value += count
+            session.flush()
+
+        last_value = session.query(CodeSequence.last_value).filter_by(prefix=prefix).scalar()
+        return range(last_value - count + 1, last_value + 1)
+
+    @staticmethod
+    def _create(prefix: str, session):
+        # 前缀第一次使用时从已有编号中找出最大序号作为起点，之后不再扫描需求表
+        last_value = CodeSequenceService.current_max(prefix, session)
+        table = CodeSequence.__table__
+        dialect = session.get_bind().dialect.name
+
+        if dialect in ('sqlite', 'postgresql'):
+            # 并发创建时只保留先插入的一行，后来者直接在其上累加
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            session.execute(insert(table).values(prefix=prefix, last_value=last_value)
+                            .on_conflict_do_nothing(index_elements=['prefix']))
+            return
+
+        session.add(CodeSequence(prefix=prefix, last_value=last_value))
+        session.flush()
+
+    @staticmethod
+    def current_max(prefix: str, session=None) -> int:
+        """需求表中该前缀已使用的最大序号（编号最后一段）"""
+        session = session or db.session
+        last_value = 0
+        start = f'{prefix}-'
+        for code, in session.query(Requirement.code).filter(Requirement.code.like(f'{start}%')):
+            number = code.rsplit('-', 1)[-1]
+            if code.startswith(start) and number.isdigit():
+                last_value = max(last_value, int(number))
+        return last_value
+
+    @staticmethod
+    def rebuild(session=None) -> int:
+        """按需求表中已使用的最大序号重新对齐所有序列，只会调大不会调小
+
+        Returns:
+            调整过的序列数量
+        """
+        session = session or db.session
+        adjusted = 0
+        for sequence in session.query(CodeSequence).all():
+            last_value = CodeSequenceService.current_max(sequence.prefix, session)
+            if last_value > sequence.last_value:
+                sequence.last_value = last_value
+                adjusted += 1
+        session.commit()
+        return adjusted
@@ -0,0 +1,30 @@
+import json
+import zlib
+from typing import Any
+
+
+def encode_json(value: Any, sort_keys: bool = False) -> bytes:
+    """把值编码为紧凑的UTF-8 JSON，日期、小数等JSON不支持的类型转为字符串
+
+    sort_keys=True 时键按字典序排列，相同内容总是得到相同的字节，可用于计算内容哈希。
+    """
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys,
+                      default=str).encode('utf-8')
+
+
+def deflate(data: bytes) -> bytes:
+    """deflate压缩（原始deflate流，不带zlib头和校验和）"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def pack_json(value: Any) -> bytes:
+    """把值编码为紧凑JSON后用deflate压缩"""
+    return deflate(encode_json(value))
+
+
+def unpack_json(data: bytes) -> Any:
+    """解压并解析 pack_json 的结果，空值返回None"""
+    if not data:
+        return None
+    return json.loads(zlib.decompress(data, -15).decode('utf-8'))
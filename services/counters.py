@@ -0,0 +1,36 @@
+from typing import Dict
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db
+
+
+def increment_counters(model, key: Dict, deltas: Dict, session=None):
+    """在当前事务中对计数表的一行做原子累加，行不存在时插入
+
+    Args:
+        model: 以 key 各列为主键的模型
+        key: 主键列的值
+        deltas: 计数列及其增量
+        session: 使用的会话，默认为 db.session
+    """
+    session = session or db.session
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table).values(**key, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={c: table.c[c] + stmt.excluded[c] for c in deltas}
+        )
+        session.execute(stmt)
+        return
+
+    # 其他数据库：按主键读取后更新
+    primary_key = tuple(key[c.name] for c in table.primary_key.columns)
+    row = session.get(model, primary_key)
+    if row is None:
+        session.add(model(**key, **deltas))
+    else:
+        for column, delta in deltas.items():
+            setattr(row, column, getattr(row, column) + delta)
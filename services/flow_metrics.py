@@ -0,0 +1,415 @@
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import JSON, String, case, cast, func, or_, type_coerce
+from models import (db, Requirement, RequirementHistory, RequirementHistoryArchive, RequirementStatus,
+                    Project, User, BEIJING_TZ)
+
+COMPLETED_STATUS = RequirementStatus.COMPLETED.value
+STARTED_STATUS = RequirementStatus.IN_DEVELOPMENT.value
+
+# 终止状态：停留在这些状态的时间不计入状态停留分布
+TERMINAL_STATUSES = (RequirementStatus.COMPLETED.value, RequirementStatus.REJECTED.value,
+                     RequirementStatus.CANCELLED.value)
+
+# 分布统计的分位数
+PERCENTILES = (0.5, 0.85, 0.95)
+
+# 状态变化只可能出现在这些动作的历史中
+STATUS_ACTIONS = ('status_change', 'update')
+
+TRANSITION_COLUMNS = ['id', 'requirement_id', 'created_at', 'old_status', 'new_status']
+
+SECONDS_PER_DAY = 86400.0
+
+# 按需求ID过滤归档库时每条查询的ID数
+ARCHIVE_ID_BATCH_SIZE = 500
+
+# 统计窗口截止到当前时间时，缓存的结果最多使用的秒数
+OPEN_WINDOW_CACHE_SECONDS = 300
+
+
+def _days(delta: pd.Series) -> pd.Series:
+    return delta.dt.total_seconds() / SECONDS_PER_DAY
+
+
+def _changeset_status(index: int):
+    """变更集 changes 中 status 项的旧值（index=0）或新值（index=1），由数据库解析JSON
+
+    不支持JSON函数的数据库返回None，由 _split_statuses 在读出后解析。
+    """
+    changes = RequirementHistory.changes
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return func.json_extract(changes, f'$.status[{index}]')
+    if dialect == 'mysql':
+        return func.json_unquote(func.json_extract(changes, f'$.status[{index}]'))
+    if dialect == 'postgresql':
+        return func.json_extract_path_text(cast(changes, JSON), 'status', str(index))
+    return None
+
+
+def _split_statuses(frame: pd.DataFrame) -> pd.DataFrame:
+    """从历史行取出状态的旧值和新值（不支持JSON函数的数据库）
+
+    按字段存储的行直接取 old_value/new_value；变更集行解析 changes 后取 status 项，
+    不含状态变化的变更集行被丢弃。
+    """
+    changesets = frame['changes'].notna()
+    if changesets.any():
+        status_pairs = frame.loc[changesets, 'changes'].map(json.loads).str.get('status')
+        frame.loc[changesets, 'old_value'] = status_pairs.str[0]
+        frame.loc[changesets, 'new_value'] = status_pairs.str[1]
+    frame = frame[frame['new_value'].notna() & (changesets | (frame['field_name'] == 'status'))]
+    return frame.rename(columns={'old_value': 'old_status', 'new_value': 'new_status'})[TRANSITION_COLUMNS]
+
+
+def _read_frame(query, columns) -> pd.DataFrame:
+    """在查询实体所在的数据库执行查询，直接构造 DataFrame，不生成ORM结果对象"""
+    mapper = query.column_descriptions[0]['entity']
+    rows = db.session.connection(bind_arguments={'mapper': mapper}).execute(query.statement).fetchall()
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+def _raw_datetime(column):
+    # 时间列按数据库原样读出（SQLite中为字符串），由 pd.to_datetime 整列解析，避免逐行转换为 datetime
+    return type_coerce(column, String)
+
+
+def _distribution(frame: pd.DataFrame, by, column: str) -> pd.DataFrame:
+    """按 by 分组统计 column 的数量、平均值和分位数"""
+    grouped = frame.groupby(by)[column]
+    table = pd.DataFrame({'count': grouped.size(), 'mean': grouped.mean()})
+    for percentile in PERCENTILES:
+        table[f'p{int(percentile * 100)}'] = grouped.quantile(percentile)
+    return table
+
+
+def _records(table: pd.DataFrame, index_name: Optional[str] = None) -> list:
+    """DataFrame 转为字典列表，数值保留两位小数，缺失值转为None"""
+    if index_name:
+        table = table.rename_axis(index_name).reset_index()
+    table = table.round(2).astype(object)
+    return table.where(table.notna(), None).to_dict('records')
+
+
+class FlowMetricsService:
+    """需求流转指标
+
+    从需求历史中的状态变化批量计算交付周期（创建到完成）、开发周期（首次进入开发到完成）、
+    各状态停留时间分布和每周完成数，并按项目和负责人分组。
+    状态变化一次性读入 pandas，全部计算为列运算，不逐行循环。
+
+    结果按过滤条件缓存在进程内，缓存项记录生成时的最大历史ID，
+    任何需求变更都会写入新的历史，读取时最大历史ID变化即重新计算。
+    统计窗口截止到当前时间（未指定 end 或 end 晚于当前时间）时，没有新历史结果也会随时间变化
+    （未完成需求的停留时间增加），缓存项还记录生成时所在的时间段，
+    每 OPEN_WINDOW_CACHE_SECONDS 秒重新计算一次。
+    """
+
+    _entries: Dict[Tuple, Tuple[int, Optional[int], Dict]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def latest_history_id() -> int:
+        return db.session.query(func.max(RequirementHistory.id)).scalar() or 0
+
+    @staticmethod
+    def compute(project_id: Optional[int] = None, assignee_id: Optional[int] = None,
+                start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict:
+        """读取流转指标，最大历史ID未变化时返回缓存的结果
+
+        Args:
+            project_id: 只统计该项目的需求
+            assignee_id: 只统计该负责人的需求
+            start: 统计窗口开始时间，默认不限
+            end: 统计窗口结束时间，默认为当前时间
+
+        Returns:
+            summary、projects、assignees、time_in_status、throughput 组成的字典，时间单位为天
+        """
+        key = (project_id, assignee_id, start, end)
+        now = datetime.now(BEIJING_TZ).replace(tzinfo=None)
+        time_bucket = None
+        if end is None or end > now:
+            time_bucket = int(now.timestamp() // OPEN_WINDOW_CACHE_SECONDS)
+        latest_id = FlowMetricsService.latest_history_id()
+        entry = FlowMetricsService._entries.get(key)
+        if entry is not None and entry[:2] == (latest_id, time_bucket):
+            return entry[2]
+
+        result = FlowMetricsService._calculate(project_id, assignee_id, start, end)
+        result['latest_history_id'] = latest_id
+        with FlowMetricsService._lock:
+            FlowMetricsService._entries[key] = (latest_id, time_bucket, result)
+        return result
+
+    @staticmethod
+    def parse_filters(args) -> Dict:
+        """从请求参数解析 project_id、assignee_id 和统计窗口 start/end（YYYY-MM-DD 或 ISO 8601）
+
+        Raises:
+            ValueError: 参数格式不正确
+        """
+        filters = {}
+        for name in ('project_id', 'assignee_id'):
+            value = args.get(name)
+            if value not in (None, ''):
+                try:
+                    filters[name] = int(value)
+                except ValueError:
+                    raise ValueError(f'{name} 必须是整数')
+        for name in ('start', 'end'):
+            value = args.get(name)
+            if not value:
+                continue
+            try:
+                moment = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f'{name} 日期格式不正确: {value}')
+            if moment.tzinfo is not None:
+                moment = moment.astimezone(BEIJING_TZ).replace(tzinfo=None)
+            # 只给日期时，结束时间取当天最后一刻
+            if name == 'end' and len(value) == 10:
+                moment = moment.replace(hour=23, minute=59, second=59, microsecond=999999)
+            filters[name] = moment
+        return filters
+
+    @staticmethod
+    def clear():
+        """清空进程内缓存"""
+        with FlowMetricsService._lock:
+            FlowMetricsService._entries.clear()
+
+    @staticmethod
+    def _requirement_filter(query, project_id: Optional[int], assignee_id: Optional[int]):
+        if project_id:
+            query = query.filter(Requirement.project_id == project_id)
+        if assignee_id:
+            query = query.filter(Requirement.assignee_id == assignee_id)
+        return query
+
+    @staticmethod
+    def load_requirements(project_id: Optional[int] = None, assignee_id: Optional[int] = None) -> pd.DataFrame:
+        """需求的项目、负责人、创建时间和当前状态，以需求ID为索引"""
+        query = FlowMetricsService._requirement_filter(db.session.query(
+            Requirement.id, Requirement.project_id, Requirement.assignee_id,
+            _raw_datetime(Requirement.created_at), Requirement.status
+        ), project_id, assignee_id)
+        frame = _read_frame(query, ['requirement_id', 'project_id', 'assignee_id', 'created_at', 'status'])
+        # 未关联项目/负责人记为0，与统计汇总表一致
+        frame[['project_id', 'assignee_id']] = frame[['project_id', 'assignee_id']].fillna(0).astype(int)
+        frame['created_at'] = pd.to_datetime(frame['created_at'])
+        return frame.set_index('requirement_id')
+
+    @staticmethod
+    def load_transitions(project_id: Optional[int] = None, assignee_id: Optional[int] = None) -> pd.DataFrame:
+        """状态变化（含已归档的历史），按需求和时间排序
+
+        热表中变更集行的 status 项由数据库的JSON函数取出，与按字段存储的行合成同样的旧值、新值列；
+        热表按需求当前的项目和负责人以子查询过滤。归档库与主库不在同一个数据库，
+        先从主库读出需求ID，再分批按ID过滤。归档的状态变化直接读取 old_status/new_status 列，不解压内容。
+        """
+        is_changeset = RequirementHistory.changes.isnot(None)
+        old_status, new_status = _changeset_status(0), _changeset_status(1)
+        if new_status is not None:
+            old_status = case((is_changeset, old_status), else_=RequirementHistory.old_value)
+            new_status = case((is_changeset, new_status), else_=RequirementHistory.new_value)
+            columns = (old_status, new_status)
+        else:
+            columns = (RequirementHistory.field_name, RequirementHistory.old_value, RequirementHistory.new_value,
+                       RequirementHistory.changes)
+        query = db.session.query(
+            RequirementHistory.id, RequirementHistory.requirement_id, _raw_datetime(RequirementHistory.created_at),
+            *columns
+        ).filter(
+            RequirementHistory.action.in_(STATUS_ACTIONS),
+            or_(RequirementHistory.field_name == 'status', RequirementHistory.changes.like('%"status":%'))
+        )
+        if new_status is not None:
+            # 值中恰好出现 "status": 的变更集行取不到 status 项
+            query = query.filter(new_status.isnot(None))
+        filtered = bool(project_id or assignee_id)
+        if filtered:
+            requirement_ids = FlowMetricsService._requirement_filter(
+                db.session.query(Requirement.id), project_id, assignee_id
+            )
+            query = query.filter(RequirementHistory.requirement_id.in_(requirement_ids))
+        if new_status is not None:
+            hot = _read_frame(query, TRANSITION_COLUMNS)
+        else:
+            hot = _split_statuses(_read_frame(
+                query, ['id', 'requirement_id', 'created_at', 'field_name', 'old_value', 'new_value', 'changes']
+            ))
+
+        archived = db.session.query(
+            RequirementHistoryArchive.id, RequirementHistoryArchive.requirement_id,
+            _raw_datetime(RequirementHistoryArchive.created_at),
+            RequirementHistoryArchive.old_status, RequirementHistoryArchive.new_status
+        ).filter(RequirementHistoryArchive.new_status.isnot(None))
+        if filtered:
+            ids = [row.id for row in requirement_ids]
+            batches = [archived.filter(RequirementHistoryArchive.requirement_id.in_(ids[i:i + ARCHIVE_ID_BATCH_SIZE]))
+                       for i in range(0, len(ids), ARCHIVE_ID_BATCH_SIZE)]
+        else:
+            batches = [archived]
+        cold = [_read_frame(batch, TRANSITION_COLUMNS) for batch in batches]
+
+        # 归档中途失败时同一记录可能同时在两边，保留热表中的一份
+        frame = pd.concat([hot] + cold, ignore_index=True).drop_duplicates('id')
+        frame['created_at'] = pd.to_datetime(frame['created_at'])
+        order = np.lexsort((frame['id'].values, frame['created_at'].values, frame['requirement_id'].values))
+        return frame.iloc[order].reset_index(drop=True)
+
+    @staticmethod
+    def _calculate(project_id, assignee_id, start, end) -> Dict:
+        generated_at = datetime.now(BEIJING_TZ).replace(tzinfo=None)
+        window_start = pd.Timestamp(start) if start else pd.Timestamp.min
+        window_end = pd.Timestamp(min(end, generated_at) if end else generated_at)
+
+        requirements = FlowMetricsService.load_requirements(project_id, assignee_id)
+        transitions = FlowMetricsService.load_transitions(project_id, assignee_id)
+        # 只保留过滤范围内的需求，已删除需求的历史也不参与统计
+        transitions = transitions[transitions['requirement_id'].isin(requirements.index)]
+
+        done = FlowMetricsService._completions(requirements, transitions)
+        done = done[(done['completed_at'] >= window_start) & (done['completed_at'] <= window_end)]
+        intervals = FlowMetricsService._status_intervals(requirements, transitions, window_start, window_end)
+
+        return {
+            'generated_at': generated_at.isoformat(),
+            'start': start.isoformat() if start else None,
+            'end': window_end.isoformat(),
+            'summary': FlowMetricsService._summary(done),
+            'projects': FlowMetricsService._grouped(done, intervals, 'project_id', FlowMetricsService._project_names()),
+            'assignees': FlowMetricsService._grouped(done, intervals, 'assignee_id', FlowMetricsService._user_names()),
+            'time_in_status': _records(_distribution(intervals, 'status', 'days'), 'status'),
+            'throughput': FlowMetricsService._weekly_throughput(done)
+        }
+
+    @staticmethod
+    def _completions(requirements: pd.DataFrame, transitions: pd.DataFrame) -> pd.DataFrame:
+        """当前为已完成状态的需求，及其交付周期和开发周期（天）
+
+        完成时间取最后一次进入已完成状态的时间，开发开始时间取首次进入开发中状态的时间，
+        从未进入开发中状态的需求没有开发周期。
+        """
+        completed_at = transitions[transitions['new_status'] == COMPLETED_STATUS] \
+            .groupby('requirement_id')['created_at'].max()
+        started_at = transitions[transitions['new_status'] == STARTED_STATUS] \
+            .groupby('requirement_id')['created_at'].min()
+
+        done = requirements[requirements['status'] == COMPLETED_STATUS].join(
+            pd.DataFrame({'completed_at': completed_at, 'started_at': started_at}), how='inner'
+        )
+        done = done[done['completed_at'].notna()]
+        done['lead_time'] = _days(done['completed_at'] - done['created_at'])
+        done['cycle_time'] = _days(done['completed_at'] - done['started_at'])
+        return done
+
+    @staticmethod
+    def _status_intervals(requirements: pd.DataFrame, transitions: pd.DataFrame,
+                          start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """需求在各状态停留的区间，截取到统计窗口内，返回 status、project_id、assignee_id、days
+
+        每次状态变化开始一个区间，到同一需求的下一次状态变化结束；
+        创建到第一次状态变化为初始状态的区间，没有状态变化的需求整个生命周期都在当前状态。
+        最后一个区间未结束时计算到窗口结束，终止状态的未结束区间不计入。
+        """
+        following = transitions.groupby('requirement_id')['created_at'].shift(-1)
+        changed = pd.DataFrame({
+            'requirement_id': transitions['requirement_id'],
+            'status': transitions['new_status'],
+            'starts_at': transitions['created_at'],
+            'ends_at': following
+        })
+
+        first = transitions.drop_duplicates('requirement_id')
+        initial = pd.DataFrame({
+            'requirement_id': first['requirement_id'],
+            'status': first['old_status'],
+            'starts_at': requirements['created_at'].reindex(first['requirement_id']).values,
+            'ends_at': first['created_at']
+        })
+
+        unchanged = requirements[~requirements.index.isin(first['requirement_id'])]
+        untouched = pd.DataFrame({
+            'requirement_id': unchanged.index,
+            'status': unchanged['status'].values,
+            'starts_at': unchanged['created_at'].values,
+            'ends_at': pd.NaT
+        })
+
+        intervals = pd.concat([initial, changed, untouched], ignore_index=True)
+        is_open = intervals['ends_at'].isna()
+        intervals = intervals[~(is_open & intervals['status'].isin(TERMINAL_STATUSES))]
+        intervals['ends_at'] = pd.to_datetime(intervals['ends_at']).fillna(end)
+
+        starts_at = intervals['starts_at'].where(intervals['starts_at'] > start, start)
+        ends_at = intervals['ends_at'].where(intervals['ends_at'] < end, end)
+        intervals['days'] = _days(ends_at - starts_at)
+        intervals = intervals[intervals['status'].notna() & (intervals['days'] > 0)]
+
+        owners = requirements[['project_id', 'assignee_id']].reindex(intervals['requirement_id'])
+        return intervals.assign(project_id=owners['project_id'].values, assignee_id=owners['assignee_id'].values)
+
+    @staticmethod
+    def _summary(done: pd.DataFrame) -> Dict:
+        summary = {'throughput': int(len(done))}
+        for metric in ('lead_time', 'cycle_time'):
+            values = done[metric].dropna()
+            stats = {'count': int(len(values)), 'mean': values.mean() if len(values) else np.nan}
+            for percentile in PERCENTILES:
+                stats[f'p{int(percentile * 100)}'] = values.quantile(percentile) if len(values) else np.nan
+            summary[metric] = {name: (None if pd.isna(value) else round(float(value), 2))
+                               for name, value in stats.items()}
+            summary[metric]['count'] = int(len(values))
+        return summary
+
+    @staticmethod
+    def _grouped(done: pd.DataFrame, intervals: pd.DataFrame, by: str, names: Dict[int, str]) -> list:
+        """按项目或负责人分组的交付周期、开发周期、完成数和各状态平均停留天数"""
+        lead = _distribution(done, by, 'lead_time').add_prefix('lead_time_')
+        cycle = _distribution(done.dropna(subset=['cycle_time']), by, 'cycle_time').add_prefix('cycle_time_')
+        table = lead.join(cycle, how='outer')
+        table['throughput'] = done.groupby(by).size()
+
+        # 各状态平均停留天数，一个状态一列
+        time_in_status = intervals.pivot_table(index=by, columns='status', values='days', aggfunc='mean')
+        table = table.join(time_in_status.add_prefix('status:'), how='outer')
+        table[['throughput', 'lead_time_count', 'cycle_time_count']] = \
+            table[['throughput', 'lead_time_count', 'cycle_time_count']].fillna(0)
+
+        groups = []
+        for record in _records(table.sort_index(), by):
+            group = {by: record.pop(by)}
+            group['name'] = names.get(group[by], '未分配' if by == 'assignee_id' else '未关联项目')
+            group['throughput'] = int(record.pop('throughput'))
+            for metric in ('lead_time', 'cycle_time'):
+                group[metric] = {name[len(metric) + 1:]: record.pop(name)
+                                 for name in list(record) if name.startswith(metric + '_')}
+                group[metric]['count'] = int(group[metric]['count'])
+            group['time_in_status'] = {name[len('status:'):]: value
+                                       for name, value in record.items() if value is not None}
+            groups.append(group)
+        return groups
+
+    @staticmethod
+    def _weekly_throughput(done: pd.DataFrame) -> list:
+        """每周（周一开始）完成的需求数"""
+        if done.empty:
+            return []
+        weekly = done.set_index('completed_at').resample('W-MON', label='left', closed='left').size()
+        return [{'week': week.strftime('%Y-%m-%d'), 'count': int(count)} for week, count in weekly.items()]
+
+    @staticmethod
+    def _project_names() -> Dict[int, str]:
+        return dict(db.session.query(Project.id, Project.name).all())
+
+    @staticmethod
+    def _user_names() -> Dict[int, str]:
+        return {id: full_name or username
+                for id, full_name, username in db.session.query(User.id, User.full_name, User.username)}
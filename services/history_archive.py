@@ -0,0 +1,236 @@
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+from flask import current_app
+from models import db, RequirementHistory, RequirementHistoryArchive, User, beijing_now
+from services.history_service import HistoryService, HistoryEntry
+from services.loading_profiles import loading_options
+from services.compression import pack_json, unpack_json
+from services.pagination import encode_cursor, decode_cursor, older_than
+
+# 每批归档的历史行数
+ARCHIVE_BATCH_SIZE = 1000
+
+DEFAULT_TIMELINE_LIMIT = 50
+MAX_TIMELINE_LIMIT = 200
+
+
+def _pack(row: RequirementHistory) -> bytes:
+    return pack_json({
+        'f': row.field_name,
+        'o': row.old_value,
+        'n': row.new_value,
+        'c': row.changes,
+        'm': row.comment
+    })
+
+
+def _status_change(row) -> Tuple[Optional[str], Optional[str]]:
+    """历史记录中状态的 (旧值, 新值)，不涉及状态时为 (None, None)"""
+    if row.changes:
+        old_status, new_status = HistoryService.decode_changes(row.changes).get('status', (None, None))
+        return old_status, new_status
+    if row.field_name == 'status':
+        return row.old_value, row.new_value
+    return None, None
+
+
+def _archive_row(row: RequirementHistory) -> Dict:
+    old_status, new_status = _status_change(row)
+    return {
+        'id': row.id,
+        'requirement_id': row.requirement_id,
+        'user_id': row.user_id,
+        'action': row.action,
+        'created_at': row.created_at,
+        'payload': _pack(row),
+        'old_status': old_status,
+        'new_status': new_status,
+        'archived_at': beijing_now()
+    }
+
+
+class ArchivedHistory:
+    """从归档库读出的历史记录，属性与 RequirementHistory 相同"""
+
+    __slots__ = ('id', 'requirement_id', 'user_id', 'user', 'action', 'field_name',
+                 'old_value', 'new_value', 'changes', 'comment', 'created_at')
+
+    def __init__(self, row: RequirementHistoryArchive, user: Optional[User] = None):
+        payload = unpack_json(row.payload) or {}
+        self.id = row.id
+        self.requirement_id = row.requirement_id
+        self.user_id = row.user_id
+        self.user = user
+        self.action = row.action
+        self.field_name = payload.get('f')
+        self.old_value = payload.get('o')
+        self.new_value = payload.get('n')
+        self.changes = payload.get('c')
+        self.comment = payload.get('m')
+        self.created_at = row.created_at
+
+
+def _sort_key(row):
+    return (row.created_at is not None, row.created_at, row.id)
+
+
+class HistoryArchiveService:
+    """需求历史冷热分层
+
+    超过 HISTORY_HOT_DAYS 天的历史从 requirement_history 移到归档库
+    （SQLALCHEMY_BINDS['history_archive']，默认是独立的SQLite文件）。
+    归档行保留原ID、需求、操作人、动作和时间，其余内容压缩后存放。
+    详情页、编辑页的最近历史只查询热表；完整时间线由 timeline 合并两边的记录。
+    """
+
+    @staticmethod
+    def archive(older_than_days: Optional[int] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+        """把早于指定天数的历史移入归档库
+
+        每批先写入并提交归档库，再从热表删除并提交；中途失败重跑时已归档的ID会被跳过，
+        不会丢失也不会重复。两次提交之间同一记录会同时存在于两边，读取时以热表为准。
+
+        Args:
+            older_than_days: 保留在热表中的天数，默认为 HISTORY_HOT_DAYS
+            batch_size: 每批移动的行数
+
+        Returns:
+            归档的行数
+        """
+        if older_than_days is None:
+            older_than_days = current_app.config.get('HISTORY_HOT_DAYS', 180)
+        cutoff = beijing_now() - timedelta(days=older_than_days)
+
+        archived = 0
+        while True:
+            rows = RequirementHistory.query.filter(
+                RequirementHistory.created_at < cutoff
+            ).order_by(RequirementHistory.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            ids = [row.id for row in rows]
+            existing = {row.id for row in db.session.query(RequirementHistoryArchive.id).filter(
+                RequirementHistoryArchive.id.in_(ids)
+            )}
+            db.session.bulk_insert_mappings(RequirementHistoryArchive, [
+                _archive_row(row) for row in rows if row.id not in existing
+            ])
+            db.session.commit()
+
+            RequirementHistory.query.filter(
+                RequirementHistory.id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            archived += len(ids)
+        return archived
+
+    @staticmethod
+    def backfill_statuses(batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+        """从压缩内容回填已归档记录的 old_status/new_status（新增这两列时调用一次）
+
+        Returns:
+            回填的记录数
+        """
+        filled = 0
+        last_id = 0
+        while True:
+            rows = RequirementHistoryArchive.query.filter(
+                RequirementHistoryArchive.id > last_id,
+                RequirementHistoryArchive.action.in_(('status_change', 'update'))
+            ).order_by(RequirementHistoryArchive.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                row.old_status, row.new_status = _status_change(ArchivedHistory(row))
+                filled += row.new_status is not None
+            db.session.commit()
+        return filled
+
+    @staticmethod
+    def history_rows(requirement_id: int, after_id: Optional[int] = None, up_to_id: Optional[int] = None,
+                     since=None, until=None) -> List:
+        """需求在指定范围内的全部历史（热表和归档库），按ID升序
+
+        Args:
+            requirement_id: 需求ID
+            after_id: 只取ID大于该值的记录
+            up_to_id: 只取ID不大于该值的记录
+            since: 只取晚于该时间的记录
+            until: 只取不晚于该时间的记录
+        """
+        def restrict(model):
+            query = model.query.filter(model.requirement_id == requirement_id)
+            if after_id is not None:
+                query = query.filter(model.id > after_id)
+            if up_to_id is not None:
+                query = query.filter(model.id <= up_to_id)
+            if since is not None:
+                query = query.filter(model.created_at > since)
+            if until is not None:
+                query = query.filter(model.created_at <= until)
+            return query
+
+        rows = restrict(RequirementHistory).all()
+        hot_ids = {row.id for row in rows}
+        rows.extend(ArchivedHistory(row) for row in restrict(RequirementHistoryArchive).all()
+                    if row.id not in hot_ids)
+        return sorted(rows, key=lambda row: row.id)
+
+    @staticmethod
+    def purge(requirement_id: int):
+        """删除需求的归档历史（删除需求时调用，对应热表的级联删除）"""
+        RequirementHistoryArchive.query.filter_by(
+            requirement_id=requirement_id
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def timeline(requirement_id: int, limit: int = DEFAULT_TIMELINE_LIMIT,
+                 cursor: Optional[str] = None) -> Tuple[List[HistoryEntry], Optional[str]]:
+        """需求的完整变更时间线，合并热表和归档库，按时间倒序
+
+        Args:
+            requirement_id: 需求ID
+            limit: 每页的历史行数（变更集展开后条目可能更多）
+            cursor: 上一页返回的 next_cursor
+
+        Returns:
+            (展开后的历史条目, 下一页游标)
+
+        Raises:
+            InvalidCursor: 游标无法解析
+        """
+        limit = max(1, min(limit or DEFAULT_TIMELINE_LIMIT, MAX_TIMELINE_LIMIT))
+
+        hot = RequirementHistory.query.options(*loading_options('history')).filter(
+            RequirementHistory.requirement_id == requirement_id
+        )
+        cold = RequirementHistoryArchive.query.filter(
+            RequirementHistoryArchive.requirement_id == requirement_id
+        )
+        if cursor:
+            created_at, history_id, _ = decode_cursor(cursor)
+            hot = hot.filter(older_than(RequirementHistory, created_at, history_id))
+            cold = cold.filter(older_than(RequirementHistoryArchive, created_at, history_id))
+
+        # 两边各取一页再归并，热表和归档库都按 (requirement_id, created_at) 索引读取
+        hot_rows = hot.order_by(RequirementHistory.created_at.desc(),
+                                RequirementHistory.id.desc()).limit(limit + 1).all()
+        cold_rows = cold.order_by(RequirementHistoryArchive.created_at.desc(),
+                                  RequirementHistoryArchive.id.desc()).limit(limit + 1).all()
+
+        # 归档中途失败时，已写入归档库的记录可能还留在热表中
+        hot_ids = {row.id for row in hot_rows}
+        cold_rows = [row for row in cold_rows if row.id not in hot_ids]
+        users = {}
+        user_ids = {row.user_id for row in cold_rows if row.user_id}
+        if user_ids:
+            users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))}
+        archived = [ArchivedHistory(row, users.get(row.user_id)) for row in cold_rows]
+
+        rows = sorted(hot_rows + archived, key=_sort_key, reverse=True)
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], 'next') if rows and has_next else None
+        return HistoryService.expand(rows), next_cursor
@@ -0,0 +1,140 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from flask import current_app
+from models import db, Requirement, RequirementHistory
+
+
+class HistoryEntry:
+    """展开后的单字段变更记录
+
+    属性与 RequirementHistory 相同，模板和调用方不需要区分记录是按字段存储还是按变更集存储。
+    """
+
+    __slots__ = ('id', 'requirement_id', 'user_id', 'user', 'action', 'field_name',
+                 'old_value', 'new_value', 'comment', 'created_at')
+
+    def __init__(self, row, field_name=None, old_value=None, new_value=None):
+        self.id = row.id
+        self.requirement_id = row.requirement_id
+        self.user_id = row.user_id
+        self.user = row.user
+        self.action = row.action
+        self.field_name = field_name
+        self.old_value = old_value
+        self.new_value = new_value
+        self.comment = row.comment
+        self.created_at = row.created_at
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row, row.field_name, row.old_value, row.new_value)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'requirement_id': self.requirement_id,
+            'user_id': self.user_id,
+            'user_name': (self.user.full_name or self.user.username) if self.user else None,
+            'action': self.action,
+            'field_name': self.field_name,
+            'old_value': self.old_value,
+            'new_value': self.new_value,
+            'comment': self.comment,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+def _text(value: Any) -> str:
+    # 与按字段存储时的 str(value) 保持一致，None 也显示为 'None'
+    return str(value)
+
+
+class HistoryService:
+    """需求变更历史
+
+    一次保存的所有字段变更写成一行，changes 列保存 {字段: [旧值, 新值]} 的紧凑JSON；
+    HISTORY_CHANGESETS=False 时回到每个字段一行的写法。读取时用 expand 展开为逐字段记录，
+    两种格式的历史可以混在一起读取。
+    """
+
+    @staticmethod
+    def encode_changes(changes: Dict[str, Tuple[Any, Any]]) -> str:
+        """把 {字段: (旧值, 新值)} 编码为紧凑JSON，日期、小数等转为字符串"""
+        return json.dumps({field: [old, new] for field, (old, new) in changes.items()},
+                          ensure_ascii=False, separators=(',', ':'), default=str)
+
+    @staticmethod
+    def decode_changes(changes: Optional[str]) -> Dict[str, List]:
+        """解析 changes 列，返回 {字段: [旧值, 新值]}"""
+        return json.loads(changes) if changes else {}
+
+    @staticmethod
+    def record_update(requirement_id: int, user_id: Optional[int], changes: Dict[str, Tuple[Any, Any]],
+                      comment: Optional[str] = None, project_id: Optional[int] = None):
+        """在当前会话中记录一次更新的字段变更，没有变更时不写入
+
+        Args:
+            requirement_id: 需求ID
+            user_id: 操作人
+            changes: {字段: (旧值, 新值)}，按字段顺序记录
+            comment: 备注
+            project_id: 需求所属项目
+        """
+        if not changes:
+            return
+
+        if current_app.config.get('HISTORY_CHANGESETS', True):
+            db.session.add(RequirementHistory(
+                requirement_id=requirement_id,
+                user_id=user_id,
+                project_id=project_id,
+                action='update',
+                changes=HistoryService.encode_changes(changes),
+                comment=comment
+            ))
+            return
+
+        for field, (old_value, new_value) in changes.items():
+            db.session.add(RequirementHistory(
+                requirement_id=requirement_id,
+                user_id=user_id,
+                project_id=project_id,
+                action='update',
+                field_name=field,
+                old_value=str(old_value),
+                new_value=str(new_value),
+                comment=comment
+            ))
+
+    @staticmethod
+    def backfill_project_ids() -> int:
+        """为没有项目的历史行按需求当前所属项目补齐 project_id，返回更新的行数"""
+        history = RequirementHistory.__table__
+        result = db.session.execute(history.update().where(
+            history.c.project_id.is_(None)
+        ).values(
+            project_id=db.session.query(Requirement.project_id).filter(
+                Requirement.id == history.c.requirement_id
+            ).scalar_subquery()
+        ))
+        db.session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def expand(rows: Iterable[RequirementHistory], limit: Optional[int] = None) -> List[HistoryEntry]:
+        """把历史记录展开为逐字段的 HistoryEntry，保持原有顺序
+
+        Args:
+            rows: RequirementHistory 记录
+            limit: 最多返回的条数，变更集展开后可能多于查询的行数
+        """
+        entries = []
+        for row in rows:
+            if row.changes:
+                for field, (old_value, new_value) in HistoryService.decode_changes(row.changes).items():
+                    entries.append(HistoryEntry(row, field, _text(old_value), _text(new_value)))
+            else:
+                entries.append(HistoryEntry.from_row(row))
+            if limit is not None and len(entries) >= limit:
+                return entries[:limit]
+        return entries
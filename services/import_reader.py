@@ -0,0 +1,113 @@
+import os
+from itertools import islice
+from typing import IO, Iterator, List, Optional, Sequence
+import pandas as pd
+
+# 支持的导入文件格式
+IMPORT_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+class ImportFormatError(ValueError):
+    """导入文件格式或表头不正确"""
+
+
+def _check_header(header: Sequence, required_columns: Sequence[str]) -> List[str]:
+    columns = [str(value).strip() if value is not None else '' for value in header]
+    missing = [column for column in required_columns if column not in columns]
+    if missing:
+        raise ImportFormatError(f"缺少必需列: {', '.join(missing)}")
+    return columns
+
+
+def _xlsx_chunks(file: IO, required_columns: Sequence[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    # openpyxl 只在导入xlsx时需要，不在模块加载时导入
+    from openpyxl import load_workbook
+
+    # 只读模式按行解析工作表，不在内存中构建整个工作簿
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ImportFormatError('文件为空')
+        columns = _check_header(header, required_columns)
+
+        # 第一行数据是Excel第2行，行索引按 index + 2 对应Excel行号
+        width = len(columns)
+        line = 0
+        exhausted = False
+        while not exhausted:
+            values, index, count = [], [], 0
+            for row in islice(rows, chunk_size):
+                count += 1
+                if any(value is not None and value != '' for value in row):
+                    row = tuple(row[:width])
+                    values.append(row + (None,) * (width - len(row)))
+                    index.append(line)
+                line += 1
+            exhausted = count < chunk_size
+            if index:
+                yield pd.DataFrame(values, columns=columns, index=index)
+    finally:
+        workbook.close()
+
+
+def _csv_chunks(file: IO, required_columns: Sequence[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        reader = pd.read_csv(file, chunksize=chunk_size, dtype=str, encoding='utf-8-sig',
+                             keep_default_na=False, na_values=[''], skip_blank_lines=True)
+    except pd.errors.EmptyDataError:
+        raise ImportFormatError('文件为空')
+    except UnicodeDecodeError:
+        raise ImportFormatError('CSV文件必须使用UTF-8编码')
+
+    try:
+        columns = None
+        for chunk in reader:
+            if columns is None:
+                columns = _check_header(chunk.columns, required_columns)
+            chunk.columns = columns
+            yield chunk
+        if columns is None:
+            raise ImportFormatError('文件中没有数据')
+    except UnicodeDecodeError:
+        raise ImportFormatError('CSV文件必须使用UTF-8编码')
+    finally:
+        reader.close()
+
+
+def _xls_chunks(file: IO, required_columns: Sequence[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    # 旧版 .xls 格式没有流式解析器，只能整体读取后分块
+    df = pd.read_excel(file)
+    df.columns = _check_header(df.columns, required_columns)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def iter_import_chunks(file, required_columns: Sequence[str], chunk_size: int,
+                       filename: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """按块读取导入文件（.xlsx/.csv流式读取，.xls整体读取）
+
+    每块为最多 chunk_size 行的DataFrame，行索引加2即为文件中的行号。
+    表头在产出第一块之前校验，缺少必需列时立即抛出异常，调用方不会导入任何数据。
+
+    Args:
+        file: 上传的文件对象或以二进制方式打开的本地文件
+        required_columns: 必需的列名
+        chunk_size: 每块的行数
+        filename: 文件名，用于判断格式，默认取 file.filename（本地文件取 file.name）
+
+    Raises:
+        ImportFormatError: 文件格式不支持、文件为空或缺少必需列
+    """
+    filename = filename or getattr(file, 'filename', None) or getattr(file, 'name', None) or ''
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in IMPORT_EXTENSIONS:
+        raise ImportFormatError(f"不支持的文件格式，仅支持 {', '.join(IMPORT_EXTENSIONS)}")
+
+    stream = getattr(file, 'stream', file)
+    if extension == '.xlsx':
+        return _xlsx_chunks(stream, required_columns, chunk_size)
+    if extension == '.csv':
+        return _csv_chunks(stream, required_columns, chunk_size)
+    return _xls_chunks(stream, required_columns, chunk_size)
@@ -0,0 +1,394 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, NamedTuple, Optional
+from flask import current_app
+from models import db, Job, beijing_now
+from services.requirement_service import RequirementService, STREAM_EXPORT_FORMATS
+
+# 导出任务每页读取的行数，每页写完上报一次进度
+EXPORT_PAGE_SIZE = 1000
+
+# 导入任务结果中最多保留的错误信息条数
+MAX_RESULT_ERRORS = 200
+
+# 任务类型 -> 处理函数，处理函数签名为 (job, params, progress) -> JobOutcome
+JOB_HANDLERS: Dict[str, Callable] = {}
+
+
+class JobOutcome(NamedTuple):
+    """任务处理函数的返回值"""
+    result: Dict
+    message: str = '已完成'
+    artifact_path: Optional[str] = None
+    artifact_name: Optional[str] = None
+
+
+class JobProgress:
+    """任务进度上报
+
+    每次上报单独更新任务行并提交，状态接口立即可见。
+    提交会连同会话中未提交的修改一起提交，处理函数只应在数据已提交的位置上报。
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+
+    def update(self, progress: Optional[int] = None, message: Optional[str] = None):
+        values = {}
+        if progress is not None:
+            # 100% 只在任务成功结束时写入
+            values['progress'] = max(0, min(99, int(progress)))
+        if message is not None:
+            values['message'] = message[:500]
+        if values:
+            Job.query.filter_by(id=self.job_id).update(values, synchronize_session=False)
+            db.session.commit()
+
+
+def job_handler(job_type: str):
+    """注册任务处理函数"""
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+class JobService:
+    """本地后台任务
+
+    任务记录在 job 表中，不依赖外部消息队列：
+    JOB_EXECUTOR=thread 时提交后立即交给Web进程内的线程池执行；
+    JOB_EXECUTOR=worker 时只入队，由 flask job-worker 命令轮询领取执行。
+    领取是带 status='pending' 条件的UPDATE，多个执行者并存时同一任务只会被执行一次。
+    排队超过 JOB_PENDING_TIMEOUT 秒仍未被领取的任务（如没有运行 job-worker、Web进程重启丢失了线程池中的任务）
+    在查看时标记为失败，页面不会一直轮询。
+    """
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def submit(job_type: str, params: Dict, user_id: int) -> Job:
+        """提交任务
+
+        Args:
+            job_type: 任务类型，见 JOB_HANDLERS
+            params: 任务参数，必须可以序列化为JSON
+            user_id: 提交人
+
+        Returns:
+            已入队的任务
+        """
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f'未知的任务类型: {job_type}')
+
+        job = Job(
+            job_type=job_type,
+            params=json.dumps(params, ensure_ascii=False),
+            message='排队中',
+            created_by=user_id
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        if current_app.config.get('JOB_EXECUTOR', 'thread') == 'thread':
+            app = current_app._get_current_object()
+            JobService._thread_pool(app).submit(_claim_and_execute, app, job.id)
+        return job
+
+    @staticmethod
+    def _thread_pool(app) -> ThreadPoolExecutor:
+        if JobService._executor is None:
+            with JobService._executor_lock:
+                if JobService._executor is None:
+                    JobService._executor = ThreadPoolExecutor(
+                        max_workers=app.config.get('JOB_WORKERS', 2),
+                        thread_name_prefix='job'
+                    )
+        return JobService._executor
+
+    @staticmethod
+    def claim(job_id: int) -> bool:
+        """领取指定的排队任务，已被其他执行者领取时返回False"""
+        claimed = Job.query.filter_by(id=job_id, status='pending').update({
+            'status': 'running',
+            'started_at': beijing_now(),
+            'message': '执行中'
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    @staticmethod
+    def claim_next() -> Optional[int]:
+        """按提交顺序领取下一个排队任务，没有时返回None"""
+        candidates = [row.id for row in db.session.query(Job.id).filter(
+            Job.status == 'pending'
+        ).order_by(Job.id).limit(20)]
+        for job_id in candidates:
+            if JobService.claim(job_id):
+                return job_id
+        return None
+
+    @staticmethod
+    def expire_if_stale(job: Job) -> Job:
+        """排队超时的任务标记为失败，返回刷新后的任务
+
+        同样是带 status='pending' 条件的UPDATE，任务已被领取时不做修改。
+        """
+        timeout = current_app.config.get('JOB_PENDING_TIMEOUT')
+        if job.status != 'pending' or not timeout or not job.created_at:
+            return job
+        # 数据库中的时间不带时区
+        if job.created_at.replace(tzinfo=None) > beijing_now().replace(tzinfo=None) - timedelta(seconds=timeout):
+            return job
+
+        if current_app.config.get('JOB_EXECUTOR', 'thread') == 'worker':
+            message = '等待执行超时：没有任务执行进程领取该任务，请确认已运行 flask job-worker 后重新提交'
+        else:
+            message = '等待执行超时：任务未被执行（可能是服务重启），请重新提交'
+        expired = Job.query.filter_by(id=job.id, status='pending').update({
+            'status': 'failed',
+            'message': message,
+            'finished_at': beijing_now()
+        }, synchronize_session=False)
+        db.session.commit()
+        if expired:
+            # 导入任务不会再执行，删除保存的上传文件
+            params = json.loads(job.params) if job.params else {}
+            if job.job_type == 'import' and params.get('path') and os.path.exists(params['path']):
+                os.remove(params['path'])
+        db.session.refresh(job)
+        return job
+
+    @staticmethod
+    def execute(job_id: int) -> bool:
+        """执行已领取的任务并记录结果，返回是否成功"""
+        job = Job.query.get(job_id)
+        try:
+            params = json.loads(job.params) if job.params else {}
+            outcome = JOB_HANDLERS[job.job_type](job, params, JobProgress(job.id))
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception('后台任务 #%s 执行失败', job_id)
+            JobService._finish(job_id, 'failed', str(e) or type(e).__name__)
+            return False
+
+        JobService._finish(job_id, 'succeeded', outcome.message, outcome)
+        return True
+
+    @staticmethod
+    def _finish(job_id: int, status: str, message: str, outcome: Optional[JobOutcome] = None):
+        values = {
+            'status': status,
+            'message': message[:500],
+            'finished_at': beijing_now()
+        }
+        if outcome is not None:
+            values.update(
+                progress=100,
+                result=json.dumps(outcome.result, ensure_ascii=False, default=str),
+                artifact_path=outcome.artifact_path,
+                artifact_name=outcome.artifact_name
+            )
+        Job.query.filter_by(id=job_id).update(values, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def work(concurrency: int = 1, use_processes: bool = False, once: bool = False,
+             poll_interval: float = 2.0, echo: Callable[[str], None] = print) -> int:
+        """轮询执行排队任务（job-worker 命令）
+
+        Args:
+            concurrency: 同时执行的任务数
+            use_processes: 使用进程池（fork）而不是线程池，适合CPU密集的导入导出
+            once: 队列清空且正在执行的任务结束后退出，否则一直轮询
+            poll_interval: 没有任务时的轮询间隔（秒）
+            echo: 输出日志的函数
+
+        Returns:
+            执行完成的任务数
+        """
+        global _worker_app
+        app = current_app._get_current_object()
+        if use_processes:
+            _worker_app = app
+            executor = ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker_process
+            )
+            run = lambda job_id: executor.submit(_execute_in_process, job_id)
+        else:
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job-worker')
+            run = lambda job_id: executor.submit(_execute, app, job_id)
+
+        running = {}
+        finished = 0
+        try:
+            while True:
+                job_id = JobService.claim_next() if len(running) < concurrency else None
+                if job_id:
+                    echo(f'开始执行任务 #{job_id}')
+                    running[run(job_id)] = job_id
+                    continue
+
+                if not running:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(list(running), timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        succeeded = future.result()
+                    except Exception as e:
+                        echo(f'任务 #{job_id} 的执行进程异常退出: {e}')
+                        continue
+                    finished += 1
+                    echo(f"任务 #{job_id} {'执行成功' if succeeded else '执行失败'}")
+        finally:
+            executor.shutdown(wait=True)
+        return finished
+
+    @staticmethod
+    def artifact_folder() -> str:
+        """任务文件目录（上传的导入文件和导出结果）"""
+        folder = current_app.config['JOB_ARTIFACT_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def save_upload(file) -> str:
+        """把上传文件保存到任务文件目录，保留扩展名以便按格式解析，返回保存路径"""
+        extension = os.path.splitext(file.filename or '')[1].lower()
+        path = os.path.join(JobService.artifact_folder(), f'upload_{uuid.uuid4().hex}{extension}')
+        file.save(path)
+        return path
+
+
+def _execute(app, job_id: int) -> bool:
+    with app.app_context():
+        return JobService.execute(job_id)
+
+
+def _claim_and_execute(app, job_id: int):
+    with app.app_context():
+        if JobService.claim(job_id):
+            JobService.execute(job_id)
+
+
+# job-worker 使用进程池时，子进程通过 fork 继承的应用对象
+_worker_app = None
+
+
+def _init_worker_process():
+    # 子进程不能使用从父进程继承来的数据库连接，只丢弃而不关闭，父进程的连接不受影响
+    with _worker_app.app_context():
+        db.engine.dispose(close=False)
+
+
+def _execute_in_process(job_id: int) -> bool:
+    return _execute(_worker_app, job_id)
+
+
+# 任务处理函数
+
+@job_handler('import')
+def _run_import(job: Job, params: Dict, progress: JobProgress) -> JobOutcome:
+    """导入需求，params: path（保存的上传文件）、project_id"""
+    path = params['path']
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, 'rb') as file:
+            def report(processed, imported):
+                # 文件按顺序流式读取，读取位置即可估算进度
+                progress.update(file.tell() * 100 // size, f'已处理 {processed} 行，成功导入 {imported} 条')
+
+            success_count, errors = RequirementService.import_requirements(
+                file, params['project_id'], job.created_by,
+                batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 500),
+                progress=report
+            )
+    finally:
+        os.remove(path)
+
+    return JobOutcome(
+        {
+            'success_count': success_count,
+            'error_count': len(errors),
+            'errors': errors[:MAX_RESULT_ERRORS]
+        },
+        message=f'成功导入 {success_count} 条需求，{len(errors)} 条错误'
+    )
+
+
+def _iter_export_rows(filters: Dict, total: int, progress: JobProgress) -> Iterator:
+    # 按游标分页逐页读取，每页之间没有打开的查询，可以安全地提交进度
+    cursor = None
+    exported = 0
+    while True:
+        page = RequirementService.search_requirements(
+            filters, per_page=EXPORT_PAGE_SIZE, keyset=True, cursor=cursor, projection='export'
+        )
+        yield from page.items
+        exported += len(page.items)
+        progress.update(exported * 100 // max(total, 1), f'已导出 {exported}/{total} 条')
+        if not page.next_cursor:
+            break
+        cursor = page.next_cursor
+
+
+@job_handler('export')
+def _run_export(job: Job, params: Dict, progress: JobProgress) -> JobOutcome:
+    """导出需求，params: filters、format（xlsx/csv/ndjson）、gzip"""
+    filters = params.get('filters') or {}
+    export_format = params.get('format', 'xlsx')
+    if export_format != 'xlsx' and export_format not in STREAM_EXPORT_FORMATS:
+        raise ValueError(f'不支持的导出格式: {export_format}')
+    compress = bool(params.get('gzip')) and export_format in STREAM_EXPORT_FORMATS
+    extension = f'{export_format}.gz' if compress else export_format
+
+    total = RequirementService.search_requirements(filters, per_page=1, projection='export').total
+    rows = _iter_export_rows(filters, total, progress)
+    path = os.path.join(JobService.artifact_folder(), f'export_{job.id}_{uuid.uuid4().hex}.{extension}')
+    try:
+        with open(path, 'wb') as output:
+            if export_format == 'xlsx':
+                RequirementService.export_requirements(rows, output=output)
+            else:
+                for chunk in RequirementService.stream_export(rows, export_format, compress=compress):
+                    output.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+
+    created_at = job.created_at or beijing_now()
+    return JobOutcome(
+        {'count': total},
+        message=f'已导出 {total} 条需求',
+        artifact_path=path,
+        artifact_name=f"requirements_{created_at.strftime('%Y%m%d_%H%M%S')}.{extension}"
+    )
+
+
+@job_handler('baseline')
+def _run_baseline(job: Job, params: Dict, progress: JobProgress) -> JobOutcome:
+    """创建基线，params: project_id、name、version、description"""
+    progress.update(message='正在生成需求快照')
+    baseline = RequirementService.create_baseline(
+        params['project_id'], params['name'], params['version'], job.created_by,
+        description=params.get('description')
+    )
+    return JobOutcome(
+        {'baseline_id': baseline.id, 'name': baseline.name, 'version': baseline.version,
+         'requirement_count': baseline.requirement_count},
+        message=f'基线 {baseline.name} ({baseline.version}) 创建成功，包含 {baseline.requirement_count} 条需求'
+    )
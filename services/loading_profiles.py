@@ -0,0 +1,47 @@
+from typing import Tuple
+from sqlalchemy.orm import joinedload, selectinload, undefer_group
+from models import Requirement, RequirementHistory, Attachment, Comment, TestCase
+
+# 查询的关系预加载方案，按页面/用途命名
+# 多对一关系用 joinedload 随主查询一起取出，一对多、多对多关系用 selectinload
+# 按主键批量加载，这样每页的查询数量固定，不随行数增长。
+# dependencies/dependents/history 是 lazy='dynamic' 关系，不能预加载，
+# 页面上它们各自只执行一次查询。
+LOADING_PROFILES = {
+    # 需求列表：负责人、项目、标签
+    'list': (
+        joinedload(Requirement.assignee),
+        joinedload(Requirement.project),
+        selectinload(Requirement.tags),
+    ),
+    # 需求详情：所有展示的关联对象及延迟加载的详细描述列
+    'detail': (
+        undefer_group('details'),
+        joinedload(Requirement.category),
+        joinedload(Requirement.module),
+        joinedload(Requirement.project),
+        joinedload(Requirement.creator),
+        joinedload(Requirement.assignee),
+        joinedload(Requirement.reviewer),
+        selectinload(Requirement.tags),
+        selectinload(Requirement.attachments).joinedload(Attachment.uploader),
+        selectinload(Requirement.comments).joinedload(Comment.user),
+        selectinload(Requirement.test_cases).joinedload(TestCase.tester),
+    ),
+    # 导出：只需要负责人
+    'export': (
+        joinedload(Requirement.assignee),
+    ),
+    # 变更历史：操作人
+    'history': (
+        joinedload(RequirementHistory.user),
+    ),
+}
+
+
+def loading_options(profile: str) -> Tuple:
+    """返回预加载方案对应的查询选项，用法：query.options(*loading_options('list'))"""
+    try:
+        return LOADING_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f'未知的预加载方案: {profile}')
@@ -0,0 +1,158 @@
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, union_all, literal
+from models import db, Requirement, ProjectMember, User
+from services.counters import increment_counters
+
+# 需求上的人员字段与成员表计数列的对应关系
+ROLE_COLUMNS = (
+    ('creator_id', 'creator_count'),
+    ('assignee_id', 'assignee_count'),
+    ('reviewer_id', 'reviewer_count'),
+)
+
+
+class ProjectMemberService:
+    """项目成员表的增量维护与查询
+
+    用法与 StatsRollupService 相同：修改需求前 snapshot()，修改后 record_change()，
+    新建和删除分别调用 record_insert()/record_delete()，与需求修改在同一事务中提交。
+    """
+
+    @staticmethod
+    def snapshot(requirement: Requirement):
+        """记录需求当前的项目和人员，返回 (project_id, creator_id, assignee_id, reviewer_id)"""
+        return (requirement.project_id,) + tuple(
+            getattr(requirement, field) for field, _ in ROLE_COLUMNS
+        )
+
+    @staticmethod
+    def record_insert(requirement: Requirement):
+        """新建需求后增加成员计数"""
+        ProjectMemberService._apply(ProjectMemberService.snapshot(requirement), 1)
+
+    @staticmethod
+    def record_delete(requirement: Requirement):
+        """删除需求前扣减成员计数"""
+        ProjectMemberService._apply(ProjectMemberService.snapshot(requirement), -1)
+
+    @staticmethod
+    def record_change(before, requirement: Requirement):
+        """需求修改后，根据修改前的snapshot调整成员计数"""
+        after = ProjectMemberService.snapshot(requirement)
+        if after != before:
+            ProjectMemberService._apply(before, -1)
+            ProjectMemberService._apply(after, 1)
+
+    @staticmethod
+    def record_bulk_insert(rows: Iterable[Dict]):
+        """绕过ORM批量插入需求后增加成员计数，同一成员的计数合并为一次累加
+
+        Args:
+            rows: 插入的需求列值字典
+        """
+        members = {}
+        for row in rows:
+            project_id = row.get('project_id')
+            if not project_id:
+                continue
+            for field, column in ROLE_COLUMNS:
+                user_id = row.get(field)
+                if user_id:
+                    columns = members.setdefault((project_id, user_id), {})
+                    columns[column] = columns.get(column, 0) + 1
+
+        for (project_id, user_id), columns in members.items():
+            increment_counters(ProjectMember, {'project_id': project_id, 'user_id': user_id}, columns)
+
+    @staticmethod
+    def _apply(snapshot, delta: int):
+        project_id = snapshot[0]
+        if not project_id:
+            return
+
+        # 同一用户可能身兼多个角色，合并为一次累加
+        deltas = {}
+        for user_id, (_, column) in zip(snapshot[1:], ROLE_COLUMNS):
+            if user_id:
+                deltas.setdefault(user_id, {})[column] = delta
+
+        for user_id, columns in deltas.items():
+            increment_counters(ProjectMember, {'project_id': project_id, 'user_id': user_id}, columns)
+
+        if delta < 0 and deltas:
+            # 清理不再关联任何需求的成员
+            ProjectMember.query.filter(
+                ProjectMember.project_id == project_id,
+                ProjectMember.user_id.in_(list(deltas)),
+                ProjectMember.creator_count <= 0,
+                ProjectMember.assignee_count <= 0,
+                ProjectMember.reviewer_count <= 0
+            ).delete(synchronize_session=False)
+
+    @staticmethod
+    def rebuild() -> int:
+        """根据需求表全量重建项目成员表
+
+        Returns:
+            成员记录数量
+        """
+        selects = []
+        for field, column in ROLE_COLUMNS:
+            user_column = getattr(Requirement, field)
+            selects.append(db.session.query(
+                Requirement.project_id.label('project_id'),
+                user_column.label('user_id'),
+                literal(column).label('role'),
+                func.count(Requirement.id).label('count')
+            ).filter(
+                Requirement.project_id.isnot(None),
+                user_column.isnot(None)
+            ).group_by(Requirement.project_id, user_column).statement)
+
+        members = {}
+        for project_id, user_id, column, count in db.session.execute(union_all(*selects)):
+            row = members.setdefault((project_id, user_id), {
+                'project_id': project_id,
+                'user_id': user_id,
+                'creator_count': 0,
+                'assignee_count': 0,
+                'reviewer_count': 0
+            })
+            row[column] = count
+
+        ProjectMember.query.delete()
+        if members:
+            db.session.execute(ProjectMember.__table__.insert(), list(members.values()))
+        db.session.commit()
+        return len(members)
+
+    @staticmethod
+    def ensure_populated():
+        """成员表为空而已有关联项目的需求时（首次启用）执行全量重建"""
+        if ProjectMember.query.first() is None and \
+                Requirement.query.filter(Requirement.project_id.isnot(None)).first() is not None:
+            ProjectMemberService.rebuild()
+
+    @staticmethod
+    def project_ids_subquery(user_id: int):
+        """用户参与的项目ID子查询，可用于 Project.id.in_(...)"""
+        return db.session.query(ProjectMember.project_id).filter(ProjectMember.user_id == user_id)
+
+    @staticmethod
+    def project_ids_for_user(user_id: int) -> List[int]:
+        """用户参与的项目ID列表"""
+        return [pid for pid, in ProjectMemberService.project_ids_subquery(user_id).all()]
+
+    @staticmethod
+    def is_member(project_id: int, user_id: Optional[int]) -> bool:
+        """用户是否参与了项目中的需求"""
+        if not user_id:
+            return False
+        return db.session.get(ProjectMember, (project_id, user_id)) is not None
+
+    @staticmethod
+    def members(project_id: int) -> List[User]:
+        """项目成员用户列表"""
+        return User.query.join(ProjectMember, ProjectMember.user_id == User.id).filter(
+            ProjectMember.project_id == project_id
+        ).all()
@@ -0,0 +1,158 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import or_, and_, func, tuple_
+from models import db, Requirement
+
+# 近似总数的计数上限，超过上限时只返回“至少N条”
+APPROXIMATE_COUNT_LIMIT = 10000
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析"""
+
+
+class KeysetPage:
+    """游标分页结果
+
+    与Flask-SQLAlchemy的Pagination对象一样通过items访问当前页数据，
+    翻页通过next_cursor/prev_cursor完成，不依赖页码和COUNT(*)。
+    """
+
+    def __init__(self, items: List, per_page: int, next_cursor: Optional[str] = None,
+                 prev_cursor: Optional[str] = None, total: Optional[int] = None,
+                 total_is_exact: bool = True):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_exact = total_is_exact
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+
+def encode_cursor(requirement: Requirement, direction: str) -> str:
+    """把 (created_at, id) 编码为不透明的游标"""
+    payload = {
+        'c': requirement.created_at.isoformat() if requirement.created_at else None,
+        'i': requirement.id,
+        'd': direction
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """解析游标，返回 (created_at, id, direction)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at = datetime.fromisoformat(payload['c']) if payload['c'] else None
+        direction = payload['d']
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return created_at, int(payload['i']), direction
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeError) as e:
+        raise InvalidCursor(f'无效的分页游标: {cursor}') from e
+
+
+def _after(created_at, requirement_id):
+    """排在 (created_at, id) 之后的记录（按倒序）"""
+    if created_at is None:
+        return and_(Requirement.created_at.is_(None), Requirement.id < requirement_id)
+    return or_(
+        Requirement.created_at < created_at,
+        and_(Requirement.created_at == created_at, Requirement.id < requirement_id),
+        Requirement.created_at.is_(None)
+    )
+
+
+def _before(created_at, requirement_id):
+    """排在 (created_at, id) 之前的记录（按倒序）"""
+    if created_at is None:
+        return or_(
+            Requirement.created_at.isnot(None),
+            Requirement.id > requirement_id
+        )
+    return or_(
+        Requirement.created_at > created_at,
+        and_(Requirement.created_at == created_at, Requirement.id > requirement_id)
+    )
+
+
+def older_than(model, created_at, row_id):
+    """按 (created_at, id) 倒序排在游标记录之后的记录，用于历史等 created_at 不为空的表
+
+    写成行值比较，以 created_at 结尾的索引可以直接从游标位置开始范围扫描。
+    """
+    return tuple_(model.created_at, model.id) < tuple_(created_at, row_id)
+
+
+def approximate_count(query, limit: int = APPROXIMATE_COUNT_LIMIT):
+    """有上限的计数，返回 (数量, 是否精确)"""
+    limited = query.order_by(None).with_entities(Requirement.id).limit(limit + 1).subquery()
+    count = db.session.query(func.count()).select_from(limited).scalar() or 0
+    if count > limit:
+        return limit, False
+    return count, True
+
+
+def keyset_paginate(query, cursor: Optional[str] = None, per_page: int = 20,
+                    with_total: bool = False) -> KeysetPage:
+    """按 (created_at, id) 倒序对查询做游标分页
+
+    每页只取 per_page + 1 条记录判断是否还有下一页，
+    任意深度的翻页代价都与第一页相同。
+
+    Args:
+        query: 未排序的需求查询
+        cursor: 上一次返回的 next_cursor 或 prev_cursor，为空时返回第一页
+        per_page: 每页数量
+        with_total: 是否附带有上限的近似总数
+
+    Raises:
+        InvalidCursor: 游标无法解析
+    """
+    total, total_is_exact = (None, True)
+    if with_total:
+        total, total_is_exact = approximate_count(query)
+
+    descending = (Requirement.created_at.desc(), Requirement.id.desc())
+    direction = 'next'
+    if cursor:
+        created_at, requirement_id, direction = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(_after(created_at, requirement_id)).order_by(*descending)
+        else:
+            # 向前翻页时反向排序取最近的记录，再恢复为倒序
+            query = query.filter(_before(created_at, requirement_id)).order_by(
+                Requirement.created_at.asc(), Requirement.id.asc()
+            )
+    else:
+        query = query.order_by(*descending)
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    if direction == 'next':
+        has_next, has_prev = has_more, cursor is not None
+    else:
+        has_next, has_prev = True, has_more
+
+    next_cursor = encode_cursor(rows[-1], 'next') if rows and has_next else None
+    prev_cursor = encode_cursor(rows[0], 'prev') if rows and has_prev else None
+
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor,
+                      total=total, total_is_exact=total_is_exact)
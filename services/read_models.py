@@ -0,0 +1,182 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional
+from sqlalchemy import and_, case
+from sqlalchemy.orm import aliased
+from models import db, Requirement, User, Project, Tag, requirement_tags
+
+# calculate_completeness 检查的字段，与 Requirement.calculate_completeness 保持一致
+COMPLETENESS_FIELDS = (
+    Requirement.title, Requirement.description, Requirement.type, Requirement.priority,
+    Requirement.objective, Requirement.scope, Requirement.acceptance_criteria
+)
+
+
+class UserRef(NamedTuple):
+    id: int
+    full_name: Optional[str]
+    avatar: Optional[str]
+
+
+class ProjectRef(NamedTuple):
+    id: int
+    name: str
+
+
+class TagRef(NamedTuple):
+    id: int
+    name: str
+
+
+class RequirementListRow:
+    """需求列表页的只读行
+
+    只包含列表展示的标量列，大文本列不出库，完整度在SQL中计算。
+    属性名与 Requirement 相同，模板可以不加修改地使用。
+    """
+
+    __slots__ = ('id', 'code', 'title', 'type', 'status', 'priority', 'created_at',
+                 'due_date', 'filled_fields', 'assignee', 'project', 'tags')
+
+    def __init__(self, row, tags=None):
+        self.id = row.id
+        self.code = row.code
+        self.title = row.title
+        self.type = row.type
+        self.status = row.status
+        self.priority = row.priority
+        self.created_at = row.created_at
+        self.due_date = row.due_date
+        self.filled_fields = row.filled_fields or 0
+        self.assignee = UserRef(row.assignee_id, row.assignee_name, row.assignee_avatar) \
+            if row.assignee_id else None
+        self.project = ProjectRef(row.project_id, row.project_name) if row.project_id else None
+        self.tags = tags or []
+
+    def calculate_completeness(self):
+        """计算需求完整度"""
+        return (self.filled_fields / len(COMPLETENESS_FIELDS)) * 100
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'code': self.code,
+            'title': self.title,
+            'type': self.type,
+            'status': self.status,
+            'priority': self.priority,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'due_date': self.due_date.isoformat() if self.due_date else None
+        }
+
+
+class RequirementExportRow:
+    """需求导出的只读行，只包含导出的列"""
+
+    __slots__ = ('id', 'code', 'title', 'description', 'type', 'status', 'priority',
+                 'created_at', 'due_date', 'assignee')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.code = row.code
+        self.title = row.title
+        self.description = row.description
+        self.type = row.type
+        self.status = row.status
+        self.priority = row.priority
+        self.created_at = row.created_at
+        self.due_date = row.due_date
+        self.assignee = UserRef(row.assignee_id, row.assignee_name, None) if row.assignee_id else None
+
+
+def _filled(column):
+    return case((and_(column.isnot(None), column != ''), 1), else_=0)
+
+
+def _list_query(query):
+    assignee = aliased(User)
+    return query.outerjoin(assignee, assignee.id == Requirement.assignee_id) \
+        .outerjoin(Project, Project.id == Requirement.project_id) \
+        .with_entities(
+            Requirement.id, Requirement.code, Requirement.title, Requirement.type,
+            Requirement.status, Requirement.priority, Requirement.created_at, Requirement.due_date,
+            sum(_filled(column) for column in COMPLETENESS_FIELDS).label('filled_fields'),
+            Requirement.assignee_id,
+            assignee.full_name.label('assignee_name'),
+            assignee.avatar.label('assignee_avatar'),
+            Requirement.project_id,
+            Project.name.label('project_name')
+        )
+
+
+def _list_rows(rows) -> List[RequirementListRow]:
+    tags: Dict[int, List[TagRef]] = {}
+    ids = [row.id for row in rows]
+    if ids:
+        # 当前页所有需求的标签一次查出
+        for requirement_id, tag_id, name in db.session.query(
+            requirement_tags.c.requirement_id, Tag.id, Tag.name
+        ).join(Tag, Tag.id == requirement_tags.c.tag_id).filter(
+            requirement_tags.c.requirement_id.in_(ids)
+        ).order_by(Tag.id):
+            tags.setdefault(requirement_id, []).append(TagRef(tag_id, name))
+    return [RequirementListRow(row, tags.get(row.id)) for row in rows]
+
+
+def _export_query(query):
+    assignee = aliased(User)
+    return query.outerjoin(assignee, assignee.id == Requirement.assignee_id).with_entities(
+        Requirement.id, Requirement.code, Requirement.title, Requirement.description,
+        Requirement.type, Requirement.status, Requirement.priority,
+        Requirement.created_at, Requirement.due_date,
+        Requirement.assignee_id, assignee.full_name.label('assignee_name')
+    )
+
+
+def _export_rows(rows) -> List[RequirementExportRow]:
+    return [RequirementExportRow(row) for row in rows]
+
+
+# 投影名称 -> (把需求查询改为只查所需列的函数, 把结果行转换为只读行的函数)
+PROJECTIONS = {
+    'list': (_list_query, _list_rows),
+    'export': (_export_query, _export_rows),
+}
+
+
+def _projection(name: str):
+    try:
+        return PROJECTIONS[name]
+    except KeyError:
+        raise ValueError(f'未知的投影: {name}')
+
+
+def apply_projection(query, name: str):
+    """把 Requirement 查询改为只查询投影所需的列，过滤和排序条件保持不变"""
+    return _projection(name)[0](query)
+
+
+def build_rows(rows, name: str) -> List:
+    """把投影查询的结果行转换为只读行对象"""
+    return _projection(name)[1](rows)
+
+
+def iter_rows(query, name: Optional[str], batch_size: int) -> Iterator:
+    """用 yield_per 分批读取查询结果并逐行产出，内存中只保留一批数据
+
+    Args:
+        query: 需求查询，指定 name 时为 apply_projection 之后的查询
+        name: 投影名称，None表示直接产出 Requirement 对象
+        batch_size: 每批读取的行数
+    """
+    rows = query.yield_per(batch_size)
+    if not name:
+        yield from rows
+        return
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from build_rows(batch, name)
+            batch = []
+    if batch:
+        yield from build_rows(batch, name)
@@ -1,15 +1,59 @@
-from typing import List, Dict, Optional, Tuple
+from typing import IO, Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import or_, and_, func
-from models import (db, Requirement, RequirementHistory, RequirementStatus, 
-                   Priority, User, Project, Module, Category)
+from sqlalchemy import or_, and_, func, case
+from models import (db, Requirement, RequirementHistory, RequirementStatus, RequirementType,
+                   Priority, User, Project, Module, Category, RequirementStatsRollup, beijing_now)
+from services.search_service import RequirementSearchIndex
+from services.pagination import keyset_paginate
+from services.stats_rollup import StatsRollupService
+from services.membership_service import ProjectMemberService
+from services.loading_profiles import loading_options
+from services.read_models import apply_projection, build_rows, iter_rows
+from services.import_reader import iter_import_chunks, ImportFormatError
+from services.code_sequence import CodeSequenceService
+from services.history_service import HistoryService
+from services.history_archive import HistoryArchiveService
+from services.checkpoint_service import CheckpointService
 import pandas as pd
-from io import BytesIO
+import csv
+import io
+import json
+import tempfile
+import xlsxwriter
+import zlib
 from typing import Dict, Optional
 
 # 定义北京时区
 BEIJING_TZ = timezone(timedelta(hours=8))
 
+# 导出文件超过该大小后由内存转存到临时文件
+EXPORT_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# 批量导入每批读取、插入并提交的行数
+IMPORT_BATCH_SIZE = 500
+
+# 批量导入的必需列
+IMPORT_REQUIRED_COLUMNS = ('标题', '描述', '类型', '优先级')
+
+# 流式导出每次输出的数据块大小（压缩前）
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# 流式导出支持的格式
+STREAM_EXPORT_FORMATS = ('csv', 'ndjson')
+
+# 导出列：(表头, 取值函数)
+EXPORT_COLUMNS = (
+    ('需求编号', lambda req: req.code),
+    ('标题', lambda req: req.title),
+    ('描述', lambda req: req.description),
+    ('类型', lambda req: req.type),
+    ('状态', lambda req: req.status),
+    ('优先级', lambda req: req.priority),
+    ('负责人', lambda req: req.assignee.full_name if req.assignee else ''),
+    ('创建时间', lambda req: req.created_at.strftime('%Y-%m-%d %H:%M:%S') if req.created_at else ''),
+    ('截止日期', lambda req: req.due_date.strftime('%Y-%m-%d') if req.due_date else ''),
+)
+
 class RequirementService:
     """需求业务逻辑服务"""
     
@@ -22,13 +66,18 @@ class RequirementService:
         
         requirement = Requirement(**data)
         db.session.add(requirement)
+        # 先flush以应用列默认值（状态、类型等）并获得需求ID
+        db.session.flush()
+        StatsRollupService.record_insert(requirement)
+        ProjectMemberService.record_insert(requirement)
         
         # 记录历史
         RequirementService.add_history(
             requirement_id=requirement.id,
             user_id=user_id,
             action='create',
-            comment='创建需求'
+            comment='创建需求',
+            project_id=requirement.project_id
         )
         
         db.session.commit()
@@ -38,22 +87,22 @@ class RequirementService:
     def update_requirement(requirement_id: int, data: Dict, user_id: int) -> Requirement:
         """更新需求"""
         requirement = Requirement.query.get_or_404(requirement_id)
+        before = StatsRollupService.snapshot(requirement)
+        members_before = ProjectMemberService.snapshot(requirement)
         
-        # 记录变更
+        # 记录变更，一次保存的所有字段变更写成一条变更集
+        changes = {}
         for field, new_value in data.items():
             old_value = getattr(requirement, field)
             if old_value != new_value:
-                RequirementService.add_history(
-                    requirement_id=requirement_id,
-                    user_id=user_id,
-                    action='update',
-                    field_name=field,
-                    old_value=str(old_value),
-                    new_value=str(new_value)
-                )
+                changes[field] = (old_value, new_value)
                 setattr(requirement, field, new_value)
+        HistoryService.record_update(requirement_id, user_id, changes, project_id=requirement.project_id)
         
         requirement.updated_at = datetime.now(BEIJING_TZ)
+        StatsRollupService.record_change(before, requirement)
+        ProjectMemberService.record_change(members_before, requirement)
+        CheckpointService.record(requirement)
         db.session.commit()
         return requirement
     
@@ -67,7 +116,9 @@ class RequirementService:
         if not RequirementService.validate_status_transition(old_status, new_status):
             raise ValueError(f"不允许从 {old_status} 转换到 {new_status}")
         
+        before = StatsRollupService.snapshot(requirement)
         requirement.status = new_status
+        StatsRollupService.record_change(before, requirement)
         
         # 记录状态变更
         RequirementService.add_history(
@@ -77,12 +128,37 @@ class RequirementService:
             field_name='status',
             old_value=old_status,
             new_value=new_status,
-            comment=comment
+            comment=comment,
+            project_id=requirement.project_id
         )
+        CheckpointService.record(requirement)
         
         db.session.commit()
         return requirement
     
+    @staticmethod
+    def delete_requirement(requirement_id: int, user_id: Optional[int]):
+        """删除需求"""
+        requirement = Requirement.query.get_or_404(requirement_id)
+        
+        # 记录删除历史
+        RequirementService.add_history(
+            requirement_id=requirement_id,
+            user_id=user_id,
+            action='delete',
+            comment='删除需求',
+            project_id=requirement.project_id
+        )
+        
+        # 删除需求（由于设置了cascade='all, delete-orphan'，相关附件、评论等会自动删除）
+        # 归档库中的历史和状态检查点不在级联范围内，单独删除
+        HistoryArchiveService.purge(requirement_id)
+        CheckpointService.purge(requirement_id)
+        StatsRollupService.record_delete(requirement)
+        ProjectMemberService.record_delete(requirement)
+        db.session.delete(requirement)
+        db.session.commit()
+    
     @staticmethod
     def validate_status_transition(old_status: str, new_status: str) -> bool:
         """验证状态转换是否合法"""
@@ -108,51 +184,69 @@ class RequirementService:
     @staticmethod
     def generate_requirement_code(project_id: Optional[int] = None) -> str:
         """生成需求编号"""
+        return RequirementService.reserve_requirement_codes(project_id, 1)[0]
+    
+    @staticmethod
+    def reserve_requirement_codes(project_id: Optional[int], count: int) -> List[str]:
+        """一次生成 count 个连续的需求编号
+
+        序号从编号序列表中原子地预留，随当前事务提交，并发创建不会拿到重复编号。
+        """
         prefix = 'REQ'
         if project_id:
             project = Project.query.get(project_id)
             if project:
                 prefix = project.code
         
-        # 获取当前最大编号
-        last_req = Requirement.query.filter(
-            Requirement.code.like(f'{prefix}-%')
-        ).order_by(Requirement.id.desc()).first()
-        
-        if last_req:
-            last_num = int(last_req.code.split('-')[-1])
-            new_num = last_num + 1
-        else:
-            new_num = 1
-        
-        return f"{prefix}-{datetime.now(BEIJING_TZ).strftime('%Y%m')}-{new_num:04d}"
+        month = datetime.now(BEIJING_TZ).strftime('%Y%m')
+        return [f"{prefix}-{month}-{num:04d}" for num in CodeSequenceService.reserve(prefix, count)]
     
     @staticmethod
-    def search_requirements(filters: Dict, page: int = 1, per_page: int = 20, paginate: bool = True):
+    def search_requirements(filters: Dict, page: int = 1, per_page: int = 20, paginate: bool = True,
+                            keyset: bool = False, cursor: Optional[str] = None, with_total: bool = False,
+                            profile: Optional[str] = 'list', projection: Optional[str] = None,
+                            yield_per: Optional[int] = None):
         """搜索需求
         
         Args:
-            filters: 过滤条件字典
+            filters: 过滤条件字典，keyword存在时可传 sort='relevance' 按相关度排序
             page: 页码，从1开始
             per_page: 每页显示数量
             paginate: 是否返回分页对象，False时返回所有结果的列表
+            keyset: 是否使用游标分页（按创建时间和ID倒序，忽略page和sort）
+            cursor: 游标分页时上一页返回的next_cursor或prev_cursor
+            with_total: 游标分页时是否附带近似总数
+            profile: 关系预加载方案（见 loading_profiles），None表示不预加载
+            projection: 只读行投影（见 read_models），指定时只查询所需列，
+                结果为只读行对象而不是 Requirement，profile 被忽略
+            yield_per: paginate=False时每批读取的行数，指定时返回逐行产出的迭代器
+                而不是一次加载全部结果的列表
             
         Returns:
+            如果keyset=True，返回KeysetPage对象
             如果paginate=True，返回Flask-SQLAlchemy的Pagination对象
-            如果paginate=False，返回Requirements List
+            如果paginate=False，返回Requirements List，指定yield_per时返回迭代器
+            以上结果中的需求在指定projection时为只读行对象
         """
         query = Requirement.query
-        
-        # 关键词搜索
+        if profile and not projection:
+            query = query.options(*loading_options(profile))
+
+        # 关键词搜索：优先走全文索引，不可用或关键词过短时回退到LIKE
+        fts_match = None
         if filters.get('keyword'):
-            keyword = f"%{filters['keyword']}%"
-            query = query.filter(
-                or_(
-                    Requirement.title.like(keyword),
-                    Requirement.description.like(keyword),
-                    Requirement.code.like(keyword)
+            if RequirementSearchIndex.can_search(filters['keyword']):
+                fts_match = RequirementSearchIndex.match_subquery(filters['keyword'])
+                query = query.join(fts_match, fts_match.c.id == Requirement.id)
+            else:
+                keyword = f"%{filters['keyword']}%"
+                query = query.filter(
+                    or_(
+                        Requirement.title.like(keyword),
+                        Requirement.description.like(keyword),
+                        Requirement.code.like(keyword)
+                    )
                 )
-            )
         
         # 其他过滤条件
         if filters.get('type'):
@@ -181,161 +275,438 @@ class RequirementService:
         if filters.get('end_date'):
             query = query.filter(Requirement.created_at <= filters['end_date'])
         
-        # 添加默认排序：按创建时间倒序
-        query = query.order_by(Requirement.created_at.desc())
+        if projection:
+            query = apply_projection(query, projection)
+        
+        # 游标分页：按 (created_at, id) 定位，翻页代价与页码无关
+        if keyset:
+            result = keyset_paginate(query, cursor=cursor, per_page=per_page, with_total=with_total)
+            if projection:
+                result.items = build_rows(result.items, projection)
+            return result
+        
+        # 排序：指定sort=relevance且使用全文索引时按相关度，否则按创建时间倒序
+        if fts_match is not None and filters.get('sort') == 'relevance':
+            query = query.order_by(fts_match.c.rank, Requirement.created_at.desc())
+        else:
+            query = query.order_by(Requirement.created_at.desc())
         
         # 根据参数决定是否分页
         if paginate:
-            return query.paginate(
+            result = query.paginate(
                 page=page,
                 per_page=per_page,
                 error_out=False  # 避免页码超出范围时抛出异常
             )
+            if projection:
+                result.items = build_rows(result.items, projection)
+            return result
         else:
+            if yield_per:
+                return iter_rows(query, projection, yield_per)
+            if projection:
+                return build_rows(query.all(), projection)
             return query.all()
     
     @staticmethod
-    def calculate_statistics(project_id: Optional[int] = None) -> Dict:
-        """计算需求统计信息"""
-        query = Requirement.query
-        if project_id:
-            query = query.filter_by(project_id=project_id)
+    def calculate_statistics(project_id: Optional[int] = None, use_rollup: bool = False) -> Dict:
+        """计算需求统计信息
         
-        total = query.count()
+        按 (status, priority, type) 做一次分组聚合，同时用条件聚合统计Overdue数量，
+        再在内存中汇总出各维度的统计，整个统计只访问一次数据库。
+        use_rollup=True 时分布数据改为读取统计汇总表，Overdue数量单独按截止日期索引查询。
+        """
+        completed_status = RequirementStatus.COMPLETED.value
+        today = datetime.now(BEIJING_TZ).date()
+        
+        if use_rollup:
+            breakdown = StatsRollupService.breakdown(project_id)
+            total = breakdown['total']
+            completed = breakdown['status_stats'].get(completed_status, 0)
+            overdue_query = Requirement.query.filter(
+                Requirement.due_date < today,
+                Requirement.status != completed_status
+            )
+            if project_id:
+                overdue_query = overdue_query.filter(Requirement.project_id == project_id)
+            return {
+                'total': total,
+                'status_stats': breakdown['status_stats'],
+                'priority_stats': breakdown['priority_stats'],
+                'type_stats': breakdown['type_stats'],
+                'completion_rate': round((completed / total * 100) if total > 0 else 0, 2),
+                'overdue': overdue_query.count()
+            }
         
-        # 按状态统计 - 使用实际数据库中的值
-        status_stats = {}
+        # Overdue需求 - 排除Completed的需求
+        overdue_case = case(
+            (and_(Requirement.due_date < today, Requirement.status != completed_status), 1),
+            else_=0
+        )
+        query = db.session.query(
+            Requirement.status,
+            Requirement.priority,
+            Requirement.type,
+            func.count(Requirement.id),
+            func.sum(overdue_case)
+        )
         if project_id:
-            status_counts = db.session.query(
-                Requirement.status,
-                func.count(Requirement.id)
-            ).filter_by(project_id=project_id).group_by(Requirement.status).all()
-        else:
-            status_counts = db.session.query(
-                Requirement.status,
-                func.count(Requirement.id)
-            ).group_by(Requirement.status).all()
-        
-        for status, count in status_counts:
-            status_stats[status] = count
+            query = query.filter(Requirement.project_id == project_id)
+        groups = query.group_by(Requirement.status, Requirement.priority, Requirement.type).all()
         
-        # 按优先级统计 - 使用实际数据库中的值
+        total = 0
+        overdue = 0
+        status_stats = {}
         priority_stats = {}
-        if project_id:
-            priority_counts = db.session.query(
-                Requirement.priority,
-                func.count(Requirement.id)
-            ).filter_by(project_id=project_id).group_by(Requirement.priority).all()
-        else:
-            priority_counts = db.session.query(
-                Requirement.priority,
-                func.count(Requirement.id)
-            ).group_by(Requirement.priority).all()
-        
-        for priority, count in priority_counts:
-            priority_stats[priority] = count
-        
-        # 按类型统计 - 使用实际数据库中的值
-        if project_id:
-            type_stats = db.session.query(
-                Requirement.type,
-                func.count(Requirement.id)
-            ).filter_by(project_id=project_id).group_by(Requirement.type).all()
-        else:
-            type_stats = db.session.query(
-                Requirement.type,
-                func.count(Requirement.id)
-            ).group_by(Requirement.type).all()
-        
-        # 完成率 - 只使用中文状态值
-        completed_statuses = [RequirementStatus.COMPLETED.value]
-        completed = 0
-        for status in completed_statuses:
-            completed += query.filter_by(status=status).count()
-        
+        type_stats = {}
+        for status, priority, req_type, count, overdue_count in groups:
+            total += count
+            overdue += overdue_count or 0
+            status_stats[status] = status_stats.get(status, 0) + count
+            priority_stats[priority] = priority_stats.get(priority, 0) + count
+            type_stats[req_type] = type_stats.get(req_type, 0) + count
+        
+        # 完成率 - 只统计Completed状态
+        completed = status_stats.get(completed_status, 0)
         completion_rate = (completed / total * 100) if total > 0 else 0
         
-        # Overdue需求 - 排除Completed的需求
-        overdue_query = query.filter(
-            and_(
-                Requirement.due_date < datetime.now(BEIJING_TZ).date(),
-                ~Requirement.status.in_(completed_statuses)
-            )
-        )
-        overdue = overdue_query.count()
-        
         return {
             'total': total,
             'status_stats': status_stats,
             'priority_stats': priority_stats,
-            'type_stats': dict(type_stats),
+            'type_stats': type_stats,
             'completion_rate': round(completion_rate, 2),
             'overdue': overdue
         }
     
     @staticmethod
-    def export_requirements(requirements: List[Requirement]) -> BytesIO:
-        """导出需求到Excel"""
-        data = []
-        for req in requirements:
-            data.append({
-                '需求编号': req.code,
-                '标题': req.title,
-                '描述': req.description,
-                '类型': req.type,
-                '状态': req.status,
-                '优先级': req.priority,
-                '负责人': req.assignee.full_name if req.assignee else '',
-                '创建时间': req.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                '截止日期': req.due_date.strftime('%Y-%m-%d') if req.due_date else '',
-            })
+    def project_requirements_stats(project_ids: List[int]) -> Dict[int, Dict]:
+        """批量获取项目需求统计信息
         
-        df = pd.DataFrame(data)
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Requirements List', index=False)
-        output.seek(0)
+        从统计汇总表按 (项目, 状态) 一次分组查询所有项目的状态分布和完成率。
+        
+        Returns:
+            {项目ID: 统计字典}，没有需求的项目各项为0
+        """
+        project_ids = [pid for pid in project_ids if pid]
+        status_counts = {pid: {status.value: 0 for status in RequirementStatus} for pid in project_ids}
+        totals = {pid: 0 for pid in project_ids}
+        if project_ids:
+            for project_id, status, count, _, _ in StatsRollupService.grouped(
+                    ('project_id', 'status'), project_ids=project_ids):
+                totals[project_id] += count
+                if status in status_counts[project_id]:
+                    status_counts[project_id][status] = count
+        
+        result = {}
+        for project_id in project_ids:
+            status_stats = status_counts[project_id]
+            total = totals[project_id]
+            
+            # 计算完成率
+            completed = status_stats[RequirementStatus.COMPLETED.value]
+            completion_rate = round((completed / total * 100), 1) if total > 0 else 0
+            
+            result[project_id] = {
+                'total': total,
+                'completed': completed,
+                'in_development': status_stats[RequirementStatus.IN_DEVELOPMENT.value],
+                'testing': status_stats[RequirementStatus.TESTING.value],
+                'draft': status_stats[RequirementStatus.DRAFT.value],
+                'submitted': status_stats[RequirementStatus.SUBMITTED.value],
+                'reviewing': status_stats[RequirementStatus.REVIEWING.value],
+                'approved': status_stats[RequirementStatus.APPROVED.value],
+                'rejected': status_stats[RequirementStatus.REJECTED.value],
+                'cancelled': status_stats[RequirementStatus.CANCELLED.value],
+                'on_hold': status_stats[RequirementStatus.ON_HOLD.value],
+                'completion_rate': completion_rate
+            }
+        return result
+    
+    @staticmethod
+    def team_workload(project_id: Optional[int] = None) -> List[Dict]:
+        """统计每个在职负责人的工作量
         
+        从统计汇总表按 (负责人, 状态) 分组并关联用户，一次查询得到所有人的数据。
+        只返回待处理、进行中、已完成合计大于0的用户，按用户ID排序。
+        """
+        pending_statuses = {'草稿', '已提交', '评审中'}
+        in_progress_statuses = {'已批准', 'In progress', '测试中'}
+        completed_status = RequirementStatus.COMPLETED.value
+        
+        rollup = RequirementStatsRollup
+        query = db.session.query(
+            User.id,
+            User.full_name,
+            User.username,
+            User.avatar,
+            rollup.status,
+            func.sum(rollup.requirement_count),
+            func.sum(rollup.estimated_hours)
+        ).join(rollup, rollup.assignee_id == User.id).filter(
+            User.is_active == True,
+            rollup.requirement_count != 0
+        )
+        if project_id:
+            query = query.filter(rollup.project_id == project_id)
+        rows = query.group_by(User.id, rollup.status).order_by(User.id).all()
+        
+        workload = {}
+        for user_id, full_name, username, avatar, status, count, hours in rows:
+            member = workload.setdefault(user_id, {
+                'name': full_name or username,
+                'avatar': avatar,
+                'pending': 0,
+                'in_progress': 0,
+                'completed': 0,
+                'total': 0,
+                'estimated_hours': 0
+            })
+            if status in pending_statuses:
+                member['pending'] += count
+            elif status in in_progress_statuses:
+                member['in_progress'] += count
+            elif status == completed_status:
+                member['completed'] += count
+            member['estimated_hours'] += hours or 0
+        
+        team_stats = []
+        for member in workload.values():
+            member['total'] = member['pending'] + member['in_progress'] + member['completed']
+            if member['total'] > 0:  # 只显示有需求的用户
+                member['estimated_hours'] = round(member['estimated_hours'], 1)
+                member['completion_rate'] = round((member['completed'] / member['total']) * 100, 1)
+                team_stats.append(member)
+        return team_stats
+    
+    @staticmethod
+    def export_requirements(requirements: Iterable, output: Optional[IO[bytes]] = None) -> IO[bytes]:
+        """导出需求到Excel
+
+        逐行写入，xlsxwriter 使用 constant_memory 模式，每行写完即落盘，
+        结果写入 SpooledTemporaryFile，较小的文件留在内存，较大的转存到临时文件。
+        配合 search_requirements(..., yield_per=...) 使用时内存占用与导出行数无关。
+
+        Args:
+            requirements: 需求或只读行的可迭代对象
+            output: 写入的文件对象，默认新建 SpooledTemporaryFile
+
+        Returns:
+            定位到开头的文件对象，由调用方负责关闭
+        """
+        if output is None:
+            output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        worksheet = workbook.add_worksheet('Requirements List')
+        header_format = workbook.add_format({'bold': True, 'border': 1})
+
+        for col, (header, _) in enumerate(EXPORT_COLUMNS):
+            worksheet.write_string(0, col, header, header_format)
+
+        for row, req in enumerate(requirements, start=1):
+            for col, (_, getter) in enumerate(EXPORT_COLUMNS):
+                value = getter(req)
+                if value is None or value == '':
+                    continue
+                worksheet.write_string(row, col, str(value))
+
+        workbook.close()
+        output.seek(0)
+
         return output
     
     @staticmethod
-    def import_requirements(file, project_id: int, user_id: int) -> Tuple[int, List[str]]:
-        """从Excel导入需求"""
-        df = pd.read_excel(file)
+    def stream_export(requirements: Iterable, export_format: str, compress: bool = False,
+                      chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+        """以CSV或NDJSON格式逐块产出导出数据
+
+        数据在缓冲区中累积到 chunk_size 后产出一块，内存占用与导出行数无关；
+        第一块在读到足够的行后立即产出，不需要等待全部结果。
+
+        Args:
+            requirements: 需求或只读行的可迭代对象
+            export_format: csv（列与Excel导出相同）或 ndjson（每行一个JSON对象）
+            compress: 是否以gzip格式压缩输出
+            chunk_size: 每块的大小（压缩前）
+
+        Raises:
+            ValueError: 不支持的格式
+        """
+        if export_format not in STREAM_EXPORT_FORMATS:
+            raise ValueError(f'不支持的导出格式: {export_format}')
+
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        buffer = io.StringIO()
+
+        def drain() -> bytes:
+            data = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(data) if compressor else data
+
+        if export_format == 'csv':
+            writer = csv.writer(buffer)
+            writer.writerow([header for header, _ in EXPORT_COLUMNS])
+            write = lambda req: writer.writerow([getter(req) or '' for _, getter in EXPORT_COLUMNS])
+        else:
+            write = lambda req: buffer.write(json.dumps({
+                'id': req.id,
+                'code': req.code,
+                'title': req.title,
+                'description': req.description,
+                'type': req.type,
+                'status': req.status,
+                'priority': req.priority,
+                'assignee': req.assignee.full_name if req.assignee else None,
+                'created_at': req.created_at.isoformat() if req.created_at else None,
+                'due_date': req.due_date.isoformat() if req.due_date else None
+            }, ensure_ascii=False) + '\n')
+
+        for req in requirements:
+            write(req)
+            if buffer.tell() >= chunk_size:
+                chunk = drain()
+                if chunk:
+                    yield chunk
+
+        chunk = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+    
+    @staticmethod
+    def import_requirements(file, project_id: int, user_id: int, batch_size: int = IMPORT_BATCH_SIZE,
+                            progress: Optional[Callable[[int, int], None]] = None) -> Tuple[int, List[str]]:
+        """从Excel或CSV文件批量导入需求
+
+        文件按 batch_size 行分块流式读取（.xlsx只读模式、.csv分块解析），内存占用与文件行数无关；
+        表头在第一块时校验，缺少必需列时不导入任何数据。每块先做向量化校验，
+        再一次性预留合法行的需求编号，用 executemany 插入需求和创建历史后提交。
+        不合法的行以及插入失败的批次中的行逐行报告错误。
+
+        Args:
+            file: 上传的 .xlsx/.xls/.csv 文件
+            project_id: 导入到的项目
+            user_id: 导入人
+            batch_size: 每批读取、插入并提交的行数
+            progress: 每批提交后的回调，参数为 (已处理行数, 已成功导入数量)
+
+        Returns:
+            (成功导入的数量, 错误信息列表)
+        """
+        project_id = int(project_id) if project_id else None
         success_count = 0
+        processed = 0
         errors = []
         
-        required_columns = ['标题', '描述', '类型', '优先级']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            return 0, [f"缺少必需列: {', '.join(missing_columns)}"]
-        
-        for index, row in df.iterrows():
-            try:
-                data = {
-                    'title': row['标题'],
-                    'description': row['描述'],
-                    'type': row.get('类型', RequirementType.FUNCTIONAL.value),
-                    'priority': row.get('优先级', Priority.MEDIUM.value),
-                    'project_id': project_id,
-                    'creator_id': user_id
-                }
+        try:
+            for chunk in iter_import_chunks(file, IMPORT_REQUIRED_COLUMNS, batch_size):
+                rows, chunk_errors = RequirementService._validate_import_frame(chunk)
+                errors.extend(chunk_errors)
+                processed += len(chunk)
+                if not rows:
+                    if progress:
+                        progress(processed, success_count)
+                    continue
                 
-                RequirementService.create_requirement(data, user_id)
-                success_count += 1
-            except Exception as e:
-                errors.append(f"第{index + 2}行导入失败: {str(e)}")
+                try:
+                    codes = RequirementService.reserve_requirement_codes(project_id, len(rows))
+                    RequirementService._insert_import_batch(
+                        [values for _, values in rows], codes, project_id, user_id
+                    )
+                    db.session.commit()
+                    success_count += len(rows)
+                except Exception as e:
+                    db.session.rollback()
+                    errors.extend(f"第{line}行导入失败: {str(e)}" for line, _ in rows)
+                if progress:
+                    progress(processed, success_count)
+        except ImportFormatError as e:
+            errors.append(str(e))
         
         return success_count, errors
     
+    @staticmethod
+    def _validate_import_frame(df: pd.DataFrame) -> Tuple[List[Tuple[int, Dict]], List[str]]:
+        """向量化校验导入数据
+
+        Returns:
+            (合法行列表 [(Excel行号, 列值字典)], 不合法行的错误信息)
+        """
+        def text(column):
+            return df[column].fillna('').astype(str).str.strip()
+        
+        titles = text('标题')
+        descriptions = text('描述')
+        types = text('类型')
+        types = types.mask(types == '', RequirementType.FUNCTIONAL.value)
+        priorities = text('优先级')
+        priorities = priorities.mask(priorities == '', Priority.MEDIUM.value)
+        
+        columns = Requirement.__table__.c
+        checks = (
+            (titles == '', '标题不能为空'),
+            (titles.str.len() > columns.title.type.length, f'标题不能超过{columns.title.type.length}个字符'),
+            (descriptions == '', '描述不能为空'),
+            (types.str.len() > columns.type.type.length, f'类型不能超过{columns.type.type.length}个字符'),
+            (priorities.str.len() > columns.priority.type.length, f'优先级不能超过{columns.priority.type.length}个字符'),
+        )
+        invalid = pd.Series(False, index=df.index)
+        for mask, _ in checks:
+            invalid |= mask
+        
+        # Excel行号：表头占第1行
+        errors = [
+            f"第{index + 2}行导入失败: {'；'.join(message for mask, message in checks if mask[index])}"
+            for index in df.index[invalid]
+        ]
+        valid = ~invalid
+        rows = [
+            (index + 2, {'title': title, 'description': description, 'type': req_type, 'priority': priority})
+            for index, title, description, req_type, priority in zip(
+                df.index[valid], titles[valid], descriptions[valid], types[valid], priorities[valid]
+            )
+        ]
+        return rows, errors
+    
+    @staticmethod
+    def _insert_import_batch(batch: List[Dict], codes: List[str], project_id: Optional[int], user_id: int):
+        """用 executemany 插入一批需求及其创建历史，并维护统计汇总和项目成员"""
+        now = beijing_now()
+        values = [dict(
+            row,
+            code=code,
+            project_id=project_id,
+            creator_id=user_id,
+            status=RequirementStatus.DRAFT.value,
+            created_at=now,
+            updated_at=now
+        ) for row, code in zip(batch, codes)]
+        db.session.execute(Requirement.__table__.insert(), values)
+        
+        ids = dict(db.session.query(Requirement.code, Requirement.id).filter(Requirement.code.in_(codes)).all())
+        db.session.execute(RequirementHistory.__table__.insert(), [{
+            'requirement_id': ids[code],
+            'user_id': user_id,
+            'project_id': project_id,
+            'action': 'create',
+            'comment': '创建需求',
+            'created_at': now
+        } for code in codes])
+        
+        StatsRollupService.record_bulk_insert(values)
+        ProjectMemberService.record_bulk_insert(values)
+    
     @staticmethod
     def add_history(requirement_id: int, user_id: int, action: str, 
                    field_name: str = None, old_value: str = None, 
-                   new_value: str = None, comment: str = None):
+                   new_value: str = None, comment: str = None, project_id: int = None):
         """添加需求历史记录"""
         history = RequirementHistory(
             requirement_id=requirement_id,
             user_id=user_id,
+            project_id=project_id,
             action=action,
             field_name=field_name,
             old_value=old_value,
@@ -345,20 +716,22 @@ class RequirementService:
         db.session.add(history)
     
     @staticmethod
-    def create_baseline(project_id: int, name: str, version: str, user_id: int) -> 'Baseline':
+    def create_baseline(project_id: int, name: str, version: str, user_id: int,
+                        description: Optional[str] = None) -> 'Baseline':
         """创建基线版本"""
         from models import Baseline
-        import json
+        from services.snapshot_store import SnapshotStore, DIGEST_SIZE
         
-        # 获取项目所有需求的快照
-        requirements = Requirement.query.filter_by(project_id=project_id).all()
-        snapshot = [req.to_dict() for req in requirements]
+        # 保存项目所有需求的快照，未变化的需求复用已有的快照块，基线只记录清单
+        manifest = SnapshotStore.snapshot_project(project_id)
         
         baseline = Baseline(
             name=name,
             version=version,
             project_id=project_id,
-            requirements_snapshot=json.dumps(snapshot, ensure_ascii=False),
+            description=description,
+            manifest=manifest,
+            requirement_count=len(manifest) // DIGEST_SIZE,
             created_by=user_id
         )
         db.session.add(baseline)
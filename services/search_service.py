@@ -0,0 +1,139 @@
+from typing import Optional
+from flask import current_app
+from sqlalchemy import text, column
+from models import db, Requirement
+
+# 全文索引影子表名称
+FTS_TABLE = 'requirement_fts'
+
+# trigram分词器要求检索词至少3个字符，更短的关键词回退到LIKE
+MIN_INDEXED_KEYWORD_LENGTH = 3
+
+
+class RequirementSearchIndex:
+    """需求全文检索索引（SQLite FTS5影子表）
+
+    索引覆盖 code、title、description 三列，使用外部内容表（content='requirement'）
+    避免重复存储正文，并通过触发器在插入、更新、删除时自动同步。
+    trigram分词器同时适用于中文和需求编号的子串匹配。
+    非SQLite数据库或缺少FTS5支持时，search_requirements回退到LIKE查询。
+    """
+
+    # 按数据库URL缓存索引是否可用，避免每次搜索都查询sqlite_master
+    _available = {}
+
+    @staticmethod
+    def _engine_key() -> str:
+        return str(db.engine.url)
+
+    @staticmethod
+    def is_supported() -> bool:
+        """当前数据库引擎是否支持全文索引"""
+        return db.engine.dialect.name == 'sqlite'
+
+    @staticmethod
+    def is_available() -> bool:
+        """全文索引表是否已创建并可用"""
+        key = RequirementSearchIndex._engine_key()
+        if key not in RequirementSearchIndex._available:
+            available = False
+            if RequirementSearchIndex.is_supported():
+                available = db.session.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}
+                ).first() is not None
+            RequirementSearchIndex._available[key] = available
+        return RequirementSearchIndex._available[key]
+
+    @staticmethod
+    def ensure_index() -> bool:
+        """创建全文索引表和同步触发器（已存在时跳过）
+
+        Returns:
+            索引是否可用
+        """
+        if not RequirementSearchIndex.is_supported():
+            return False
+
+        statements = [
+            f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                code, title, description,
+                content='requirement', content_rowid='id', tokenize='trigram'
+            )""",
+            f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON requirement BEGIN
+                INSERT INTO {FTS_TABLE}(rowid, code, title, description)
+                VALUES (new.id, new.code, new.title, new.description);
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON requirement BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code, title, description)
+                VALUES ('delete', old.id, old.code, old.title, old.description);
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF code, title, description ON requirement BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code, title, description)
+                VALUES ('delete', old.id, old.code, old.title, old.description);
+                INSERT INTO {FTS_TABLE}(rowid, code, title, description)
+                VALUES (new.id, new.code, new.title, new.description);
+            END""",
+        ]
+
+        key = RequirementSearchIndex._engine_key()
+        try:
+            existed = RequirementSearchIndex._table_exists()
+            for statement in statements:
+                db.session.execute(text(statement))
+            # 首次创建时为已有数据建立索引
+            if not existed:
+                RequirementSearchIndex._rebuild()
+            db.session.commit()
+        except Exception as e:
+            # SQLite未编译FTS5或不支持trigram分词器
+            db.session.rollback()
+            current_app.logger.warning('全文索引不可用，关键词搜索将使用LIKE查询: %s', e)
+            RequirementSearchIndex._available[key] = False
+            return False
+
+        RequirementSearchIndex._available[key] = True
+        return True
+
+    @staticmethod
+    def rebuild() -> int:
+        """根据requirement表重建全文索引
+
+        Returns:
+            已索引的需求数量
+        """
+        if not RequirementSearchIndex.ensure_index():
+            raise RuntimeError('当前数据库不支持全文索引')
+        RequirementSearchIndex._rebuild()
+        db.session.commit()
+        return db.session.query(Requirement.id).count()
+
+    @staticmethod
+    def _rebuild():
+        db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+    @staticmethod
+    def _table_exists() -> bool:
+        return db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first() is not None
+
+    @staticmethod
+    def can_search(keyword: Optional[str]) -> bool:
+        """关键词能否走全文索引"""
+        return (bool(keyword)
+                and len(keyword.strip()) >= MIN_INDEXED_KEYWORD_LENGTH
+                and RequirementSearchIndex.is_available())
+
+    @staticmethod
+    def match_subquery(keyword: str):
+        """返回匹配关键词的 (id, rank) 子查询，rank越小相关度越高"""
+        # 整体作为短语匹配，转义双引号，避免用户输入被解析为FTS查询语法
+        phrase = '"' + keyword.strip().replace('"', '""') + '"'
+        return text(
+            f"SELECT rowid AS id, bm25({FTS_TABLE}, 10.0, 5.0, 1.0) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :phrase"
+        ).bindparams(phrase=phrase).columns(
+            column('id'), column('rank')
+        ).subquery('fts_match')
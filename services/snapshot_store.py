@@ -0,0 +1,129 @@
+import hashlib
+import json
+from typing import Dict, Iterable, List
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Baseline, Requirement, SnapshotBlob
+from services.compression import deflate, encode_json, unpack_json
+
+# 按摘要批量查询、写入快照块时每批的数量
+SNAPSHOT_BATCH_SIZE = 500
+
+# 清单中每个摘要的字节数（SHA-256）
+DIGEST_SIZE = 32
+
+
+class SnapshotStore:
+    """按内容寻址的需求快照存储
+
+    每条需求的快照按键排序编码为JSON，以其SHA-256摘要为键压缩后存入 snapshot_blob，
+    内容相同的快照只存一份。基线只保存清单：按需求ID顺序拼接的32字节摘要。
+    相邻两个基线之间未变化的需求共用同一个快照块，新基线只需写入变化过的需求。
+    快照块只增不删，基线也没有删除入口，不需要回收。
+    """
+
+    @staticmethod
+    def put_many(states: Iterable[Dict]) -> List[str]:
+        """在当前事务中保存快照，已存在的内容不重复写入
+
+        Returns:
+            与 states 顺序一致的十六进制摘要
+        """
+        encoded = {}
+        digests = []
+        for state in states:
+            data = encode_json(state, sort_keys=True)
+            digest = hashlib.sha256(data).hexdigest()
+            encoded.setdefault(digest, data)
+            digests.append(digest)
+
+        pending = list(encoded)
+        for start in range(0, len(pending), SNAPSHOT_BATCH_SIZE):
+            batch = pending[start:start + SNAPSHOT_BATCH_SIZE]
+            existing = {row.digest for row in db.session.query(SnapshotBlob.digest).filter(
+                SnapshotBlob.digest.in_(batch)
+            )}
+            rows = [{'digest': digest, 'data': deflate(encoded[digest]), 'size': len(encoded[digest])}
+                    for digest in batch if digest not in existing]
+            if rows:
+                SnapshotStore._insert(rows)
+        return digests
+
+    @staticmethod
+    def _insert(rows: List[Dict]):
+        # 并发创建基线时可能同时写入相同的快照，内容相同，已存在时忽略
+        table = SnapshotBlob.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            db.session.execute(insert(table).on_conflict_do_nothing(index_elements=['digest']), rows)
+        else:
+            db.session.execute(table.insert(), rows)
+
+    @staticmethod
+    def get_many(digests: List[str]) -> List[Dict]:
+        """按摘要读取快照，返回顺序与 digests 一致"""
+        states = {}
+        unique = list(dict.fromkeys(digests))
+        for start in range(0, len(unique), SNAPSHOT_BATCH_SIZE):
+            batch = unique[start:start + SNAPSHOT_BATCH_SIZE]
+            for digest, data in db.session.query(SnapshotBlob.digest, SnapshotBlob.data).filter(
+                SnapshotBlob.digest.in_(batch)
+            ):
+                states[digest] = unpack_json(data)
+        missing = [digest for digest in unique if digest not in states]
+        if missing:
+            raise LookupError(f'快照不存在: {missing[0]}')
+        return [states[digest] for digest in digests]
+
+    @staticmethod
+    def encode_manifest(digests: List[str]) -> bytes:
+        return b''.join(bytes.fromhex(digest) for digest in digests)
+
+    @staticmethod
+    def decode_manifest(manifest: bytes) -> List[str]:
+        return [manifest[i:i + DIGEST_SIZE].hex() for i in range(0, len(manifest or b''), DIGEST_SIZE)]
+
+    @staticmethod
+    def snapshot_project(project_id: int, batch_size: int = SNAPSHOT_BATCH_SIZE) -> bytes:
+        """保存项目全部需求的快照（按需求ID排序），返回清单"""
+        query = Requirement.query.filter_by(project_id=project_id).order_by(Requirement.id)
+        digests = []
+        batch = []
+        for requirement in query.yield_per(batch_size):
+            batch.append(requirement.to_dict())
+            if len(batch) >= batch_size:
+                digests.extend(SnapshotStore.put_many(batch))
+                batch = []
+        digests.extend(SnapshotStore.put_many(batch))
+        return SnapshotStore.encode_manifest(digests)
+
+    @staticmethod
+    def baseline_requirements(baseline: Baseline) -> List[Dict]:
+        """基线中的需求快照，兼容 requirements_snapshot 中的旧格式"""
+        if baseline.manifest is not None:
+            return SnapshotStore.get_many(SnapshotStore.decode_manifest(baseline.manifest))
+        return json.loads(baseline.requirements_snapshot) if baseline.requirements_snapshot else []
+
+    @staticmethod
+    def compact_baselines(batch_size: int = 20) -> int:
+        """把旧格式的基线（requirements_snapshot 中的完整JSON）转换为清单
+
+        Returns:
+            转换的基线数量
+        """
+        converted = 0
+        while True:
+            baselines = Baseline.query.filter(
+                Baseline.manifest.is_(None),
+                Baseline.requirements_snapshot.isnot(None)
+            ).order_by(Baseline.id).limit(batch_size).all()
+            if not baselines:
+                break
+            for baseline in baselines:
+                states = json.loads(baseline.requirements_snapshot)
+                baseline.manifest = SnapshotStore.encode_manifest(SnapshotStore.put_many(states))
+                baseline.requirement_count = len(states)
+                baseline.requirements_snapshot = None
+            db.session.commit()
+            converted += len(baselines)
+        return converted
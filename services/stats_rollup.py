@@ -0,0 +1,202 @@
+from typing import Dict, Iterable, Optional
+from sqlalchemy import func
+from models import db, Requirement, RequirementStatsRollup
+from services.counters import increment_counters
+
+# 汇总表主键列与需求字段的对应关系
+KEY_COLUMNS = ('project_id', 'assignee_id', 'status', 'priority', 'type')
+ID_COLUMNS = ('project_id', 'assignee_id')
+
+
+class StatsRollupService:
+    """需求统计汇总表的增量维护与读取
+
+    写入方在修改需求前调用 snapshot() 记录旧的分组和工时，修改后调用
+    record_change()；新建和删除分别调用 record_insert()/record_delete()。
+    增量与需求修改在同一个会话事务中提交。
+    """
+
+    @staticmethod
+    def _key(project_id, assignee_id, status, priority, req_type) -> Dict:
+        """把需求字段转换为汇总表主键（空值使用哨兵值）"""
+        return {
+            'project_id': project_id or 0,
+            'assignee_id': assignee_id or 0,
+            'status': status or '',
+            'priority': priority or '',
+            'type': req_type or ''
+        }
+
+    @staticmethod
+    def snapshot(requirement: Requirement):
+        """记录需求当前的分组键和工时，返回 (key, estimated_hours, actual_hours)"""
+        key = StatsRollupService._key(
+            requirement.project_id, requirement.assignee_id,
+            requirement.status, requirement.priority, requirement.type
+        )
+        return key, requirement.estimated_hours or 0, requirement.actual_hours or 0
+
+    @staticmethod
+    def record_insert(requirement: Requirement):
+        """新建需求后累加汇总"""
+        key, estimated, actual = StatsRollupService.snapshot(requirement)
+        StatsRollupService._apply(key, 1, estimated, actual)
+
+    @staticmethod
+    def record_delete(requirement: Requirement):
+        """删除需求前扣减汇总"""
+        key, estimated, actual = StatsRollupService.snapshot(requirement)
+        StatsRollupService._apply(key, -1, -estimated, -actual)
+
+    @staticmethod
+    def record_change(before, requirement: Requirement):
+        """需求修改后，根据修改前的snapshot调整汇总"""
+        after = StatsRollupService.snapshot(requirement)
+        if after == before:
+            return
+        old_key, old_estimated, old_actual = before
+        new_key, new_estimated, new_actual = after
+        if old_key == new_key:
+            StatsRollupService._apply(new_key, 0, new_estimated - old_estimated, new_actual - old_actual)
+        else:
+            StatsRollupService._apply(old_key, -1, -old_estimated, -old_actual)
+            StatsRollupService._apply(new_key, 1, new_estimated, new_actual)
+
+    @staticmethod
+    def record_bulk_insert(rows: Iterable[Dict]):
+        """绕过ORM批量插入需求后累加汇总，同一分组的行合并为一次累加
+
+        Args:
+            rows: 插入的需求列值字典
+        """
+        groups = {}
+        for row in rows:
+            key = StatsRollupService._key(
+                row.get('project_id'), row.get('assignee_id'),
+                row.get('status'), row.get('priority'), row.get('type')
+            )
+            ident = tuple(key[column] for column in KEY_COLUMNS)
+            count, estimated, actual = groups.get(ident, (0, 0, 0))
+            groups[ident] = (
+                count + 1,
+                estimated + (row.get('estimated_hours') or 0),
+                actual + (row.get('actual_hours') or 0)
+            )
+
+        for ident, (count, estimated, actual) in groups.items():
+            StatsRollupService._apply(dict(zip(KEY_COLUMNS, ident)), count, estimated, actual)
+
+    @staticmethod
+    def _apply(key: Dict, count: int, estimated: float, actual: float):
+        """在当前事务中对一个分组做原子累加"""
+        increment_counters(RequirementStatsRollup, key, {
+            'requirement_count': count,
+            'estimated_hours': estimated,
+            'actual_hours': actual
+        })
+
+    @staticmethod
+    def rebuild() -> int:
+        """根据需求表全量重建汇总表
+
+        Returns:
+            汇总分组数量
+        """
+        groups = db.session.query(
+            Requirement.project_id,
+            Requirement.assignee_id,
+            Requirement.status,
+            Requirement.priority,
+            Requirement.type,
+            func.count(Requirement.id),
+            func.coalesce(func.sum(Requirement.estimated_hours), 0),
+            func.coalesce(func.sum(Requirement.actual_hours), 0)
+        ).group_by(
+            Requirement.project_id, Requirement.assignee_id,
+            Requirement.status, Requirement.priority, Requirement.type
+        ).all()
+
+        # 不同的空值可能映射到同一个哨兵主键，先在内存中合并
+        merged = {}
+        for project_id, assignee_id, status, priority, req_type, count, estimated, actual in groups:
+            key = StatsRollupService._key(project_id, assignee_id, status, priority, req_type)
+            key_tuple = tuple(key[c] for c in KEY_COLUMNS)
+            row = merged.setdefault(key_tuple, dict(key, requirement_count=0, estimated_hours=0, actual_hours=0))
+            row['requirement_count'] += count
+            row['estimated_hours'] += estimated
+            row['actual_hours'] += actual
+
+        RequirementStatsRollup.query.delete()
+        if merged:
+            db.session.execute(RequirementStatsRollup.__table__.insert(), list(merged.values()))
+        db.session.commit()
+        return len(merged)
+
+    @staticmethod
+    def ensure_populated():
+        """汇总表为空而需求表有数据时（首次启用）执行全量重建"""
+        if RequirementStatsRollup.query.first() is None and Requirement.query.first() is not None:
+            StatsRollupService.rebuild()
+
+    @staticmethod
+    def grouped(dimensions: Iterable[str], project_id: Optional[int] = None,
+                project_ids: Optional[Iterable[int]] = None,
+                assignee_ids: Optional[Iterable[int]] = None):
+        """按指定维度汇总，返回 [(维度值..., 数量, 预估工时, 实际工时)]
+
+        Args:
+            dimensions: KEY_COLUMNS 中的列名
+            project_id: 只统计该项目
+            project_ids: 只统计这些项目
+            assignee_ids: 只统计这些负责人
+        """
+        table = RequirementStatsRollup
+        columns = [getattr(table, d) for d in dimensions]
+        query = db.session.query(
+            *columns,
+            func.sum(table.requirement_count),
+            func.sum(table.estimated_hours),
+            func.sum(table.actual_hours)
+        ).filter(table.requirement_count != 0)
+        if project_id:
+            query = query.filter(table.project_id == project_id)
+        if project_ids is not None:
+            query = query.filter(table.project_id.in_(list(project_ids)))
+        if assignee_ids is not None:
+            query = query.filter(table.assignee_id.in_(list(assignee_ids)))
+        if columns:
+            query = query.group_by(*columns)
+
+        results = []
+        for row in query.all():
+            values = list(row[:len(columns)])
+            for i, dimension in enumerate(dimensions):
+                if dimension in ID_COLUMNS:
+                    values[i] = values[i] or None
+                elif values[i] == '':
+                    values[i] = None
+            results.append((*values, row[-3] or 0, row[-2] or 0, row[-1] or 0))
+        return results
+
+    @staticmethod
+    def breakdown(project_id: Optional[int] = None) -> Dict:
+        """按状态、优先级、类型的需求数量分布，读取 O(分组数) 行"""
+        status_stats = {}
+        priority_stats = {}
+        type_stats = {}
+        total = 0
+        estimated_hours = 0
+        for status, priority, req_type, count, estimated, _ in StatsRollupService.grouped(
+                ('status', 'priority', 'type'), project_id=project_id):
+            total += count
+            estimated_hours += estimated
+            status_stats[status] = status_stats.get(status, 0) + count
+            priority_stats[priority] = priority_stats.get(priority, 0) + count
+            type_stats[req_type] = type_stats.get(req_type, 0) + count
+        return {
+            'total': total,
+            'status_stats': status_stats,
+            'priority_stats': priority_stats,
+            'type_stats': type_stats,
+            'estimated_hours': estimated_hours
+        }
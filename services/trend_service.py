@@ -0,0 +1,120 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import func, literal, union_all
+from models import db, Requirement, RequirementStatus
+
+# 定义北京时区
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+GRANULARITIES = ('month', 'week', 'day')
+
+
+class TrendService:
+    """需求创建/完成趋势统计
+
+    按时间桶（自然月、周一开始的自然周、自然日）统计窗口内每个桶的创建数和完成数。
+    创建数按 created_at、完成数按状态为Completed的 updated_at 计算，
+    两部分各自是可走时间索引的范围查询，合并为一条 UNION ALL 语句执行。
+    """
+
+    @staticmethod
+    def bucket_starts(granularity: str, periods: int, end: Optional[date] = None) -> List[date]:
+        """返回截止到 end 所在桶（含）的最近 periods 个桶的起始日期"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f'不支持的时间粒度: {granularity}')
+        end = end or datetime.now(BEIJING_TZ).date()
+
+        if granularity == 'month':
+            year, month = end.year, end.month
+            starts = []
+            for _ in range(periods):
+                starts.append(date(year, month, 1))
+                year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+            return starts[::-1]
+
+        step = timedelta(days=7 if granularity == 'week' else 1)
+        last = end - timedelta(days=end.weekday()) if granularity == 'week' else end
+        return [last - step * i for i in range(periods - 1, -1, -1)]
+
+    @staticmethod
+    def _bucket_expression(column, granularity: str):
+        """时间列所在桶的起始日期表达式"""
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            if granularity == 'month':
+                return func.date(column, 'start of month')
+            if granularity == 'week':
+                # 回退到本周周一：先减6天，再前进到下一个周一
+                return func.date(column, '-6 days', 'weekday 1')
+            return func.date(column)
+        return func.date_trunc(granularity, column)
+
+    @staticmethod
+    def _bucket_key(value) -> str:
+        """统一不同数据库返回的桶值为 YYYY-MM-DD 字符串"""
+        if isinstance(value, (datetime, date)):
+            return value.strftime('%Y-%m-%d')
+        return str(value)[:10]
+
+    @staticmethod
+    def _label(start: date, granularity: str) -> str:
+        if granularity == 'month':
+            return f"{start.month}月"
+        return start.strftime('%m-%d')
+
+    @staticmethod
+    def created_completed(granularity: str = 'month', periods: int = 6,
+                          project_id: Optional[int] = None,
+                          end: Optional[date] = None) -> Dict:
+        """统计窗口内每个时间桶的创建数和完成数
+
+        Args:
+            granularity: month / week / day
+            periods: 桶的数量
+            project_id: 只统计该项目
+            end: 窗口最后一个桶包含的日期，默认为今天
+
+        Returns:
+            {'labels', 'buckets', 'created_data', 'completed_data'}，各列表按时间升序
+        """
+        starts = TrendService.bucket_starts(granularity, periods, end)
+        window_start = datetime.combine(starts[0], datetime.min.time())
+
+        created_bucket = TrendService._bucket_expression(Requirement.created_at, granularity)
+        created = db.session.query(
+            literal('created').label('kind'),
+            created_bucket.label('bucket'),
+            func.count(Requirement.id).label('count')
+        ).filter(Requirement.created_at >= window_start)
+
+        completed_bucket = TrendService._bucket_expression(Requirement.updated_at, granularity)
+        completed = db.session.query(
+            literal('completed').label('kind'),
+            completed_bucket.label('bucket'),
+            func.count(Requirement.id).label('count')
+        ).filter(
+            Requirement.updated_at >= window_start,
+            Requirement.status.in_([RequirementStatus.COMPLETED.value, 'completed'])
+        )
+
+        if project_id:
+            created = created.filter(Requirement.project_id == project_id)
+            completed = completed.filter(Requirement.project_id == project_id)
+
+        statement = union_all(
+            created.group_by(created_bucket).statement,
+            completed.group_by(completed_bucket).statement
+        )
+
+        counts = {'created': {}, 'completed': {}}
+        for kind, bucket, count in db.session.execute(statement):
+            if bucket is not None:
+                counts[kind][TrendService._bucket_key(bucket)] = count
+
+        keys = [start.strftime('%Y-%m-%d') for start in starts]
+        return {
+            'labels': [TrendService._label(start, granularity) for start in starts],
+            'buckets': keys,
+            'created_data': [counts['created'].get(key, 0) for key in keys],
+            'completed_data': [counts['completed'].get(key, 0) for key in keys]
+        }
@@ -0,0 +1,143 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_
+from models import db, Requirement, User
+
+# 可以被选为依赖的需求状态
+DEPENDENCY_STATUSES = ['已批准', 'In progress', 'Completed']
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def _prefix_condition(column, prefix: str):
+    """前缀匹配条件
+
+    写成 column >= prefix AND column < 下一个前缀 的范围比较，
+    不受 LIKE 大小写规则影响，可以直接使用列上的B树索引。
+    """
+    last = ord(prefix[-1])
+    if last >= 0x10FFFF:
+        return column >= prefix
+    return and_(column >= prefix, column < prefix[:-1] + chr(last + 1))
+
+
+def _ids(values: Iterable) -> List[int]:
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+class TypeaheadService:
+    """需求和人员选择器的前缀检索"""
+
+    @staticmethod
+    def clamp_limit(limit: Optional[int]) -> int:
+        if not limit or limit < 1:
+            return DEFAULT_LIMIT
+        return min(limit, MAX_LIMIT)
+
+    @staticmethod
+    def requirements(keyword: str, limit: int = DEFAULT_LIMIT,
+                     exclude_id: Optional[int] = None) -> List[Dict]:
+        """按编号或标题前缀检索可作为依赖的需求
+
+        先按编号前缀匹配，不足 limit 条时再按标题前缀补充；关键字为空时返回最近创建的需求。
+
+        Args:
+            keyword: 编号或标题前缀
+            limit: 最多返回的条数
+            exclude_id: 排除的需求ID（编辑时排除需求本身）
+
+        Returns:
+            [{'id', 'code', 'title', 'text'}]
+        """
+        keyword = (keyword or '').strip()
+        limit = TypeaheadService.clamp_limit(limit)
+
+        base = db.session.query(Requirement.id, Requirement.code, Requirement.title).filter(
+            Requirement.status.in_(DEPENDENCY_STATUSES)
+        )
+        if exclude_id:
+            base = base.filter(Requirement.id != exclude_id)
+
+        if not keyword:
+            rows = base.order_by(Requirement.created_at.desc()).limit(limit).all()
+        else:
+            rows = base.filter(
+                _prefix_condition(Requirement.code, keyword.upper())
+            ).order_by(Requirement.code).limit(limit).all()
+            if len(rows) < limit:
+                seen = {row.id for row in rows}
+                for row in base.filter(
+                    _prefix_condition(Requirement.title, keyword)
+                ).order_by(Requirement.title).limit(limit).all():
+                    if row.id not in seen and len(rows) < limit:
+                        rows.append(row)
+
+        return [{
+            'id': row.id,
+            'code': row.code,
+            'title': row.title,
+            'text': f"{row.code} - {row.title}"
+        } for row in rows]
+
+    @staticmethod
+    def users(keyword: str, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+        """按用户名或姓名前缀检索在职用户
+
+        Returns:
+            [{'id', 'username', 'full_name', 'text'}]
+        """
+        keyword = (keyword or '').strip()
+        limit = TypeaheadService.clamp_limit(limit)
+
+        base = db.session.query(User.id, User.username, User.full_name).filter(User.is_active == True)
+
+        if not keyword:
+            rows = base.order_by(User.full_name, User.username).limit(limit).all()
+        else:
+            rows = base.filter(
+                _prefix_condition(User.username, keyword)
+            ).order_by(User.username).limit(limit).all()
+            if len(rows) < limit:
+                seen = {row.id for row in rows}
+                for row in base.filter(
+                    _prefix_condition(User.full_name, keyword)
+                ).order_by(User.full_name).limit(limit).all():
+                    if row.id not in seen and len(rows) < limit:
+                        rows.append(row)
+
+        return [{
+            'id': row.id,
+            'username': row.username,
+            'full_name': row.full_name,
+            'text': row.full_name or row.username
+        } for row in rows]
+
+    @staticmethod
+    def requirement_choices(ids: Iterable) -> List[Tuple[str, str]]:
+        """给定ID中可作为依赖的需求 (id, 编号 - 标题)，用于表单校验和回显已选项"""
+        ids = _ids(ids)
+        if not ids:
+            return []
+        rows = db.session.query(Requirement.id, Requirement.code, Requirement.title).filter(
+            Requirement.id.in_(ids),
+            Requirement.status.in_(DEPENDENCY_STATUSES)
+        ).order_by(Requirement.code).all()
+        return [(str(row.id), f"{row.code} - {row.title}") for row in rows]
+
+    @staticmethod
+    def user_choices(ids: Iterable) -> List[Tuple[str, str]]:
+        """给定ID中的在职用户 (id, 姓名或用户名)，用于表单校验和回显已选项"""
+        ids = _ids(ids)
+        if not ids:
+            return []
+        rows = db.session.query(User.id, User.username, User.full_name).filter(
+            User.id.in_(ids),
+            User.is_active == True
+        ).all()
+        return [(str(row.id), row.full_name or row.username) for row in rows]
@@ -0,0 +1,48 @@
+// 下拉选择器的服务端检索
+// 为带 data-typeahead-url 属性的 select 增加搜索框，输入时请求接口，
+// 用返回结果替换未选中的选项；已选中的选项始终保留。
+(function () {
+    function load(select, keyword) {
+        const url = new URL(select.dataset.typeaheadUrl, window.location.origin);
+        url.searchParams.set('q', keyword);
+        if (select.dataset.typeaheadExclude) {
+            url.searchParams.set('exclude', select.dataset.typeaheadExclude);
+        }
+
+        fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(response => response.json())
+            .then(items => {
+                Array.from(select.options).forEach(option => {
+                    if (option.value && !option.selected) {
+                        option.remove();
+                    }
+                });
+                const existing = new Set(Array.from(select.options).map(option => option.value));
+                items.forEach(item => {
+                    const value = String(item.id);
+                    if (!existing.has(value)) {
+                        select.add(new Option(item.text, value));
+                    }
+                });
+            })
+            .catch(error => console.error('检索失败:', error));
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-typeahead-url]').forEach(select => {
+            const input = document.createElement('input');
+            input.type = 'search';
+            input.className = 'form-control form-control-sm mb-1';
+            input.placeholder = '输入关键字搜索...';
+            select.parentNode.insertBefore(input, select);
+
+            let timer = null;
+            input.addEventListener('input', function () {
+                clearTimeout(timer);
+                timer = setTimeout(() => load(select, input.value.trim()), 250);
+            });
+
+            load(select, '');
+        });
+    });
+})();
@@ -0,0 +1,77 @@
+"""测试共用的应用、客户端和项目夹具
+
+所有测试共用 app 模块创建的模块级应用（模板需要其中注册的 index 路由），
+主库和归档库都指向内存数据库，每个测试结束后清空数据。
+"""
+import os
+import sys
+
+# 导入 app 模块时会按环境变量创建模块级应用，先指向内存数据库，避免写入仓库中的 requirements.db
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HISTORY_ARCHIVE_URL', 'sqlite://')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import g, request_started
+
+from app import app as flask_app
+from models import db, _model_tables, Project, User
+from services.choice_cache import ChoiceCache
+from services.flow_metrics import FlowMetricsService
+
+
+def _forget_login_user(sender, **extra):
+    # 测试客户端的请求复用夹具中的应用上下文，flask-login 缓存在 g 中的用户会跨请求保留；
+    # 与实际请求一样，每个请求都按会话重新加载当前用户
+    g.pop('_login_user', None)
+
+
+request_started.connect(_forget_login_user, flask_app)
+
+
+@pytest.fixture
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        yield flask_app
+        # 清空测试数据，只保留初始化时创建的管理员
+        db.session.remove()
+        for table in reversed(db.metadata.sorted_tables):
+            if table.name == User.__tablename__:
+                db.session.execute(table.delete().where(table.c.username != 'admin'))
+            elif table.info.get('bind_key') is None:
+                db.session.execute(table.delete())
+        db.session.commit()
+        # 归档库等 SQLALCHEMY_BINDS 中的表
+        for table, engine in _model_tables():
+            if engine is not db.engine:
+                with engine.begin() as connection:
+                    connection.execute(table.delete())
+        ChoiceCache.clear()
+        FlowMetricsService.clear()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+@pytest.fixture
+def admin(app):
+    return User.query.filter_by(username='admin').first().id
+
+
+@pytest.fixture
+def client(app, admin):
+    client = app.test_client()
+    login(client, admin)
+    return client
+
+
+@pytest.fixture
+def project(app):
+    project = Project(name='测试项目', code='QC', status='active')
+    db.session.add(project)
+    db.session.commit()
+    return project.id
@@ -0,0 +1,123 @@
+"""变更审计查询：按字段、项目、时间范围过滤，覆盖按字段存储和变更集两种历史格式"""
+from datetime import datetime
+
+import pytest
+
+from models import db, Project, Requirement, RequirementHistory, User
+from services.audit_service import AuditService
+from services.history_service import HistoryService
+
+T0 = datetime(2026, 1, 5, 9, 0)
+
+
+def at(hour):
+    return T0.replace(hour=hour)
+
+
+@pytest.fixture(params=['json_each', 'like'])
+def dialect(request, app, monkeypatch):
+    """字段条件在SQLite上用 json_each，其他数据库用 LIKE；把方言名称换掉以在SQLite上验证后者"""
+    if request.param == 'like':
+        monkeypatch.setattr(db.engine.dialect, 'name', 'postgresql')
+    return request.param
+
+
+@pytest.fixture
+def history(app, project, admin):
+    """两个项目各一条需求的历史；未回填项目的旧行 project_id 为空"""
+    other = Project(name='另一个项目', code='OT', status='active')
+    tester = User(username='tester', email='tester@example.com', full_name='测试员', password_hash='-')
+    db.session.add_all([other, tester])
+    db.session.flush()
+    first = Requirement(code='QC-1', title='标题', description='描述', project_id=project, creator_id=admin)
+    second = Requirement(code='OT-1', title='标题', description='描述', project_id=other.id, creator_id=admin)
+    db.session.add_all([first, second])
+    db.session.flush()
+
+    def add(requirement, hour, project_id=None, user_id=admin, action='update', changes=None, **fields):
+        db.session.add(RequirementHistory(
+            requirement_id=requirement.id, project_id=project_id, user_id=user_id, action=action,
+            changes=HistoryService.encode_changes(changes) if changes else None, created_at=at(hour), **fields
+        ))
+
+    add(first, 8, action='create', comment='创建需求')
+    add(first, 9, field_name='title', old_value='标题', new_value='标题1')
+    add(first, 10, action='status_change', field_name='status', old_value='草稿', new_value='已提交')
+    add(first, 11, project_id=project, changes={'title': ('标题1', '标题2'), 'priority': ('中', '高')})
+    add(second, 12, project_id=other.id, user_id=tester.id, changes={'status': ('草稿', '已提交')})
+    add(second, 13, project_id=other.id, user_id=tester.id, field_name='priority', old_value='中', new_value='低')
+    # 值中出现字段名不算改动了该字段
+    add(second, 14, project_id=other.id, changes={'description': ('title', '"title"')})
+    db.session.commit()
+    return {'project': project, 'other': other.id, 'first': first.id, 'second': second.id,
+            'tester': tester.id}
+
+
+def entries(filters, limit=None):
+    items, next_cursor = AuditService.query(filters, limit=limit)
+    return [(item['created_at'][11:13], item['field_name']) for item in items], next_cursor
+
+
+def all_entries(filters, limit):
+    """按游标翻完全部页"""
+    result = []
+    cursor = None
+    while True:
+        items, cursor = AuditService.query(filters, limit=limit, cursor=cursor)
+        result.extend((item['created_at'][11:13], item['field_name']) for item in items)
+        if not cursor:
+            return result
+
+
+def test_filter_by_field(history, dialect):
+    assert entries({'field_name': 'title'})[0] == [('11', 'title'), ('09', 'title')]
+    assert entries({'field_name': 'priority'})[0] == [('13', 'priority'), ('11', 'priority')]
+    assert entries({'field_name': 'status'})[0] == [('12', 'status'), ('10', 'status')]
+    assert entries({'field_name': 'description'})[0] == [('14', 'description')]
+    assert entries({'field_name': 'missing'})[0] == []
+    # 字段条件在SQL中过滤：恰好取满一页时没有下一页
+    assert entries({'field_name': 'title'}, limit=2) == ([('11', 'title'), ('09', 'title')], None)
+    assert entries({'field_name': 'status'}, limit=2)[1] is None
+    assert entries({'field_name': 'description'}, limit=1)[1] is None
+    # 分页按历史行计数，变更集只保留所查字段
+    assert all_entries({'field_name': 'title'}, limit=1) == [('11', 'title'), ('09', 'title')]
+
+
+def test_filter_by_project_after_backfill(history, dialect):
+    project = history['project']
+    assert entries({'project_id': project})[0] == [('11', 'title'), ('11', 'priority')]
+
+    assert HistoryService.backfill_project_ids() == 3
+    assert entries({'project_id': project})[0] == [
+        ('11', 'title'), ('11', 'priority'), ('10', 'status'), ('09', 'title'), ('08', None)
+    ]
+    assert entries({'project_id': history['other']})[0] == [
+        ('14', 'description'), ('13', 'priority'), ('12', 'status')
+    ]
+    assert entries({'project_id': project, 'field_name': 'title'})[0] == [('11', 'title'), ('09', 'title')]
+    items, _ = AuditService.query({'project_id': project}, limit=1)
+    assert items[0]['project_id'] == project and items[0]['requirement_code'] == 'QC-1'
+
+
+def test_filter_by_time_range(history, dialect):
+    assert entries({'start': at(10), 'end': at(12)})[0] == [
+        ('12', 'status'), ('11', 'title'), ('11', 'priority'), ('10', 'status')
+    ]
+    assert entries({'start': at(10), 'end': at(12), 'field_name': 'title'})[0] == [('11', 'title')]
+    assert entries({'end': at(9), 'field_name': 'title'})[0] == [('09', 'title')]
+    assert entries({'start': at(12), 'user_id': history['tester']})[0] == [('13', 'priority'), ('12', 'status')]
+    assert all_entries({'start': at(9), 'end': at(13)}, limit=2) == [
+        ('13', 'priority'), ('12', 'status'), ('11', 'title'), ('11', 'priority'), ('10', 'status'), ('09', 'title')
+    ]
+
+
+def test_audit_api_parses_filters(history, client):
+    HistoryService.backfill_project_ids()
+    response = client.get(f"/requirements/api/audit/history?project_id={history['project']}"
+                          f"&field_name=title&start=2026-01-05&end=2026-01-05")
+    assert response.status_code == 200
+    assert [item['created_at'][11:13] for item in response.get_json()['items']] == ['11', '09']
+    # 只给日期的 end 包含当天
+    assert len(client.get('/requirements/api/audit/history?end=2026-01-05').get_json()['items']) == 8
+    assert client.get('/requirements/api/audit/history?start=bad').status_code == 400
+    assert client.get('/requirements/api/audit/history?project_id=x').status_code == 400
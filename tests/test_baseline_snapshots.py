@@ -0,0 +1,102 @@
+"""基线快照：清单引用按内容寻址的快照块，未变化的需求共用一份"""
+import json
+
+from models import db, Baseline, Requirement, SnapshotBlob
+from services.requirement_service import RequirementService
+from services.snapshot_store import DIGEST_SIZE, SNAPSHOT_BATCH_SIZE, SnapshotStore
+
+COUNT = 12
+CHANGED = 3
+
+
+def seed(project_id, admin, count=COUNT):
+    for index in range(count):
+        RequirementService.create_requirement(
+            {'title': f'需求{index}', 'description': '描述', 'project_id': project_id}, admin
+        )
+
+
+def current_states(project_id):
+    """项目当前的 to_dict() 快照，按JSON往返后与读取结果比较"""
+    requirements = Requirement.query.filter_by(project_id=project_id).order_by(Requirement.id)
+    return [json.loads(json.dumps(requirement.to_dict(), ensure_ascii=False, default=str))
+            for requirement in requirements]
+
+
+def change_some(project_id, admin):
+    ids = [row.id for row in db.session.query(Requirement.id).filter_by(project_id=project_id)
+           .order_by(Requirement.id).limit(CHANGED)]
+    for requirement_id in ids:
+        RequirementService.update_requirement(requirement_id, {'title': f'修改{requirement_id}'}, admin)
+
+
+def test_unchanged_requirements_share_blobs(app, project, admin):
+    seed(project, admin)
+    first_states = current_states(project)
+    first = RequirementService.create_baseline(project, '基线1', 'v1', admin)
+
+    change_some(project, admin)
+    second_states = current_states(project)
+    second = RequirementService.create_baseline(project, '基线2', 'v2', admin)
+
+    assert first.requirement_count == second.requirement_count == COUNT
+    assert len(first.manifest) == len(second.manifest) == COUNT * DIGEST_SIZE
+    first_digests = SnapshotStore.decode_manifest(first.manifest)
+    second_digests = SnapshotStore.decode_manifest(second.manifest)
+    assert sum(a == b for a, b in zip(first_digests, second_digests)) == COUNT - CHANGED
+
+    # 共用的快照只存一份，第二个基线只新增变化过的需求
+    assert SnapshotBlob.query.count() == COUNT + CHANGED
+    assert {row.digest for row in SnapshotBlob.query} == set(first_digests) | set(second_digests)
+
+    assert SnapshotStore.baseline_requirements(Baseline.query.get(first.id)) == first_states
+    assert SnapshotStore.baseline_requirements(Baseline.query.get(second.id)) == second_states
+
+    # 内容不变时再建基线不写入新的快照块
+    third = RequirementService.create_baseline(project, '基线3', 'v3', admin)
+    assert third.manifest == second.manifest
+    assert SnapshotBlob.query.count() == COUNT + CHANGED
+
+
+def test_put_many_deduplicates_within_and_across_batches(app):
+    states = [{'id': index % 3, 'title': f'需求{index % 3}'} for index in range(SNAPSHOT_BATCH_SIZE + 10)]
+    digests = SnapshotStore.put_many(states)
+    db.session.commit()
+    assert len(digests) == len(states) and len(set(digests)) == 3
+    assert SnapshotBlob.query.count() == 3
+    # 键的顺序不影响摘要
+    assert SnapshotStore.put_many([{'title': '需求0', 'id': 0}]) == digests[:1]
+    assert SnapshotStore.get_many(digests[:4]) == states[:4]
+
+
+def test_compact_keeps_legacy_baselines_readable(app, client, project, admin):
+    seed(project, admin)
+    legacy_states = current_states(project)
+    legacy = Baseline(name='旧基线', version='v0', project_id=project, created_by=admin,
+                      requirements_snapshot=json.dumps(legacy_states, ensure_ascii=False),
+                      requirement_count=COUNT)
+    empty = Baseline(name='空基线', version='v0', project_id=project, created_by=admin,
+                     requirements_snapshot='[]', requirement_count=0)
+    db.session.add_all([legacy, empty])
+    db.session.commit()
+    legacy_id, empty_id = legacy.id, empty.id
+    assert SnapshotStore.baseline_requirements(legacy) == legacy_states
+
+    change_some(project, admin)
+    current = RequirementService.create_baseline(project, '基线1', 'v1', admin)
+
+    assert SnapshotStore.compact_baselines(batch_size=1) == 2
+    assert SnapshotStore.compact_baselines() == 0
+    legacy = Baseline.query.get(legacy_id)
+    assert legacy.requirements_snapshot is None
+    assert len(legacy.manifest) == COUNT * DIGEST_SIZE
+    assert SnapshotStore.baseline_requirements(legacy) == legacy_states
+    assert SnapshotStore.baseline_requirements(Baseline.query.get(empty_id)) == []
+    # 旧基线中未变化的需求与新基线共用快照块
+    assert SnapshotBlob.query.count() == COUNT + CHANGED
+
+    response = client.get(f'/projects/{project}/baselines/{legacy_id}')
+    assert response.status_code == 200
+    assert response.get_json()['requirements'] == legacy_states
+    response = client.get(f'/projects/{project}/baselines/{current.id}')
+    assert response.get_json()['count'] == COUNT
@@ -0,0 +1,135 @@
+"""按时间点还原需求：检查点前后的正向、反向回放，按字段存储和变更集两种历史格式"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from models import db, Project, Requirement, RequirementCheckpoint, RequirementHistory
+from services.checkpoint_service import CheckpointService
+from services.requirement_service import RequirementService
+
+# 每个操作：('update', 字段) 或 ('status', 新状态)
+OPERATIONS = [
+    ('update', {'title': '标题1', 'estimated_hours': 8.0}),
+    ('status', '已提交'),
+    ('update', {'due_date': date(2026, 3, 1), 'story_points': 5, 'is_template': True}),
+    ('status', '评审中'),
+    ('update', {'title': '标题2', 'due_date': None, 'estimated_hours': 12.5}),
+    ('status', '已批准'),
+    ('update', {'story_points': None, 'priority': '高'}),
+    ('status', 'In progress'),
+]
+
+
+@pytest.fixture
+def interval(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHECKPOINT_INTERVAL', 3)
+    return 3
+
+
+def apply(requirement_id, operation, admin):
+    kind, value = operation
+    if kind == 'status':
+        RequirementService.change_status(requirement_id, value, admin)
+    else:
+        RequirementService.update_requirement(requirement_id, dict(value), admin)
+
+
+def run_operations(app, monkeypatch, project, admin, formats):
+    """创建需求并依次执行 OPERATIONS，formats[i] 为第i个操作是否按变更集记录
+
+    Returns:
+        (需求ID, [(时间点, 该时刻的字段快照)])，第一项为创建时
+    """
+    requirement = RequirementService.create_requirement(
+        {'title': '标题0', 'description': '描述', 'project_id': project}, admin
+    )
+    requirement_id = requirement.id
+    timeline = []
+
+    def record():
+        moment = db.session.query(func.max(RequirementHistory.created_at)).filter(
+            RequirementHistory.requirement_id == requirement_id
+        ).scalar()
+        timeline.append((moment, CheckpointService.snapshot(Requirement.query.get(requirement_id))))
+
+    record()
+    for operation, changesets in zip(OPERATIONS, formats):
+        monkeypatch.setitem(app.config, 'HISTORY_CHANGESETS', changesets)
+        apply(requirement_id, operation, admin)
+        record()
+    return requirement_id, timeline
+
+
+def assert_as_of(requirement_id, timeline):
+    created_at = timeline[0][0]
+    assert CheckpointService.as_of(requirement_id, created_at - timedelta(seconds=1)) is None
+    for moment, expected in timeline:
+        assert CheckpointService.as_of(requirement_id, moment).state == expected
+    # 最后一次变更之后
+    assert CheckpointService.as_of(requirement_id, timeline[-1][0] + timedelta(days=1)).state == timeline[-1][1]
+
+
+@pytest.mark.parametrize('formats', [
+    [True] * len(OPERATIONS),
+    [False] * len(OPERATIONS),
+    [False, False, False, False, True, True, True, True],
+    [True, False] * (len(OPERATIONS) // 2),
+], ids=['changesets', 'single-field', 'single-field-then-changesets', 'alternating'])
+def test_as_of_around_checkpoints(app, monkeypatch, project, admin, interval, formats):
+    requirement_id, timeline = run_operations(app, monkeypatch, project, admin, formats)
+
+    checkpoints = RequirementCheckpoint.query.filter_by(requirement_id=requirement_id).all()
+    assert len(checkpoints) >= 2
+    # 时间点落在第一个检查点之前（反向撤销）和各检查点之后（正向应用），每个检查点都被用到
+    first = min(checkpoint.created_at for checkpoint in checkpoints)
+    last = max(checkpoint.created_at for checkpoint in checkpoints)
+    moments = [moment for moment, _ in timeline]
+    assert min(moments) < first
+    assert any(first < moment < last for moment in moments)
+    results = [CheckpointService.as_of(requirement_id, moment) for moment in moments]
+    assert {result.checkpoint_id for result in results} >= {checkpoint.id for checkpoint in checkpoints}
+
+    assert_as_of(requirement_id, timeline)
+
+
+def test_as_of_without_checkpoints_and_after_rebuild(app, monkeypatch, project, admin):
+    monkeypatch.setitem(app.config, 'CHECKPOINT_INTERVAL', 1000)
+    requirement_id, timeline = run_operations(app, monkeypatch, project, admin, [False, True] * 4)
+    assert RequirementCheckpoint.query.filter_by(requirement_id=requirement_id).count() == 0
+    # 没有检查点时从当前数据回推
+    assert_as_of(requirement_id, timeline)
+
+    assert CheckpointService.rebuild([requirement_id], interval=2) >= len(OPERATIONS) // 2
+    assert_as_of(requirement_id, timeline)
+
+
+def test_single_field_values_coerced_to_snapshot_types(app, monkeypatch, project, admin, interval):
+    requirement_id, timeline = run_operations(app, monkeypatch, project, admin, [False] * len(OPERATIONS))
+    state = CheckpointService.as_of(requirement_id, timeline[3][0]).state
+    assert state['estimated_hours'] == 8.0
+    assert state['story_points'] == 5
+    assert state['is_template'] is True
+    assert state['due_date'] == '2026-03-01'
+    state = CheckpointService.as_of(requirement_id, timeline[5][0]).state
+    assert state['due_date'] is None and state['estimated_hours'] == 12.5
+
+
+def test_project_as_of_follows_moves(app, monkeypatch, project, admin, interval):
+    other = Project(name='另一个项目', code='OT', status='active')
+    db.session.add(other)
+    db.session.commit()
+    other_id = other.id
+
+    requirement_id, timeline = run_operations(app, monkeypatch, project, admin, [True] * len(OPERATIONS))
+    code = timeline[-1][1]['code']
+    RequirementService.update_requirement(requirement_id, {'project_id': other_id}, admin)
+    moved_at = db.session.query(func.max(RequirementHistory.created_at)).scalar()
+
+    before = CheckpointService.project_as_of(project, timeline[2][0])
+    assert [state['code'] for state in before] == [code]
+    assert before[0] == timeline[2][1]
+    assert CheckpointService.project_as_of(other_id, timeline[2][0]) == []
+
+    assert CheckpointService.project_as_of(project, moved_at) == []
+    assert [state['code'] for state in CheckpointService.project_as_of(other_id, moved_at)] == [code]
@@ -0,0 +1,109 @@
+"""需求编号序列：按已有编号起步、连续且不重叠的预留、rebuild 只调大"""
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from models import db, CodeSequence, Requirement
+from services.code_sequence import CodeSequenceService
+from services.requirement_service import RequirementService
+
+
+def add_requirements(project_id, *codes):
+    for code in codes:
+        db.session.add(Requirement(code=code, title=code, description='描述', project_id=project_id, creator_id=1))
+    db.session.commit()
+
+
+def last_value(prefix):
+    return db.session.query(CodeSequence.last_value).filter_by(prefix=prefix).scalar()
+
+
+def test_first_reservation_starts_after_existing_codes(app, project):
+    # 只统计该前缀、最后一段为数字的编号，其他前缀（包括以它开头的前缀）不计入
+    add_requirements(project, 'QC-202601-0007', 'QC-202602-0012', 'QC-202603-0003', 'QC-draft',
+                     'QCX-202601-0099', 'REQ-202601-0050')
+    assert CodeSequenceService.current_max('QC') == 12
+
+    assert list(CodeSequenceService.reserve('QC')) == [13]
+    db.session.commit()
+    assert last_value('QC') == 13
+    # 没有已有编号的前缀从1开始
+    assert list(CodeSequenceService.reserve('NEW')) == [1]
+
+
+def test_blocks_are_consecutive_and_do_not_overlap(app, project):
+    blocks = [CodeSequenceService.reserve('QC', count) for count in (1, 5, 3, 1, 10)]
+    db.session.commit()
+
+    numbers = [number for block in blocks for number in block]
+    assert numbers == list(range(1, 21))
+    for block, count in zip(blocks, (1, 5, 3, 1, 10)):
+        assert len(block) == count and list(block) == list(range(block[0], block[-1] + 1))
+
+    codes = RequirementService.reserve_requirement_codes(project, 3)
+    assert [code.rsplit('-', 1)[-1] for code in codes] == ['0021', '0022', '0023']
+    assert all(code.startswith('QC-') for code in codes)
+
+    with pytest.raises(ValueError):
+        CodeSequenceService.reserve('QC', 0)
+
+
+def test_rollback_releases_reservation(app):
+    CodeSequenceService.reserve('QC', 2)
+    db.session.commit()
+    CodeSequenceService.reserve('QC', 5)
+    db.session.rollback()
+    assert list(CodeSequenceService.reserve('QC', 1)) == [3]
+
+
+def test_created_requirements_get_distinct_codes(app, project, admin):
+    codes = [RequirementService.create_requirement({'title': f'需求{index}', 'description': '描述',
+                                                    'project_id': project}, admin).code
+             for index in range(5)]
+    assert len(set(codes)) == 5
+    assert [code.rsplit('-', 1)[-1] for code in codes] == ['0001', '0002', '0003', '0004', '0005']
+
+
+def test_rebuild_only_raises(app, project):
+    CodeSequenceService.reserve('QC', 3)
+    CodeSequenceService.reserve('HIGH', 100)
+    db.session.commit()
+    # 序列落后于需求表（如直接导入的数据）时调大，超前时保持不变
+    add_requirements(project, 'QC-202601-0050', 'HIGH-202601-0020')
+
+    assert CodeSequenceService.rebuild() == 1
+    assert last_value('QC') == 50
+    assert last_value('HIGH') == 100
+    assert CodeSequenceService.rebuild() == 0
+    assert list(CodeSequenceService.reserve('QC')) == [51]
+
+
+def test_concurrent_sessions_never_collide(tmp_path):
+    # 多个线程各用独立连接同时预留，SQLite的写锁保证序号区间互不重叠
+    engine = create_engine(f'sqlite:///{tmp_path / "sequence.db"}', connect_args={'timeout': 30})
+    CodeSequence.__table__.create(engine)
+    Requirement.__table__.create(engine)
+    reserved = []
+    errors = []
+
+    def worker(count):
+        try:
+            for _ in range(20):
+                with Session(engine) as session:
+                    block = CodeSequenceService.reserve('QC', count, session=session)
+                    session.commit()
+                reserved.extend(block)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(count,)) for count in (1, 2, 3, 1, 2, 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    assert not errors
+    assert sorted(reserved) == list(range(1, 20 * 12 + 1))
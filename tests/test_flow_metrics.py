@@ -0,0 +1,120 @@
+"""流转指标：固定的状态历史上的交付周期、开发周期和吞吐量"""
+from datetime import datetime
+
+import pytest
+
+from models import db, Requirement, RequirementHistory
+from services.flow_metrics import FlowMetricsService
+from services.history_archive import HistoryArchiveService
+from services.history_service import HistoryService
+
+D = datetime
+END = D(2026, 2, 1)
+
+
+@pytest.fixture(params=['sql', 'python'])
+def json_functions(request, app, monkeypatch):
+    """变更集中的状态由数据库JSON函数取出；不支持时读出后在Python中解析"""
+    if request.param == 'python':
+        monkeypatch.setattr(db.engine.dialect, 'name', 'other')
+    return request.param
+
+
+@pytest.fixture(params=[False, True], ids=['single-field', 'changesets'])
+def history(request, app, project, admin):
+    """A：1/5创建，1/8开始开发，1/12完成（交付7天、开发4天）
+    B：1/5创建，1/13开始开发，1/15完成（交付10天、开发2天），未分配
+    C：1/10开始开发，未完成；D：没有状态变化
+    """
+    changesets = request.param
+
+    def add(code, created_at, status, transitions, assignee_id=admin):
+        requirement = Requirement(code=code, title=code, description='描述', project_id=project, status=status,
+                                  assignee_id=assignee_id, creator_id=admin, created_at=created_at)
+        db.session.add(requirement)
+        db.session.flush()
+        previous = '草稿'
+        for moment, status in transitions:
+            if changesets:
+                row = RequirementHistory(action='update', changes=HistoryService.encode_changes(
+                    {'title': (code, code + status), 'status': (previous, status)}
+                ))
+            else:
+                row = RequirementHistory(action='status_change', field_name='status',
+                                         old_value=previous, new_value=status)
+            row.requirement_id, row.project_id, row.created_at = requirement.id, project, moment
+            db.session.add(row)
+            previous = status
+        # 不涉及状态的更新
+        db.session.add(RequirementHistory(
+            requirement_id=requirement.id, project_id=project, action='update', created_at=created_at,
+            changes=HistoryService.encode_changes({'description': ('描述', '"status": 已完成')})
+        ))
+        db.session.add(RequirementHistory(
+            requirement_id=requirement.id, project_id=project, action='update', created_at=created_at,
+            field_name='title', old_value=code, new_value='status'
+        ))
+
+    add('A', D(2026, 1, 5), 'Completed',
+        [(D(2026, 1, 6), '已提交'), (D(2026, 1, 8), 'In progress'), (D(2026, 1, 12), 'Completed')])
+    add('B', D(2026, 1, 5), 'Completed',
+        [(D(2026, 1, 13), 'In progress'), (D(2026, 1, 15), 'Completed')], assignee_id=None)
+    add('C', D(2026, 1, 5), 'In progress', [(D(2026, 1, 10), 'In progress')])
+    add('D', D(2026, 1, 20), '草稿', [])
+    db.session.commit()
+    return changesets
+
+
+def stats(count, mean, p50):
+    return {'count': count, 'mean': mean, 'p50': p50}
+
+
+def pick(distribution):
+    return {key: distribution[key] for key in ('count', 'mean', 'p50')}
+
+
+def test_transitions_from_both_formats(history, json_functions):
+    transitions = FlowMetricsService.load_transitions()
+    assert len(transitions) == 6
+    assert list(transitions.columns) == ['id', 'requirement_id', 'created_at', 'old_status', 'new_status']
+    assert list(transitions['new_status']) == ['已提交', 'In progress', 'Completed', 'In progress', 'Completed',
+                                               'In progress']
+    assert list(transitions['old_status'][:3]) == ['草稿', '已提交', 'In progress']
+
+
+def test_lead_time_cycle_time_and_throughput(history, json_functions, project, admin):
+    result = FlowMetricsService.compute(end=END)
+    summary = result['summary']
+    assert summary['throughput'] == 2
+    assert pick(summary['lead_time']) == stats(2, 8.5, 8.5)
+    assert pick(summary['cycle_time']) == stats(2, 3.0, 3.0)
+    assert result['throughput'] == [{'week': '2026-01-12', 'count': 2}]
+
+    assignees = {row['assignee_id']: row for row in result['assignees']}
+    assert pick(assignees[admin]['lead_time']) == stats(1, 7.0, 7.0)
+    assert pick(assignees[admin]['cycle_time']) == stats(1, 4.0, 4.0)
+    assert pick(assignees[0]['lead_time']) == stats(1, 10.0, 10.0)
+    assert result['projects'][0]['project_id'] == project and result['projects'][0]['throughput'] == 2
+
+    # 统计窗口只包含1/13之后完成的B
+    windowed = FlowMetricsService.compute(start=D(2026, 1, 13), end=END)['summary']
+    assert windowed['throughput'] == 1 and pick(windowed['cycle_time']) == stats(1, 2.0, 2.0)
+    assert FlowMetricsService.compute(end=D(2026, 1, 11))['summary']['throughput'] == 0
+
+    filtered = FlowMetricsService.compute(project_id=project, assignee_id=admin, end=END)['summary']
+    assert filtered['throughput'] == 1 and pick(filtered['lead_time']) == stats(1, 7.0, 7.0)
+
+
+def test_archived_history_gives_same_metrics(history, json_functions, project, admin):
+    before = FlowMetricsService.compute(end=END)
+    filtered = FlowMetricsService.compute(project_id=project, assignee_id=admin, end=END)
+    total = RequirementHistory.query.count()
+    assert HistoryArchiveService.archive(0) == total
+    assert RequirementHistory.query.count() == 0
+    FlowMetricsService.clear()
+
+    after = FlowMetricsService.compute(end=END)
+    for key in ('summary', 'projects', 'assignees', 'time_in_status', 'throughput'):
+        assert after[key] == before[key]
+    assert FlowMetricsService.compute(project_id=project, assignee_id=admin, end=END)['summary'] == \
+        filtered['summary']
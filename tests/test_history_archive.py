@@ -0,0 +1,108 @@
+"""历史冷热分层：归档、跨库时间线分页、失败重跑和删除需求时清理归档"""
+from datetime import timedelta
+
+import pytest
+
+from models import db, Requirement, RequirementHistory, RequirementHistoryArchive, beijing_now
+from services.history_archive import HistoryArchiveService
+from services.requirement_service import RequirementService
+
+# 历史行数和其中早于保留天数、会被归档的行数
+TOTAL = 30
+OLD = 18
+HOT_DAYS = 10
+
+
+def seed_history(project_id, code='HA-1'):
+    """创建需求和 TOTAL 条历史，前 OLD 条早于 HOT_DAYS 天；每两条共用一个时间，检验同时间按ID排序"""
+    requirement = Requirement(code=code, title='归档', description='描述', project_id=project_id, creator_id=1)
+    db.session.add(requirement)
+    db.session.flush()
+    now = beijing_now()
+    for index in range(TOTAL):
+        days_ago = HOT_DAYS + 1 + (OLD - index) // 2 if index < OLD else (TOTAL - index) / 10
+        db.session.add(RequirementHistory(
+            requirement_id=requirement.id, user_id=1, action='update', field_name='title',
+            old_value=f'标题{index}', new_value=f'标题{index + 1}', created_at=now - timedelta(days=days_ago)
+        ))
+    db.session.commit()
+    return requirement.id
+
+
+def expected_order(requirement_id):
+    """归档前热表中的 (created_at, id) 倒序"""
+    rows = RequirementHistory.query.filter_by(requirement_id=requirement_id).all()
+    return [row.id for row in sorted(rows, key=lambda row: (row.created_at, row.id), reverse=True)]
+
+
+def read_timeline(requirement_id, limit):
+    ids = []
+    cursor = None
+    while True:
+        entries, cursor = HistoryArchiveService.timeline(requirement_id, limit=limit, cursor=cursor)
+        ids.extend(entry.id for entry in entries)
+        if not cursor:
+            return ids
+
+
+def counts(requirement_id):
+    return (RequirementHistory.query.filter_by(requirement_id=requirement_id).count(),
+            RequirementHistoryArchive.query.filter_by(requirement_id=requirement_id).count())
+
+
+def test_timeline_pages_across_both_databases(app, project):
+    requirement_id = seed_history(project)
+    expected = expected_order(requirement_id)
+
+    assert HistoryArchiveService.archive(HOT_DAYS, batch_size=7) == OLD
+    assert counts(requirement_id) == (TOTAL - OLD, OLD)
+
+    for limit in (1, 4, 7, TOTAL):
+        ids = read_timeline(requirement_id, limit)
+        assert ids == expected
+        assert len(set(ids)) == TOTAL
+
+    # 归档行的内容解压后与原记录一致
+    oldest = HistoryArchiveService.timeline(requirement_id, limit=TOTAL)[0][-1]
+    assert (oldest.field_name, oldest.old_value, oldest.new_value) == ('title', '标题0', '标题1')
+
+
+def test_rerun_after_failure_between_commits(app, project, monkeypatch):
+    requirement_id = seed_history(project)
+    expected = expected_order(requirement_id)
+
+    # 第一批写入归档库并提交后，从热表删除前失败
+    commit = db.session.commit
+    calls = []
+
+    def failing_commit():
+        calls.append(1)
+        if len(calls) == 2:
+            db.session.rollback()
+            raise RuntimeError('删除热表记录前中断')
+        commit()
+
+    monkeypatch.setattr(db.session, 'commit', failing_commit)
+    with pytest.raises(RuntimeError):
+        HistoryArchiveService.archive(HOT_DAYS, batch_size=5)
+    monkeypatch.undo()
+    db.session.remove()
+
+    # 第一批同时存在于两边，时间线不重复
+    assert counts(requirement_id) == (TOTAL, 5)
+    assert read_timeline(requirement_id, 4) == expected
+
+    assert HistoryArchiveService.archive(HOT_DAYS, batch_size=5) == OLD
+    assert counts(requirement_id) == (TOTAL - OLD, OLD)
+    assert read_timeline(requirement_id, 4) == expected
+
+
+def test_purge_on_requirement_delete(app, project, admin):
+    deleted = seed_history(project, 'HA-1')
+    kept = seed_history(project, 'HA-2')
+    HistoryArchiveService.archive(HOT_DAYS)
+
+    RequirementService.delete_requirement(deleted, admin)
+
+    assert RequirementHistoryArchive.query.filter_by(requirement_id=deleted).count() == 0
+    assert counts(kept) == (TOTAL - OLD, OLD)
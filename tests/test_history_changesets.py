@@ -0,0 +1,74 @@
+"""变更集历史与按字段存储的历史展开后一致"""
+from datetime import date
+
+import pytest
+
+from models import db, Requirement, RequirementHistory
+from services.history_service import HistoryService
+from services.requirement_service import RequirementService
+
+# 依次执行的更新，包含 None、日期、小数、整数和布尔值
+UPDATES = [
+    {'title': '新标题', 'due_date': date(2026, 3, 1), 'estimated_hours': 8.5},
+    {'due_date': None, 'story_points': 3, 'is_template': True},
+    {'assignee_id': 1, 'estimated_hours': None},
+]
+
+# 不随存储格式变化的条目属性
+ENTRY_FIELDS = ('user_id', 'user_name', 'action', 'field_name', 'old_value', 'new_value', 'comment')
+
+
+def updated_requirement(app, monkeypatch, project, admin, changesets, code):
+    monkeypatch.setitem(app.config, 'HISTORY_CHANGESETS', changesets)
+    requirement = Requirement(code=code, title='标题', description='描述', project_id=project, creator_id=admin)
+    db.session.add(requirement)
+    db.session.commit()
+    requirement_id = requirement.id
+    for data in UPDATES:
+        RequirementService.update_requirement(requirement_id, dict(data), admin)
+    return requirement_id
+
+
+def api_entries(client, requirement_id):
+    response = client.get(f'/requirements/api/requirements/{requirement_id}/history')
+    assert response.status_code == 200
+    return [tuple(item[name] for name in ENTRY_FIELDS) for item in response.get_json()['items']]
+
+
+def test_changesets_expand_like_single_field_rows(app, client, monkeypatch, project, admin):
+    changeset_id = updated_requirement(app, monkeypatch, project, admin, True, 'HC-1')
+    single_id = updated_requirement(app, monkeypatch, project, admin, False, 'HC-2')
+
+    changeset_rows = RequirementHistory.query.filter_by(requirement_id=changeset_id).all()
+    single_rows = RequirementHistory.query.filter_by(requirement_id=single_id).all()
+    assert len(changeset_rows) == len(UPDATES)
+    assert all(row.changes and not row.field_name for row in changeset_rows)
+    assert len(single_rows) == sum(len(data) for data in UPDATES)
+
+    expected = [(field, str(old), str(new)) for field, old, new in [
+        ('title', '标题', '新标题'), ('due_date', None, date(2026, 3, 1)), ('estimated_hours', None, 8.5),
+        ('due_date', date(2026, 3, 1), None), ('story_points', None, 3), ('is_template', False, True),
+        ('assignee_id', None, 1), ('estimated_hours', 8.5, None),
+    ]]
+    for rows in (changeset_rows, single_rows):
+        entries = HistoryService.expand(sorted(rows, key=lambda row: row.id))
+        assert [(entry.field_name, entry.old_value, entry.new_value) for entry in entries] == expected
+
+    # 时间线接口按时间倒序返回，两种格式的条目相同（同一次保存内的字段顺序不要求一致）
+    assert sorted(api_entries(client, changeset_id)) == sorted(api_entries(client, single_id))
+    assert ('update', 'due_date', '2026-03-01', 'None') in [entry[2:6] for entry in api_entries(client, changeset_id)]
+
+
+def test_expand_limit_counts_entries(app, monkeypatch, project, admin):
+    requirement_id = updated_requirement(app, monkeypatch, project, admin, True, 'HC-1')
+    rows = RequirementHistory.query.filter_by(requirement_id=requirement_id).order_by(RequirementHistory.id).all()
+    assert [entry.field_name for entry in HistoryService.expand(rows, limit=4)] == [
+        'title', 'due_date', 'estimated_hours', 'due_date'
+    ]
+
+
+@pytest.mark.parametrize('changes', [{}, None])
+def test_record_update_skips_empty_changes(app, project, changes):
+    HistoryService.record_update(1, 1, changes, project_id=project)
+    db.session.commit()
+    assert RequirementHistory.query.count() == 0
@@ -0,0 +1,150 @@
+"""后台任务：JOB_EXECUTOR=worker 时由 job-worker 领取执行，排队超时、结果下载和访问权限"""
+import io
+import json
+import os
+from datetime import timedelta
+
+import pytest
+
+from conftest import login
+from models import db, Job, Requirement, User, beijing_now
+from services.job_service import JobService
+
+
+@pytest.fixture
+def worker(app, monkeypatch, tmp_path):
+    """只入队不执行，由测试调用 run_worker 执行"""
+    monkeypatch.setitem(app.config, 'JOB_EXECUTOR', 'worker')
+    monkeypatch.setitem(app.config, 'JOB_PENDING_TIMEOUT', 600)
+    monkeypatch.setitem(app.config, 'JOB_ARTIFACT_FOLDER', str(tmp_path / 'job_artifacts'))
+    return tmp_path / 'job_artifacts'
+
+
+def run_worker():
+    """执行当前排队的任务后返回执行完成的数量，读取前换用新会话以看到工作线程的提交"""
+    finished = JobService.work(once=True, echo=lambda message: None)
+    db.session.remove()
+    return finished
+
+
+def job_status(job_id):
+    return Job.query.get(job_id).status
+
+
+def new_user(username, role='developer'):
+    user = User(username=username, email=f'{username}@example.com', full_name=username, role=role,
+                password_hash='-')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def submit_import(client, project):
+    content = '标题,描述,类型,优先级\n需求A,描述A,,\n需求B,描述B,功能需求,高\n,缺少标题,,\n'
+    response = client.post('/requirements/import', data={
+        'project_id': str(project),
+        'file': (io.BytesIO(content.encode('utf-8')), 'requirements.csv')
+    }, content_type='multipart/form-data', headers={'X-Requested-With': 'XMLHttpRequest'})
+    assert response.status_code == 202
+    job = Job.query.get(response.get_json()['job']['id'])
+    return job.id, job.params
+
+
+def test_pending_job_is_claimed_once(app, admin, worker):
+    first = JobService.submit('export', {'format': 'csv'}, admin).id
+    second = JobService.submit('export', {'format': 'csv'}, admin).id
+    assert job_status(first) == job_status(second) == 'pending'
+
+    # 已被领取的任务不能再次领取，worker 也不会执行
+    assert JobService.claim(first) is True
+    assert JobService.claim(first) is False
+    assert run_worker() == 1
+    assert job_status(first) == 'running'
+    assert job_status(second) == 'succeeded'
+
+    assert JobService.claim(second) is False
+    assert JobService.claim_next() is None
+    assert run_worker() == 0
+
+
+def test_import_job_runs_in_worker(app, client, project, worker):
+    job_id, params = submit_import(client, project)
+    upload = json.loads(params)['path']
+    assert os.path.exists(upload)
+    assert job_status(job_id) == 'pending'
+
+    assert run_worker() == 1
+    job = client.get(f'/jobs/{job_id}/status').get_json()['job']
+    assert job['status'] == 'succeeded'
+    assert job['result']['success_count'] == 2
+    assert job['result']['error_count'] == 1
+    assert not os.path.exists(upload)
+    assert Requirement.query.filter_by(project_id=project).count() == 2
+
+
+def test_stale_pending_import_fails_and_removes_upload(app, client, project, worker):
+    job_id, params = submit_import(client, project)
+    upload = json.loads(params)['path']
+
+    # 未超时的任务保持排队
+    assert client.get(f'/jobs/{job_id}/status').get_json()['job']['status'] == 'pending'
+    assert os.path.exists(upload)
+
+    Job.query.filter_by(id=job_id).update({'created_at': beijing_now() - timedelta(seconds=601)})
+    db.session.commit()
+    job = client.get(f'/jobs/{job_id}/status').get_json()['job']
+    assert job['status'] == 'failed'
+    assert 'flask job-worker' in job['message']
+    assert not os.path.exists(upload)
+
+    # 超时后 worker 不会再领取
+    assert run_worker() == 0
+    assert Requirement.query.count() == 0
+    assert client.get(f'/jobs/{job_id}').status_code == 200
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'xlsx'])
+def test_export_job_produces_downloadable_file(app, client, project, admin, worker, export_format):
+    codes = [f'QC-EXPORT-{index}' for index in range(3)]
+    db.session.add_all([Requirement(code=code, title=code, description='描述', project_id=project,
+                                    creator_id=admin) for code in codes])
+    db.session.commit()
+
+    response = client.get(f'/requirements/export?format={export_format}&background=1',
+                          headers={'X-Requested-With': 'XMLHttpRequest'})
+    assert response.status_code == 202
+    job_id = response.get_json()['job']['id']
+    # 完成之前没有可下载的文件
+    assert client.get(f'/jobs/{job_id}/download').status_code == 404
+
+    assert run_worker() == 1
+    job = client.get(f'/jobs/{job_id}/status').get_json()['job']
+    assert job['status'] == 'succeeded' and job['has_artifact']
+    assert job['result'] == {'count': 3}
+
+    response = client.get(f'/jobs/{job_id}/download')
+    assert response.status_code == 200
+    assert f'.{export_format}' in response.headers['Content-Disposition']
+    data = response.get_data()
+    if export_format == 'csv':
+        text = data.decode('utf-8-sig')
+        assert all(code in text for code in codes)
+    else:
+        assert data.startswith(b'PK')
+    assert os.path.dirname(Job.query.get(job_id).artifact_path) == str(worker)
+
+
+def test_only_creator_or_admin_can_see_job(app, admin, worker):
+    owner = new_user('owner')
+    other = new_user('other')
+    job_id = JobService.submit('export', {'format': 'csv'}, owner).id
+    run_worker()
+
+    def codes(user_id):
+        client = app.test_client()
+        login(client, user_id)
+        return [client.get(f'/jobs/{job_id}{suffix}').status_code for suffix in ('', '/status', '/download')]
+
+    assert codes(owner) == [200, 200, 200]
+    assert codes(admin) == [200, 200, 200]
+    assert codes(other) == [404, 404, 404]
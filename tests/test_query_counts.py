@@ -0,0 +1,122 @@
+"""需求列表、详情和导出的查询数量不随行数增长（预加载方案见 services/loading_profiles.py）"""
+import pytest
+from sqlalchemy import event
+
+from models import db, Requirement, RequirementHistory, Tag, Comment, Attachment, User
+from models import TestCase as RequirementTestCase  # 避免 pytest 把模型当作测试类收集
+from services.requirement_service import RequirementService
+
+N = 3
+
+
+def _new_user(index):
+    # 测试用户不需要登录，不计算密码哈希
+    user = User(username=f'user{index}', email=f'user{index}@example.com', full_name=f'用户{index}',
+                password_hash='-')
+    db.session.add(user)
+    return user
+
+
+def seed_requirements(project_id, count):
+    """补充需求到 count 条，每条需求的负责人和标签都不同"""
+    start = Requirement.query.filter_by(project_id=project_id).count()
+    for index in range(start, count):
+        requirement = Requirement(
+            code=f'QC-{index:04d}', title=f'需求{index}', description='描述',
+            project_id=project_id, assignee=_new_user(index), creator_id=1,
+            tags=[Tag(name=f'标签{index}')]
+        )
+        db.session.add(requirement)
+    db.session.commit()
+
+
+def seed_details(requirement_id, count):
+    """为需求补充到 count 条评论、附件、测试用例和历史，每条的关联用户都不同"""
+    requirement = Requirement.query.get(requirement_id)
+    start = len(requirement.comments)
+    for index in range(start, count):
+        db.session.add_all([
+            Comment(requirement=requirement, user=_new_user(f'c{index}'), content=f'评论{index}'),
+            Attachment(requirement=requirement, uploader=_new_user(f'a{index}'), filename=f'附件{index}.txt',
+                       file_size=1024),
+            RequirementTestCase(requirement=requirement, tester=_new_user(f't{index}'), title=f'用例{index}'),
+            RequirementHistory(requirement_id=requirement.id, user=_new_user(f'h{index}'), action='update',
+                               field_name='title', old_value='a', new_value='b'),
+        ])
+    db.session.commit()
+
+
+def count_queries(func):
+    """执行 func 并返回期间执行的SQL语句数，先执行一次预热进程内缓存
+
+    测试客户端的请求复用测试中的应用上下文和会话，每次执行前后都换用新会话，
+    与实际请求一样从空的identity map开始加载。
+    """
+    db.session.remove()
+    func()
+    db.session.remove()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    db.session.remove()
+    return len(statements)
+
+
+def test_list_profile_query_count(app, project):
+    def search():
+        page = RequirementService.search_requirements({}, per_page=100, profile='list')
+        for requirement in page.items:
+            requirement.assignee and requirement.assignee.full_name
+            requirement.project and requirement.project.name
+            [tag.name for tag in requirement.tags]
+        return page
+
+    seed_requirements(project, N)
+    small = count_queries(search)
+    seed_requirements(project, N * 10)
+    assert len(search().items) == N * 10
+    assert count_queries(search) == small
+
+
+def test_list_page_query_count(app, client, project):
+    def index():
+        response = client.get('/requirements/?per_page=100')
+        assert response.status_code == 200
+
+    seed_requirements(project, N)
+    small = count_queries(index)
+    seed_requirements(project, N * 10)
+    assert count_queries(index) == small
+
+
+def test_detail_profile_query_count(app, client, project):
+    seed_requirements(project, 1)
+    requirement_id = Requirement.query.first().id
+
+    def view():
+        response = client.get(f'/requirements/{requirement_id}')
+        assert response.status_code == 200
+
+    seed_details(requirement_id, N)
+    small = count_queries(view)
+    seed_details(requirement_id, N * 10)
+    assert count_queries(view) == small
+
+
+def test_export_query_count(app, client, project):
+    def export():
+        response = client.get('/requirements/export?format=xlsx&background=0')
+        assert response.status_code == 200
+        response.get_data()
+
+    seed_requirements(project, N)
+    small = count_queries(export)
+    seed_requirements(project, N * 10)
+    assert count_queries(export) == small
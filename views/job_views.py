@@ -0,0 +1,42 @@
+from flask import Blueprint, render_template, jsonify, send_file, abort
+from flask_login import login_required, current_user
+import os
+
+from models import Job
+from services.job_service import JobService
+
+job_bp = Blueprint('job', __name__, url_prefix='/jobs')
+
+
+def _get_job_or_404(id):
+    """获取任务，只有提交人和管理员可以查看"""
+    job = Job.query.get_or_404(id)
+    if job.created_by != current_user.id and current_user.role != 'admin':
+        abort(404)
+    return JobService.expire_if_stale(job)
+
+
+@job_bp.route('/<int:id>')
+@login_required
+def view(id):
+    """任务进度页面"""
+    job = _get_job_or_404(id)
+    return render_template('jobs/view.html', job=job)
+
+
+@job_bp.route('/<int:id>/status')
+@login_required
+def status(id):
+    """任务状态，供进度页面轮询"""
+    job = _get_job_or_404(id)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@job_bp.route('/<int:id>/download')
+@login_required
+def download(id):
+    """下载任务结果文件"""
+    job = _get_job_or_404(id)
+    if job.status != 'succeeded' or not job.artifact_path or not os.path.exists(job.artifact_path):
+        abort(404)
+    return send_file(job.artifact_path, as_attachment=True, download_name=job.artifact_name)
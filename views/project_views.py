@@ -1,17 +1,24 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import or_, and_, desc, func
+from sqlalchemy import or_, and_, desc
 from datetime import datetime, timedelta, timezone
 import json
 
 # 定义北京时区
 BEIJING_TZ = timezone(timedelta(hours=8))
 
-from models import db, Project, User, Requirement, RequirementStatus
+from models import db, Project, User, Requirement, RequirementStatus, Baseline
 from forms import (ProjectCreateForm, ProjectEditForm, ProjectFilterForm, 
                    ProjectMemberForm, ProjectStatisticsForm)
 from auth_decorators import admin_required, manager_required
+from services.stats_rollup import StatsRollupService
+from services.trend_service import TrendService
+from services.requirement_service import RequirementService
+from services.membership_service import ProjectMemberService
+from services.job_service import JobService
+from services.checkpoint_service import CheckpointService, parse_moment
+from services.snapshot_store import SnapshotStore
 
 # 创建蓝图
 project_bp = Blueprint('project', __name__, url_prefix='/projects')
@@ -32,16 +39,7 @@ def index():
         query = query.filter(
             or_(
                 Project.manager_id == current_user.id,
-                Project.id.in_(
-                    db.session.query(Requirement.project_id)
-                    .filter(
-                        or_(
-                            Requirement.creator_id == current_user.id,
-                            Requirement.assignee_id == current_user.id,
-                            Requirement.reviewer_id == current_user.id
-                        )
-                    ).distinct()
-                )
+                Project.id.in_(ProjectMemberService.project_ids_subquery(current_user.id))
             )
         )
     
@@ -88,11 +86,11 @@ def index():
         ).all()
     ]
     
-    # 获取每个项目的需求统计信息
+    # 一次查询获取当前页所有项目的需求统计信息
+    batch_stats = RequirementService.project_requirements_stats([p.id for p in projects.items])
     project_stats = {}
     for project in projects.items:
-        # 直接调用已修复的统计函数
-        stats = _get_project_requirements_stats(project.id)
+        stats = batch_stats[project.id]
         
         project_stats[project.id] = {
             'total': stats['total'],
@@ -173,13 +171,7 @@ def detail(id):
         .order_by(desc(Requirement.updated_at)).limit(5).all()
     
     # 获取项目团队成员（通过需求关联）
-    team_members = db.session.query(User).join(Requirement, 
-        or_(
-            Requirement.creator_id == User.id,
-            Requirement.assignee_id == User.id,
-            Requirement.reviewer_id == User.id
-        )
-    ).filter(Requirement.project_id == project.id).distinct().all()
+    team_members = ProjectMemberService.members(project.id)
     
     return render_template('projects/detail.html',
                          project=project,
@@ -259,6 +251,55 @@ def delete(id):
         return redirect(url_for('project.detail', id=id))
 
 
+@project_bp.route('/<int:id>/baselines', methods=['POST'])
+@login_required
+def create_baseline(id):
+    """创建项目基线，提交后台任务后跳转到任务进度页"""
+    project = Project.query.get_or_404(id)
+    
+    if not _can_edit_project(project):
+        flash('您没有权限为该项目创建基线', 'error')
+        return redirect(url_for('project.detail', id=id))
+    
+    name = request.form.get('name', '').strip()
+    version = request.form.get('version', '').strip()
+    if not name or not version:
+        flash('基线名称和版本号不能为空', 'error')
+        return redirect(url_for('project.detail', id=id))
+    if len(name) > 100 or len(version) > 20:
+        flash('基线名称不能超过100个字符，版本号不能超过20个字符', 'error')
+        return redirect(url_for('project.detail', id=id))
+    
+    job = JobService.submit('baseline', {
+        'project_id': project.id,
+        'name': name,
+        'version': version,
+        'description': request.form.get('description', '').strip() or None
+    }, current_user.id)
+    return redirect(url_for('job.view', id=job.id))
+
+
+@project_bp.route('/<int:id>/baselines/<int:baseline_id>')
+@login_required
+def baseline_detail(id, baseline_id):
+    """API: 基线中的需求快照"""
+    project = Project.query.get_or_404(id)
+    if not _can_access_project(project):
+        return jsonify({'success': False, 'message': '您没有权限访问该项目'}), 403
+    baseline = Baseline.query.filter_by(id=baseline_id, project_id=project.id).first_or_404()
+    
+    requirements = SnapshotStore.baseline_requirements(baseline)
+    return jsonify({
+        'id': baseline.id,
+        'name': baseline.name,
+        'version': baseline.version,
+        'description': baseline.description,
+        'created_at': baseline.created_at.isoformat() if baseline.created_at else None,
+        'count': len(requirements),
+        'requirements': requirements
+    })
+
+
 @project_bp.route('/<int:id>/statistics')
 @login_required
 def statistics(id):
@@ -278,6 +319,29 @@ def statistics(id):
                          stats_data=stats_data)
 
 
+@project_bp.route('/<int:id>/as-of')
+@login_required
+def as_of(id):
+    """API: 项目在指定时刻的需求列表
+
+    参数 at 为时间点（YYYY-MM-DD 或 ISO 8601）
+    """
+    project = Project.query.get_or_404(id)
+    if not _can_access_project(project):
+        return jsonify({'success': False, 'message': '您没有权限访问该项目'}), 403
+    try:
+        at = parse_moment(request.args.get('at'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    requirements = CheckpointService.project_as_of(project.id, at)
+    return jsonify({
+        'at': at.isoformat(),
+        'count': len(requirements),
+        'requirements': requirements
+    })
+
+
 @project_bp.route('/statistics/data')
 @login_required
 def statistics_data():
@@ -292,22 +356,14 @@ def statistics_data():
         projects = Project.query.filter(
             or_(
                 Project.manager_id == current_user.id,
-                Project.id.in_(
-                    db.session.query(Requirement.project_id)
-                    .filter(
-                        or_(
-                            Requirement.creator_id == current_user.id,
-                            Requirement.assignee_id == current_user.id,
-                            Requirement.reviewer_id == current_user.id
-                        )
-                    ).distinct()
-                )
+                Project.id.in_(ProjectMemberService.project_ids_subquery(current_user.id))
             )
         ).all()
     
+    batch_stats = RequirementService.project_requirements_stats([p.id for p in projects])
     stats = []
     for project in projects:
-        project_stats = _get_project_requirements_stats(project.id)
+        project_stats = batch_stats[project.id]
         stats.append({
             'id': project.id,
             'name': project.name,
@@ -332,16 +388,7 @@ def _can_access_project(project):
         return True
     
     # 检查用户是否参与了项目中的需求
-    requirement_exists = Requirement.query.filter(
-        Requirement.project_id == project.id,
-        or_(
-            Requirement.creator_id == current_user.id,
-            Requirement.assignee_id == current_user.id,
-            Requirement.reviewer_id == current_user.id
-        )
-    ).first()
-    
-    return requirement_exists is not None
+    return ProjectMemberService.is_member(project.id, current_user.id)
 
 
 def _can_edit_project(project):
@@ -357,45 +404,7 @@ def _can_edit_project(project):
 
 def _get_project_requirements_stats(project_id):
     """获取项目需求统计信息"""
-    from sqlalchemy import case
-    
-    # 先获取总数
-    total = db.session.query(func.count(Requirement.id)).filter(
-        Requirement.project_id == project_id
-    ).scalar() or 0
-    
-    # 获取所有状态的统计
-    status_counts = db.session.query(
-        Requirement.status,
-        func.count(Requirement.id).label('count')
-    ).filter(Requirement.project_id == project_id).group_by(Requirement.status).all()
-    
-    # 初始化状态统计
-    status_stats = {status.value: 0 for status in RequirementStatus}
-    
-    # 填充实际统计数据
-    for status, count in status_counts:
-        if status in status_stats:
-            status_stats[status] = count
-    
-    # 计算完成率
-    completed = status_stats.get(RequirementStatus.COMPLETED.value, 0)
-    completion_rate = round((completed / total * 100), 1) if total > 0 else 0
-    
-    return {
-        'total': total,
-        'completed': completed,
-        'in_development': status_stats.get(RequirementStatus.IN_DEVELOPMENT.value, 0),
-        'testing': status_stats.get(RequirementStatus.TESTING.value, 0),
-        'draft': status_stats.get(RequirementStatus.DRAFT.value, 0),
-        'submitted': status_stats.get(RequirementStatus.SUBMITTED.value, 0),
-        'reviewing': status_stats.get(RequirementStatus.REVIEWING.value, 0),
-        'approved': status_stats.get(RequirementStatus.APPROVED.value, 0),
-        'rejected': status_stats.get(RequirementStatus.REJECTED.value, 0),
-        'cancelled': status_stats.get(RequirementStatus.CANCELLED.value, 0),
-        'on_hold': status_stats.get(RequirementStatus.ON_HOLD.value, 0),
-        'completion_rate': completion_rate
-    }
+    return RequirementService.project_requirements_stats([project_id])[project_id]
 
 
 def _get_comprehensive_project_stats(project_id):
@@ -405,49 +414,23 @@ def _get_comprehensive_project_stats(project_id):
     # 基本需求统计
     requirements_stats = _get_project_requirements_stats(project_id)
     
-    # 按优先级统计
-    priority_stats = db.session.query(
-        Requirement.priority,
-        func.count(Requirement.id).label('count')
-    ).filter(Requirement.project_id == project_id)\
-     .group_by(Requirement.priority).all()
-    
-    # 按类型统计
-    type_stats = db.session.query(
-        Requirement.type,
-        func.count(Requirement.id).label('count')
-    ).filter(Requirement.project_id == project_id)\
-     .group_by(Requirement.type).all()
-    
-    # 最近30天的需求创建趋势
-    thirty_days_ago = datetime.now(BEIJING_TZ) - timedelta(days=30)
-    trend_stats = db.session.query(
-        func.date(Requirement.created_at).label('date'),
-        func.count(Requirement.id).label('count')
-    ).filter(
-        Requirement.project_id == project_id,
-        Requirement.created_at >= thirty_days_ago
-    ).group_by(func.date(Requirement.created_at)).all()
-    
-    # 处理趋势数据，确保日期格式正确
-    trend_data = []
-    for stat in trend_stats:
-        # 处理 SQLite 中 func.date() 返回字符串的情况
-        date_str = stat.date
-        if isinstance(date_str, str):
-            # 已经是字符串格式，直接使用
-            trend_data.append({'date': date_str, 'count': stat.count})
-        else:
-            # 如果是日期对象，转换为字符串
-            trend_data.append({'date': date_str.isoformat(), 'count': stat.count})
+    # 按优先级、类型统计（读取统计汇总表）
+    breakdown = StatsRollupService.breakdown(project_id)
+    
+    # 最近30天的需求创建趋势（只保留有创建记录的日期）
+    trend = TrendService.created_completed('day', 30, project_id=project_id)
+    trend_data = [
+        {'date': day, 'count': count}
+        for day, count in zip(trend['buckets'], trend['created_data']) if count
+    ]
     
     # 处理优先级统计，提供默认值
-    priority_dict = {stat.priority: stat.count for stat in priority_stats}
+    priority_dict = dict(breakdown['priority_stats'])
     if not priority_dict:  # 如果没有数据，提供默认值
         priority_dict = {'中': 0}  # 提供一个默认的优先级
     
     # 处理类型统计，提供默认值
-    type_dict = {stat.type: stat.count for stat in type_stats}
+    type_dict = dict(breakdown['type_stats'])
     if not type_dict:  # 如果没有数据，提供默认值
         type_dict = {'功能': 0}  # 提供一个默认的类型
     
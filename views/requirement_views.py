@@ -1,14 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import func, extract
-from sqlalchemy import or_
 
 # 定义北京时区
 BEIJING_TZ = timezone(timedelta(hours=8))
-from models import db, Requirement, Project, Module, Category, User, Tag, RequirementHistory, Comment, Attachment
+from models import db, Requirement, Project, Module, Category, Tag, RequirementHistory, Comment, Attachment
 from forms import RequirementForm, RequirementFilterForm, TestCaseForm, CommentForm, BulkImportForm, StatusChangeForm
-from services.requirement_service import RequirementService
+from services.requirement_service import RequirementService, STREAM_EXPORT_FORMATS
+from services.pagination import InvalidCursor
+from services.trend_service import TrendService
+from services.membership_service import ProjectMemberService
+from services.choice_cache import ChoiceCache
+from services.typeahead_service import TypeaheadService
+from services.loading_profiles import loading_options
+from services.job_service import JobService
+from services.history_service import HistoryService
+from services.history_archive import HistoryArchiveService
+from services.audit_service import AuditService
+from services.checkpoint_service import CheckpointService, parse_moment
+from services.flow_metrics import FlowMetricsService
+from auth_decorators import manager_required
 import json
 import os
 import uuid
@@ -16,6 +27,12 @@ from werkzeug.utils import secure_filename
 
 requirement_bp = Blueprint('requirement', __name__, url_prefix='/requirements')
 
+# 导出时每批从数据库读取的行数
+EXPORT_BATCH_SIZE = 1000
+
+# 统计页趋势图各时间粒度显示的桶数量
+TREND_PERIODS = {'month': 6, 'week': 12, 'day': 30}
+
 def allowed_file(filename):
     """检查文件扩展名是否被允许"""
     return '.' in filename and \
@@ -53,6 +70,10 @@ def save_uploaded_file(file, requirement_id):
         return attachment
     return None
 
+def _clamp_per_page(per_page):
+    """把每页数量限制在 1 到 MAX_ITEMS_PER_PAGE 之间"""
+    return max(1, min(per_page or 1, current_app.config.get('MAX_ITEMS_PER_PAGE', 100)))
+
 @requirement_bp.route('/')
 @login_required
 def index():
@@ -60,9 +81,9 @@ def index():
     filter_form = RequirementFilterForm(request.args)
     
     # 填充选择框选项
-    filter_form.project_id.choices = [('', 'All')] + [(str(p.id), p.name) for p in Project.query.all()]
-    filter_form.module_id.choices = [('', 'All')] + [(str(m.id), m.name) for m in Module.query.all()]
-    filter_form.assignee_id.choices = [('', 'All')] + [(str(u.id), u.full_name) for u in User.query.filter_by(is_active=True).all()]
+    filter_form.project_id.choices = [('', 'All')] + ChoiceCache.all_projects()
+    filter_form.module_id.choices = [('', 'All')] + ChoiceCache.all_modules()
+    filter_form.assignee_id.choices = [('', 'All')] + ChoiceCache.active_users()
     
     # 构建过滤条件
     filters = {
@@ -74,27 +95,22 @@ def index():
         'module_id': filter_form.module_id.data if filter_form.module_id.data else None,
         'assignee_id': filter_form.assignee_id.data if filter_form.assignee_id.data else None,
         'start_date': filter_form.start_date.data,
-        'end_date': filter_form.end_date.data
+        'end_date': filter_form.end_date.data,
+        'sort': request.args.get('sort')
     }
     
     # 获取分页参数
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)  # 默认20条每页
+    per_page = _clamp_per_page(request.args.get('per_page', 20, type=int))  # 默认20条每页
+    # 游标分页模式：mode=cursor 或携带cursor参数时启用
+    cursor = request.args.get('cursor')
+    keyset = request.args.get('mode') == 'cursor' or bool(cursor)
     
     # 搜索需求（返回分页对象）
     # 对于查看者角色和开发者等非管理员角色，只显示其参与的项目需求
     if current_user.role in ['viewer', 'developer', 'tester']:
         # 获取用户参与的项目ID列表（创建者、负责人或评审人）
-        participant_project_ids = db.session.query(Requirement.project_id).filter(
-            or_(
-                Requirement.creator_id == current_user.id,
-                Requirement.assignee_id == current_user.id,
-                Requirement.reviewer_id == current_user.id
-            )
-        ).distinct().all()
-        
-        # 将结果转换为ID列表
-        project_ids = [pid[0] for pid in participant_project_ids if pid[0] is not None]
+        project_ids = ProjectMemberService.project_ids_for_user(current_user.id)
         
         # 添加项目ID过滤条件
         if project_ids:
@@ -134,12 +150,23 @@ def index():
             # 如果用户没有管理任何项目，设置一个空的项目ID列表
             filters['project_ids'] = []
     
-    requirements = RequirementService.search_requirements(
-        filters, 
-        page=page, 
-        per_page=per_page, 
-        paginate=True
-    )
+    try:
+        requirements = RequirementService.search_requirements(
+            filters, 
+            page=page, 
+            per_page=per_page, 
+            paginate=True,
+            keyset=keyset,
+            cursor=cursor,
+            with_total=keyset,
+            projection='list'
+        )
+    except InvalidCursor:
+        # 游标失效时回到第一页
+        flash('分页参数无效，已返回第一页', 'warning')
+        requirements = RequirementService.search_requirements(
+            filters, per_page=per_page, keyset=True, with_total=True, projection='list'
+        )
     
     # 获取统计信息（不分页，用于显示总统计）
     stats = RequirementService.calculate_statistics(filters.get('project_id'))
@@ -227,13 +254,15 @@ def create():
 @login_required
 def view(id):
     """查看需求详情"""
-    requirement = Requirement.query.get_or_404(id)
+    requirement = Requirement.query.options(*loading_options('detail')).get_or_404(id)
     
     # 获取影响分析
     impact = RequirementService.analyze_impact(id)
     
-    # 获取历史记录
-    history = requirement.history.order_by(RequirementHistory.created_at.desc()).limit(10).all()
+    # 获取历史记录，变更集展开为逐字段记录
+    history = HistoryService.expand(requirement.history.options(*loading_options('history')).order_by(
+        RequirementHistory.created_at.desc()
+    ).limit(10), limit=10)
     
     # 评论表单
     comment_form = CommentForm()
@@ -333,7 +362,9 @@ def edit(id):
             db.session.rollback()
     
     # 预处理历史记录，使用正确的SQLAlchemy语法
-    recent_history = requirement.history.order_by(RequirementHistory.created_at.desc()).limit(5).all()
+    recent_history = HistoryService.expand(
+        requirement.history.order_by(RequirementHistory.created_at.desc()).limit(5), limit=5
+    )
     
     return render_template('edit.html', form=form, requirement=requirement, recent_history=recent_history)
 
@@ -472,44 +503,84 @@ def upload_attachment(id):
 @requirement_bp.route('/export')
 @login_required
 def export():
-    """导出需求"""
+    """导出需求
+
+    参数 format 为 xlsx（默认）、csv 或 ndjson，其余参数为 search_requirements 的过滤条件。
+    csv/ndjson 以分块流的形式边查询边输出，gzip=1 时输出gzip压缩文件。
+    xlsx 默认提交后台任务并跳转到任务进度页，background=0 时在请求中直接生成；
+    csv/ndjson 默认直接输出，background=1 时同样提交后台任务。
+    """
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format != 'xlsx' and export_format not in STREAM_EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': f'不支持的导出格式: {export_format}'}), 400
+    
     # 获取过滤条件
     filters = request.args.to_dict()
-    requirements = RequirementService.search_requirements(filters, paginate=False)
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    background = request.args.get('background', '1' if export_format == 'xlsx' else '0')
+    if background.lower() in ('1', 'true', 'yes'):
+        for name in ('format', 'gzip', 'background'):
+            filters.pop(name, None)
+        job = JobService.submit('export', {
+            'filters': filters,
+            'format': export_format,
+            'gzip': compress
+        }, current_user.id)
+        return _job_response(job)
+    
+    requirements = RequirementService.search_requirements(
+        filters, paginate=False, projection='export', yield_per=EXPORT_BATCH_SIZE
+    )
+    filename = f'requirements_{datetime.now(BEIJING_TZ).strftime("%Y%m%d_%H%M%S")}'
+    
+    if export_format in STREAM_EXPORT_FORMATS:
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        filename = f'{filename}.{export_format}'
+        if compress:
+            mimetype = 'application/gzip'
+            filename += '.gz'
+        chunks = RequirementService.stream_export(requirements, export_format, compress=compress)
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
     
-    # 生成Excel文件
+    # 生成Excel文件，逐批读取、逐行写入
     output = RequirementService.export_requirements(requirements)
     
     return send_file(
         output,
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
-        download_name=f'requirements_{datetime.now(BEIJING_TZ).strftime("%Y%m%d_%H%M%S")}.xlsx'
+        download_name=f'{filename}.xlsx'
     )
 
+def _job_response(job):
+    """后台任务提交后的响应：AJAX请求返回任务信息，否则跳转到任务进度页"""
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'status_url': url_for('job.status', id=job.id),
+            'view_url': url_for('job.view', id=job.id)
+        }), 202
+    return redirect(url_for('job.view', id=job.id))
+
 @requirement_bp.route('/import', methods=['GET', 'POST'])
 @login_required
 def bulk_import():
-    """批量导入需求"""
+    """批量导入需求，上传文件保存后提交后台任务"""
     form = BulkImportForm()
     form.project_id.choices = [(str(p.id), p.name) for p in Project.query.filter_by(status='active').all()]
     
     if form.validate_on_submit():
-        file = form.file.data
-        project_id = form.project_id.data
-        
-        success_count, errors = RequirementService.import_requirements(
-            file, project_id, current_user.id
-        )
-        
-        if success_count > 0:
-            flash(f'成功导入 {success_count} 条需求', 'success')
-        
-        if errors:
-            for error in errors:
-                flash(error, 'warning')
-        
-        return redirect(url_for('requirement.index'))
+        job = JobService.submit('import', {
+            'path': JobService.save_upload(form.file.data),
+            'project_id': int(form.project_id.data)
+        }, current_user.id)
+        return _job_response(job)
     
     return render_template('requirements/import.html', form=form)
 
@@ -518,61 +589,28 @@ def bulk_import():
 def statistics():
     """需求统计页面"""
     project_id = request.args.get('project_id', type=int)
-    stats = RequirementService.calculate_statistics(project_id)
+    stats = RequirementService.calculate_statistics(project_id, use_rollup=True)
     
     # 获取项目列表
     projects = Project.query.filter_by(status='active').all()
     
-    # 计算月度趋势数据（过6个月）
-    
-    current_date = datetime.now(BEIJING_TZ)
-    trend_data = {
-        'labels': [],
-        'created_data': [],
-        'completed_data': []
-    }
-    
-    for i in range(6):
-        # 计算月份
-        target_date = current_date - timedelta(days=30 * i)
-        month_label = f"{target_date.month}月"
-        trend_data['labels'].insert(0, month_label)
-        
-        # 计算该月创建的需求数
-        created_query = Requirement.query.filter(
-            extract('year', Requirement.created_at) == target_date.year,
-            extract('month', Requirement.created_at) == target_date.month
-        )
-        if project_id:
-            created_query = created_query.filter_by(project_id=project_id)
-        created_count = created_query.count()
-        trend_data['created_data'].insert(0, created_count)
-        
-        # 计算该月完成的需求数
-        completed_query = Requirement.query.filter(
-            extract('year', Requirement.updated_at) == target_date.year,
-            extract('month', Requirement.updated_at) == target_date.month,
-            Requirement.status.in_(['Completed', 'completed'])
-        )
-        if project_id:
-            completed_query = completed_query.filter_by(project_id=project_id)
-        completed_count = completed_query.count()
-        trend_data['completed_data'].insert(0, completed_count)
+    # 计算趋势数据：默认过去6个自然月，可通过granularity=week/day切换
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in TREND_PERIODS:
+        granularity = 'month'
+    trend_data = TrendService.created_completed(granularity, TREND_PERIODS[granularity], project_id=project_id)
     
     # 计算项目需求分布数据
     project_distribution = []
-    for project in Project.query.filter_by(status='active').all():
-        req_query = Requirement.query.filter_by(project_id=project.id)
-        
-        pending = req_query.filter(Requirement.status.in_(['草稿', '已提交', '评审中'])).count()
-        in_progress = req_query.filter(Requirement.status.in_(['In progress', '测试中'])).count()
-        completed = req_query.filter(Requirement.status.in_(['Completed'])).count()
+    batch_stats = RequirementService.project_requirements_stats([p.id for p in projects])
+    for project in projects:
+        project_stats = batch_stats[project.id]
         
         project_distribution.append({
             'name': project.name,
-            'pending': pending,
-            'in_progress': in_progress,
-            'completed': completed
+            'pending': project_stats['draft'] + project_stats['submitted'] + project_stats['reviewing'],
+            'in_progress': project_stats['in_development'] + project_stats['testing'],
+            'completed': project_stats['completed']
         })
     
     # 准备图表数据
@@ -598,33 +636,8 @@ def statistics():
         }
     }
     
-    # 获取团队工作量统计（简化版）
-    team_stats = []
-    users = User.query.filter_by(is_active=True).all()
-    for user in users:
-        user_requirements = Requirement.query.filter_by(assignee_id=user.id)
-        if project_id:
-            user_requirements = user_requirements.filter_by(project_id=project_id)
-        
-        pending = user_requirements.filter(Requirement.status.in_(['草稿', '已提交', '评审中'])).count()
-        in_progress = user_requirements.filter(Requirement.status.in_(['已批准', 'In progress', '测试中'])).count() 
-        completed = user_requirements.filter_by(status='Completed').count()
-        total = pending + in_progress + completed
-        
-        if total > 0:  # 只显示有需求的用户
-            completion_rate = round((completed / total) * 100, 1) if total > 0 else 0
-            estimated_hours = user_requirements.with_entities(func.sum(Requirement.estimated_hours)).scalar() or 0
-            
-            team_stats.append({
-                'name': user.full_name or user.username,
-                'avatar': getattr(user, 'avatar', None),
-                'pending': pending,
-                'in_progress': in_progress,
-                'completed': completed,
-                'total': total,
-                'estimated_hours': round(estimated_hours, 1),
-                'completion_rate': completion_rate
-            })
+    # 获取团队工作量统计
+    team_stats = RequirementService.team_workload(project_id)
     
     return render_template('requirements/statistics.html',
                          stats=stats,
@@ -632,13 +645,75 @@ def statistics():
                          projects=projects,
                          team_stats=team_stats)
 
+@requirement_bp.route('/statistics/flow')
+@login_required
+def flow_statistics():
+    """需求流转指标数据（交付周期、开发周期、状态停留时间、每周完成数）
+
+    参数 project_id、assignee_id 为过滤条件，start/end 为统计窗口（YYYY-MM-DD 或 ISO 8601）
+    """
+    try:
+        filters = FlowMetricsService.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify(FlowMetricsService.compute(**filters))
+
 # API端点
 @requirement_bp.route('/api/requirements')
 @login_required
 def api_list():
-    """API: 获取Requirements List"""
-    requirements = Requirement.query.all()
-    return jsonify([req.to_dict() for req in requirements])
+    """API: 获取Requirements List
+    
+    不带分页参数时返回全部需求列表；带 mode=cursor 或 cursor 参数时
+    按游标分页返回，过滤条件与 search_requirements 相同。
+    """
+    cursor = request.args.get('cursor')
+    if request.args.get('mode') != 'cursor' and not cursor:
+        requirements = Requirement.query.all()
+        return jsonify([req.to_dict() for req in requirements])
+    
+    filters = request.args.to_dict()
+    per_page = _clamp_per_page(request.args.get('per_page', 20, type=int))
+    with_total = request.args.get('with_total', '').lower() in ('1', 'true', 'yes')
+    try:
+        page = RequirementService.search_requirements(
+            filters, per_page=per_page, keyset=True, cursor=cursor, with_total=with_total, profile=None
+        )
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'items': [req.to_dict() for req in page.items],
+        'per_page': page.per_page,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'total': page.total,
+        'total_is_exact': page.total_is_exact
+    })
+
+@requirement_bp.route('/api/typeahead/requirements')
+@login_required
+def api_typeahead_requirements():
+    """API: 按编号或标题前缀检索可作为依赖的需求
+
+    参数 q 为关键字，limit 为返回条数，exclude 为需要排除的需求ID
+    """
+    items = TypeaheadService.requirements(
+        request.args.get('q', ''),
+        limit=request.args.get('limit', type=int),
+        exclude_id=request.args.get('exclude', type=int)
+    )
+    return jsonify(items)
+
+@requirement_bp.route('/api/typeahead/users')
+@login_required
+def api_typeahead_users():
+    """API: 按用户名或姓名前缀检索在职用户"""
+    items = TypeaheadService.users(
+        request.args.get('q', ''),
+        limit=request.args.get('limit', type=int)
+    )
+    return jsonify(items)
 
 @requirement_bp.route('/api/requirements/<int:id>')
 @login_required
@@ -647,6 +722,71 @@ def api_get(id):
     requirement = Requirement.query.get_or_404(id)
     return jsonify(requirement.to_dict())
 
+@requirement_bp.route('/api/requirements/<int:id>/history')
+@login_required
+def api_history(id):
+    """API: 需求的完整变更时间线（含已归档的历史）
+
+    参数 limit 为每页的历史行数，cursor 为上一页返回的 next_cursor
+    """
+    Requirement.query.get_or_404(id)
+    try:
+        entries, next_cursor = HistoryArchiveService.timeline(
+            id, limit=request.args.get('limit', type=int), cursor=request.args.get('cursor')
+        )
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'items': [entry.to_dict() for entry in entries],
+        'next_cursor': next_cursor
+    })
+
+@requirement_bp.route('/api/requirements/<int:id>/as-of')
+@login_required
+def api_as_of(id):
+    """API: 需求在指定时刻的字段值
+
+    参数 at 为时间点（YYYY-MM-DD 或 ISO 8601），需求当时尚未创建时返回404
+    """
+    Requirement.query.get_or_404(id)
+    try:
+        at = parse_moment(request.args.get('at'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    result = CheckpointService.as_of(id, at)
+    if result is None:
+        return jsonify({'success': False, 'message': '需求在该时刻尚未创建'}), 404
+    return jsonify({
+        'at': at.isoformat(),
+        'requirement': result.state,
+        'checkpoint_id': result.checkpoint_id,
+        'replayed': result.replayed
+    })
+
+@requirement_bp.route('/api/audit/history')
+@login_required
+@manager_required
+def api_audit_history():
+    """API: 需求变更审计查询
+
+    参数 user_id、action、field_name、project_id、requirement_id 为过滤条件，
+    start/end 为时间范围（YYYY-MM-DD 或 ISO 8601），limit 为每页行数，cursor 为上一页返回的 next_cursor
+    """
+    try:
+        filters = AuditService.parse_filters(request.args)
+        items, next_cursor = AuditService.query(
+            filters, limit=request.args.get('limit', type=int), cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'items': items,
+        'next_cursor': next_cursor
+    })
+
 @requirement_bp.route('/api/requirements/<int:id>/impact')
 @login_required
 def api_impact(id):
@@ -664,20 +804,10 @@ def delete_requirement(id):
         flash('您没有权限删除需求，只能查看', 'warning')
         return redirect(url_for('requirement.index'))
     
-    requirement = Requirement.query.get_or_404(id)
+    Requirement.query.get_or_404(id)
     
     try:
-        # 记录删除历史
-        RequirementService.add_history(
-            requirement_id=id,
-            user_id=current_user.id,
-            action='delete',
-            comment='删除需求'
-        )
-        
-        # 删除需求（由于设置了cascade='all, delete-orphan'，相关附件、评论等会自动删除）
-        db.session.delete(requirement)
-        db.session.commit()
+        RequirementService.delete_requirement(id, current_user.id)
         flash('需求删除成功！', 'success')
     except Exception as e:
         db.session.rollback()